@@ -0,0 +1,85 @@
+# ai_encoding.py
+# Compact, token-minimal case encoding for the Phase-2 Gemini prompt.
+# Only the declared AI feature subset (config.AI_FEATURES) is sent, in that
+# fixed order; nulls, placeholders, identifiers and timestamps are dropped.
+
+import json
+
+print("[RISK_FC] Loading ai_encoding.py")
+
+# Rough chars-per-token for English/JSON; good enough to track the trend
+_CHARS_PER_TOKEN = 4
+
+
+def _compact_value(value, float_digits):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        rounded = float(f"{value:.{float_digits}g}")
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(value, str):
+        return value
+    try:
+        as_float = float(value)  # Decimal from psycopg2
+    except (TypeError, ValueError):
+        return str(value)
+    return _compact_value(as_float, float_digits)
+
+
+def encode_features(features, ai_features, float_digits=4):
+    """
+    features dict -> ordered dict restricted to `ai_features`, nulls removed,
+    floats trimmed to `float_digits` significant digits.
+    """
+    out = {}
+    for name in ai_features:
+        value = (features or {}).get(name)
+        if value is None:
+            continue
+        out[name] = _compact_value(value, float_digits)
+    return out
+
+
+def case_dict(features, rule_context, ai_features, float_digits=4):
+    ctx  = rule_context or {}
+    rule = {
+        "initial_decision": ctx.get("decision", "HOLD"),
+        "rule_id": ctx.get("rule_id"),
+        "rule_name": ctx.get("rule_name"),
+        "rule_narrative": ctx.get("narrative"),
+    }
+    return {
+        "features": encode_features(features, ai_features, float_digits),
+        "rule_engine": {k: v for k, v in rule.items() if v is not None},
+    }
+
+
+def encode_case(features, rule_context, ai_features, float_digits=4):
+    """
+    Case JSON for the prompt: no indentation, no spaces, stable key order.
+    """
+    case = case_dict(features, rule_context, ai_features, float_digits)
+    return json.dumps(case, separators=(",", ":"), default=str)
+
+
+def encode_batch(cases, ai_features, float_digits=4):
+    """
+    [(case_id, features, rule_context), ...] -> compact JSON array, each
+    element {"case_id": ..., "features": ..., "rule_engine": ...}.
+    """
+    items = []
+    for case_id, features, rule_context in cases:
+        item = {"case_id": case_id}
+        item.update(case_dict(features, rule_context, ai_features, float_digits))
+        items.append(item)
+    return json.dumps(items, separators=(",", ":"), default=str)
+
+
+def prompt_size(text):
+    """
+    (bytes, approx_tokens) of a prompt string.
+    """
+    n_bytes = len(text.encode("utf-8"))
+    return n_bytes, (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
@@ -0,0 +1,123 @@
+# background_sender.py
+# In-process background delivery (e.g. Lark notifications) off the decision path.
+# The thread lives at module level, so it keeps draining across warm invocations;
+# call flush() from the FC pre-freeze hook so nothing is stranded by a freeze.
+
+import queue
+import threading
+import time
+
+print("[RISK_FC] Loading background_sender.py")
+
+
+class BackgroundSender:
+    """
+    Bounded queue + one daemon thread calling send_fn(item).
+    - submit() never blocks: a full queue drops the item (counted).
+    - failures are retried with exponential backoff, then dropped (counted).
+    - flush(deadline_secs) waits for the queue to drain, at most deadline_secs.
+    """
+
+    def __init__(self, send_fn, name, maxsize=200, max_retries=3, backoff_base=0.2, backoff_max=2.0):
+        self._send_fn      = send_fn
+        self._name         = name
+        self._queue        = queue.Queue(maxsize=maxsize)
+        self._max_retries  = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max  = backoff_max
+        self._thread       = None
+        self._start_lock   = threading.Lock()
+        self._stats_lock   = threading.Lock()
+        self.stats         = {
+            "submitted": 0,
+            "sent": 0,
+            "retries": 0,
+            "dropped_queue_full": 0,
+            "dropped_failed": 0,
+            "latency_total_ms": 0.0,
+            "latency_max_ms": 0.0,
+        }
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self._name}-sender", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, item):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((time.monotonic(), item))
+        except queue.Full:
+            self._count("dropped_queue_full")
+            print(f"[RISK_FC] {self._name} queue full, dropping item")
+            return False
+        self._count("submitted")
+        return True
+
+    def _run(self):
+        while True:
+            enqueued_at, item = self._queue.get()
+            try:
+                self._deliver(enqueued_at, item)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, enqueued_at, item):
+        for attempt in range(self._max_retries + 1):
+            try:
+                self._send_fn(item)
+                latency_ms = (time.monotonic() - enqueued_at) * 1000.0
+                with self._stats_lock:
+                    self.stats["sent"] += 1
+                    self.stats["latency_total_ms"] += latency_ms
+                    self.stats["latency_max_ms"] = max(self.stats["latency_max_ms"], latency_ms)
+                return
+            except Exception as exc:
+                if attempt >= self._max_retries:
+                    self._count("dropped_failed")
+                    print(
+                        f"[RISK_FC] {self._name} delivery failed after "
+                        f"{attempt + 1} attempts, dropping: {exc}"
+                    )
+                    return
+                self._count("retries")
+                time.sleep(min(self._backoff_base * (2 ** attempt), self._backoff_max))
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self, deadline_secs):
+        """
+        Blocks until everything submitted is delivered/dropped or the deadline
+        passes. Returns True if fully drained.
+        """
+        deadline = time.monotonic() + deadline_secs
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(
+                        f"[RISK_FC] {self._name} flush deadline hit, "
+                        f"{self._queue.unfinished_tasks} item(s) still pending"
+                    )
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def snapshot_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["pending"]        = self.pending()
+        stats["latency_avg_ms"] = (
+            stats["latency_total_ms"] / stats["sent"] if stats["sent"] else 0.0
+        )
+        return stats
@@ -0,0 +1,674 @@
+# bench_handler.py
+# Offline benchmark of the REAL index.handler, without Hologres, Gemini or Lark:
+#   - core's DB reads (features, rules) are an in-process fake store and the
+#     decision INSERT goes to a fake pool; both with configurable latency
+#   - Gemini and Lark are local mock HTTP servers with configurable latency
+#
+# Usage:
+#   python bench_handler.py                                  # every scenario
+#   python bench_handler.py --scenarios hold_ai,kafka_batch -n 300
+#   python bench_handler.py --save-baseline bench_baseline.json
+#   python bench_handler.py --baseline bench_baseline.json --max-regression-pct 20
+#   python bench_handler.py --trace-alloc                    # + tracemalloc peak per invocation
+#
+# Exit code 1 when any scenario's p95 latency or invocations/sec regresses by
+# more than --max-regression-pct against the baseline.
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Filled in by import_service() once the environment points at the mocks
+cfg     = None
+core    = None
+index   = None
+stage_timing = None
+FeatureRecord = None
+
+
+# ==========================
+# MOCK HTTP SERVERS
+# ==========================
+_BENCH_VERDICT = {
+    "final_decision": "HOLD",
+    "primary_threat": "AML",
+    "risk_score": 70,
+    "confidence": 0.8,
+    "narrative": "Benchmark verdict.",
+    "rule_alignment": "AGREES_WITH_RULE",
+}
+
+
+def _gemini_reply(request_json):
+    prompt = request_json["contents"][0]["parts"][0]["text"]
+    marker = "Cases JSON:\n"
+    if marker in prompt:
+        cases = json.loads(prompt.split(marker, 1)[1])
+        text  = json.dumps([dict(_BENCH_VERDICT, case_id=c["case_id"]) for c in cases])
+    else:
+        text = json.dumps(_BENCH_VERDICT)
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def _lark_reply(request_json):
+    return {"code": 0, "msg": "success"}
+
+
+def _start_mock_server(reply_fn, latency_ms):
+    """
+    Keep-alive HTTP/1.1 server on 127.0.0.1 answering POSTs with reply_fn(json)
+    after sleeping latency_ms. Returns (server, base_url).
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version        = "HTTP/1.1"
+        disable_nagle_algorithm = True   # headers + body are separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body   = json.loads(self.rfile.read(length) or b"{}")
+            if latency_ms:
+                time.sleep(latency_ms / 1000.0)
+            out = json.dumps(reply_fn(body)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_mock_servers(gemini_latency_ms, lark_latency_ms):
+    """
+    Returns ([servers], gemini_base_url, lark_base_url).
+    """
+    gemini_srv, gemini_url = _start_mock_server(_gemini_reply, gemini_latency_ms)
+    lark_srv, lark_url     = _start_mock_server(_lark_reply, lark_latency_ms)
+    return [gemini_srv, lark_srv], gemini_url, lark_url
+
+
+# ==========================
+# FAKE DB
+# ==========================
+class FakeRiskStore:
+    """
+    Stands in for the core DB functions; every call sleeps db_latency_ms.
+    Feature reads return FeatureRecords, as core._select_features does.
+    The ORDER BY update_time history scan additionally sleeps scan_latency_ms
+    (its server-side sort cost) and really sorts the user's rows.
+    """
+
+    def __init__(self, db_latency_ms, scan_latency_ms=0.0):
+        self.latency      = db_latency_ms / 1000.0
+        self.scan_latency = scan_latency_ms / 1000.0
+        self.features     = {}   # (user_code, txn_id) -> row
+        self.latest       = {}   # user_code -> row (rt.risk_features_latest)
+        self.history      = {}   # user_code -> [rows]
+        self.rule_rows    = []
+        self.inserted     = 0
+
+    def _db_call(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add(self, row, visible=True):
+        """
+        visible=False: only the user's "latest" row exists (fallback path).
+        """
+        if visible:
+            self.features[(row["user_code"], row["txn_id"])] = row
+        self.latest[row["user_code"]] = row
+        self.history.setdefault(row["user_code"], []).append(row)
+
+    def fetch_risk_features(self, user_code, txn_id):
+        self._db_call()
+        row = self.features.get((str(user_code), str(txn_id)))
+        return FeatureRecord.from_mapping(row) if row else None
+
+    def fetch_risk_features_bulk(self, keys):
+        self._db_call()
+        found = {}
+        for user_code, txn_id in keys:
+            row = self.features.get((str(user_code), str(txn_id)))
+            if row:
+                found[(str(user_code), str(txn_id))] = FeatureRecord.from_mapping(row)
+        return found
+
+    def query_latest_features_table(self, user_code):
+        self._db_call()
+        row = self.latest.get(str(user_code))
+        return FeatureRecord.from_mapping(row) if row else None
+
+    def query_latest_features_scan(self, user_code):
+        self._db_call()
+        if self.scan_latency:
+            time.sleep(self.scan_latency)
+        rows = sorted(self.history.get(str(user_code), []), key=lambda r: r["update_time"], reverse=True)
+        return FeatureRecord.from_mapping(rows[0]) if rows else None
+
+    def query_final_decisions(self, keys):
+        self._db_call()
+        return {}
+
+    def fetch_rule_rows(self):
+        self._db_call()
+        return [dict(r) for r in self.rule_rows]
+
+    def fetch_rule_version(self):
+        self._db_call()
+        return json.dumps([len(self.rule_rows), max((r["priority"] for r in self.rule_rows), default=None)])
+
+    # --- fake pool for the decision INSERT (and any other direct SQL) ---
+    @contextlib.contextmanager
+    def connection(self):
+        yield _FakeConn(self)
+
+    def execute_prepared(self, conn, name, params):
+        cur = conn.cursor()
+        cur.execute(f"EXECUTE {name} (...)", params)
+        return cur
+
+
+class _FakeCursor:
+    def __init__(self, store):
+        self._store      = store
+        self.description = []
+
+    def execute(self, sql, params=None):
+        self._store._db_call()
+        if sql.lstrip().upper().startswith(("INSERT", "EXECUTE DECISION_INSERT")):
+            self._store.inserted += 1
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class _FakeConn:
+    def __init__(self, store):
+        self._store = store
+
+    def cursor(self, *args, **kwargs):
+        return _FakeCursor(self._store)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def install_fakes(store):
+    core.fetch_risk_features        = store.fetch_risk_features
+    core.fetch_risk_features_bulk   = store.fetch_risk_features_bulk
+    core._query_latest_features_table = store.query_latest_features_table
+    core._query_latest_features_scan  = store.query_latest_features_scan
+    core._query_final_decisions       = store.query_final_decisions
+    core.fetch_rule_rows            = store.fetch_rule_rows
+    core.fetch_rule_version         = store.fetch_rule_version
+    core._DB_POOL                   = store
+
+
+# ==========================
+# SCENARIOS
+# ==========================
+_BASE_RULES = [
+    ("REJECT", "user_blacklisted or address_blacklisted or is_sanctioned", "Blacklist / sanctions hit."),
+    ("PASS", "user_whitelisted and withdrawal_amount < 1000", "Whitelisted small withdrawal."),
+    ("HOLD", "destination_age_hours < 24 and withdrawal_ratio > 0.8", "Fresh address, balance drain."),
+]
+
+
+def build_rule_rows(n_filler=0):
+    """
+    Filler rules never match and come first, so every txn walks all of them.
+    """
+    rows = []
+    for i in range(n_filler):
+        rows.append(
+            {
+                "rule_id": 10000 + i,
+                "rule_name": f"bench_filler_{i}",
+                "logic_expression": (
+                    f"withdrawal_amount > {1000000 + i} and withdrawal_ratio > 0.5"
+                    if i % 2 == 0
+                    else f"structuring_velocity >= {100 + i} or account_maturity < -{i + 1}"
+                ),
+                "action": "HOLD",
+                "priority": i,
+                "status": "ACTIVE",
+                "narrative": "filler",
+            }
+        )
+    for i, (action, expr, narrative) in enumerate(_BASE_RULES):
+        rows.append(
+            {
+                "rule_id": i + 1,
+                "rule_name": f"bench_{action.lower()}",
+                "logic_expression": expr,
+                "action": action,
+                "priority": n_filler + i,
+                "status": "ACTIVE",
+                "narrative": narrative,
+            }
+        )
+    return rows
+
+
+def _feature_row(rng, user_code, txn_id, kind):
+    """
+    kind: PASS (whitelist rule) / REJECT / HOLD / DEFAULT (no rule hits).
+    """
+    row = {
+        "user_code": user_code,
+        "txn_id": txn_id,
+        "withdrawal_amount": round(rng.uniform(1500, 9000), 2),
+        "withdraw_currency": rng.choice(["USDT", "BTC", "ETH"]),
+        "chain": rng.choice(["TRX", "BTC", "ETH"]),
+        "withdrawal_ratio": round(rng.uniform(0.1, 0.6), 3),
+        "withdrawal_deviation": round(rng.uniform(-1, 2), 3),
+        "account_maturity": rng.randint(30, 900),
+        "destination_age_hours": rng.randint(500, 5000),
+        "sanctions_status": "CHECKED",
+        "withdrawal_fan_in": rng.randint(0, 3),
+        "passthrough_turnover": round(rng.random(), 3),
+        "structuring_velocity": rng.randint(0, 3),
+        "time_since_user_login": rng.randint(1, 600),
+        "is_new_device": False,
+        "user_whitelisted": False,
+        "user_blacklisted": False,
+        "address_blacklisted": False,
+        "is_sanctioned": False,
+        "update_time": "2026-01-01 00:00:00",
+    }
+    if kind == "PASS":
+        row.update(user_whitelisted=True, withdrawal_amount=round(rng.uniform(10, 900), 2))
+    elif kind == "REJECT":
+        row.update(address_blacklisted=True)
+    elif kind == "HOLD":
+        row.update(destination_age_hours=rng.randint(0, 23), withdrawal_ratio=round(rng.uniform(0.81, 1.0), 3))
+    return row
+
+
+def _http_event(user_code, txn_id):
+    return json.dumps({"user_code": user_code, "txn_id": txn_id or ""})
+
+
+def _kafka_event(keys):
+    records = []
+    for user_code, txn_id in keys:
+        canal = {"type": "INSERT", "data": [{"user_code": user_code, "code": txn_id}]}
+        records.append({"value": base64.b64encode(json.dumps(canal).encode("utf-8")).decode("ascii")})
+    return json.dumps(records)
+
+
+class Scenario:
+    """
+    latest_path: how the "latest features for user" fallback is served -
+    "cache" (LRU, then table; the default), "table" (LRU off) or "scan"
+    (LRU off, no latest table: ORDER BY update_time over the history).
+    with_txn_id=False sends HTTP events without txn_id (fallback only).
+    hot_users > 0 cycles events over that many users.
+    distinct_txns > 0 re-sends the same txns (redelivery / FC retry).
+    """
+
+    def __init__(
+        self,
+        name,
+        description,
+        kinds,
+        n_filler_rules=0,
+        visible=True,
+        batch=False,
+        iterations_scale=1.0,
+        latest_path="cache",
+        with_txn_id=True,
+        hot_users=0,
+        distinct_txns=0,
+    ):
+        self.name             = name
+        self.description      = description
+        self.kinds            = kinds
+        self.n_filler_rules   = n_filler_rules
+        self.visible          = visible
+        self.batch            = batch
+        self.iterations_scale = iterations_scale
+        self.latest_path      = latest_path
+        self.with_txn_id      = with_txn_id
+        self.hot_users        = hot_users
+        self.distinct_txns    = distinct_txns
+
+    def make_event(self, store, rng, seq, batch_size):
+        """
+        Registers the scenario's feature rows in the store; returns (event, n_txns).
+        """
+        n_txns = batch_size if self.batch else 1
+        keys   = []
+        if self.distinct_txns:
+            seq = seq % self.distinct_txns
+        for j in range(n_txns):
+            user_code = f"H{seq % self.hot_users}" if self.hot_users else f"U{seq % 997}_{j}"
+            txn_id    = f"{self.name}-{seq}-{j}"
+            kind      = self.kinds[(seq * n_txns + j) % len(self.kinds)]
+            store.add(_feature_row(rng, user_code, txn_id, kind), visible=self.visible)
+            keys.append((user_code, txn_id))
+        if self.batch:
+            return _kafka_event(keys), n_txns
+        user_code, txn_id = keys[0]
+        return _http_event(user_code, txn_id if self.with_txn_id else None), 1
+
+
+SCENARIOS = [
+    Scenario("rule_pass", "HTTP, whitelist PASS rule hit", ["PASS"]),
+    Scenario("rule_reject", "HTTP, blacklist REJECT rule hit (+ Lark)", ["REJECT"]),
+    Scenario("hold_ai", "HTTP, HOLD rule -> Gemini (+ Lark)", ["HOLD"]),
+    Scenario(
+        "missing_fallback",
+        "HTTP, txn never appears: full poll, then latest-row fallback",
+        ["DEFAULT"],
+        visible=False,
+        iterations_scale=0.2,
+    ),
+    Scenario(
+        "latest_scan",
+        "HTTP, no txn_id: latest row via ORDER BY update_time scan",
+        ["DEFAULT"],
+        visible=False,
+        latest_path="scan",
+        with_txn_id=False,
+    ),
+    Scenario(
+        "latest_table",
+        "HTTP, no txn_id: point lookup on rt.risk_features_latest",
+        ["DEFAULT"],
+        visible=False,
+        latest_path="table",
+        with_txn_id=False,
+    ),
+    Scenario(
+        "latest_cached",
+        "HTTP, no txn_id, 5 hot users: in-process LRU",
+        ["DEFAULT"],
+        visible=False,
+        with_txn_id=False,
+        hot_users=5,
+    ),
+    Scenario(
+        "redelivered",
+        "HTTP, the same 5 HOLD txns re-sent: replayed, no Gemini",
+        ["HOLD"],
+        distinct_txns=5,
+    ),
+    Scenario("large_rules", "HTTP, 500 non-matching rules, default PASS", ["DEFAULT"], n_filler_rules=500),
+    Scenario(
+        "kafka_batch",
+        "Kafka batch, mixed PASS/REJECT/HOLD/DEFAULT",
+        ["PASS", "DEFAULT", "HOLD", "REJECT", "DEFAULT", "PASS", "DEFAULT", "HOLD"],
+        batch=True,
+        iterations_scale=0.25,
+    ),
+]
+
+
+# ==========================
+# RUNNER
+# ==========================
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _trace_allocations(events):
+    """
+    tracemalloc over extra invocations (kept out of the timed loop, which it
+    would slow down): mean / max peak KB allocated during one handler call.
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for event, _ in events:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            index.handler(event, None)
+            peaks.append((tracemalloc.get_traced_memory()[1] - base) / 1024.0)
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_kb_mean": round(sum(peaks) / len(peaks), 1),
+        "alloc_peak_kb_max": round(max(peaks), 1),
+    }
+
+
+def run_scenario(scenario, store, iterations, warmup, batch_size, seed, show_logs=False, trace_alloc=0):
+    rng = random.Random(seed)
+    store.rule_rows = build_rule_rows(scenario.n_filler_rules)
+    core._RULE_CACHE.invalidate()
+    cfg.LATEST_FEATURES_TABLE = "" if scenario.latest_path == "scan" else "rt.risk_features_latest"
+    core._DECISION_LEDGER = core.idempotency.DecisionLedger(
+        probe=store.query_final_decisions,
+        max_entries=cfg.IDEMPOTENCY_CACHE_SIZE,
+        ttl_secs=cfg.IDEMPOTENCY_CACHE_TTL,
+    )
+    core._LATEST_FEATURES = core.latest_features.LatestFeaturesCache(
+        max_entries=cfg.LATEST_FEATURES_CACHE_SIZE if scenario.latest_path == "cache" else 0,
+        ttl_secs=cfg.LATEST_FEATURES_CACHE_TTL,
+    )
+
+    n = max(1, int(iterations * scenario.iterations_scale))
+    events = [scenario.make_event(store, rng, seq, batch_size) for seq in range(warmup + n + trace_alloc)]
+
+    log_buf   = io.StringIO()
+    latencies = []
+    txns      = 0
+    redirect  = contextlib.nullcontext() if show_logs else contextlib.redirect_stdout(log_buf)
+    with redirect:
+        for event, _ in events[:warmup]:
+            index.handler(event, None)
+        log_buf.seek(0)
+        log_buf.truncate()
+
+        started = time.perf_counter()
+        for event, n_txns in events[warmup:warmup + n]:
+            t0 = time.perf_counter()
+            index.handler(event, None)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            txns += n_txns
+        elapsed = time.perf_counter() - started
+        alloc = _trace_allocations(events[warmup + n:]) if trace_alloc else {}
+        # Lark is off the decision path; drain it so it cannot leak into the next scenario
+        core.flush_lark_notifications(deadline_secs=10.0)
+
+    latencies.sort()
+    stages = stage_timing.aggregate(log_buf.getvalue().splitlines())
+    return {
+        **alloc,
+        "invocations": n,
+        "txns": txns,
+        "seconds": round(elapsed, 3),
+        "inv_per_sec": round(n / elapsed, 2) if elapsed else 0.0,
+        "txn_per_sec": round(txns / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p95_ms": round(_percentile(latencies, 0.95), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3),
+        "stage_p95_ms": {name: s["p95"] for name, s in stages.items()},
+    }
+
+
+def check_regressions(results, baseline, max_regression_pct):
+    """
+    Returns a list of human-readable regressions (empty = pass).
+    """
+    limit    = max_regression_pct / 100.0
+    problems = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base.get("p95_ms") and res["p95_ms"] > base["p95_ms"] * (1 + limit):
+            problems.append(
+                f"{name}: p95 {res['p95_ms']:.2f}ms vs baseline {base['p95_ms']:.2f}ms "
+                f"(> +{max_regression_pct:.0f}%)"
+            )
+        if base.get("inv_per_sec") and res["inv_per_sec"] < base["inv_per_sec"] * (1 - limit):
+            problems.append(
+                f"{name}: {res['inv_per_sec']:.1f} inv/s vs baseline {base['inv_per_sec']:.1f} "
+                f"(< -{max_regression_pct:.0f}%)"
+            )
+    return problems
+
+
+def print_results(results, settings):
+    print(f"[BENCH] {settings}")
+    header = (
+        f"{'scenario':<18} {'inv':>6} {'inv/s':>9} {'txn/s':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<18} {r['invocations']:>6} {r['inv_per_sec']:>9.1f} {r['txn_per_sec']:>9.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}"
+        )
+    print()
+    print("Stage p95 (ms):")
+    for name, r in results.items():
+        top = sorted(
+            ((k, v) for k, v in r["stage_p95_ms"].items() if k != "total"),
+            key=lambda kv: -kv[1],
+        )[:4]
+        print(f"  {name:<18} " + ", ".join(f"{k}={v:.2f}" for k, v in top))
+    if any("alloc_peak_kb_mean" in r for r in results.values()):
+        print()
+        print("Allocation peak per invocation (KB, tracemalloc):")
+        for name, r in results.items():
+            if "alloc_peak_kb_mean" in r:
+                print(f"  {name:<18} mean={r['alloc_peak_kb_mean']:.1f} max={r['alloc_peak_kb_max']:.1f}")
+
+
+def import_service(gemini_url, lark_url, ai_cache=False, poll_delay_ms=20.0):
+    """
+    Points config at the mocks, then imports the service modules.
+    """
+    global cfg, core, index, stage_timing, FeatureRecord
+    os.environ.update(
+        {
+            "GEMINI_API_KEY": "bench",
+            "GEMINI_API_BASE": gemini_url,
+            "LARK_WEBHOOK_URL": f"{lark_url}/open-apis/bot/v2/hook/bench",
+            "AI_CACHE_ENABLED": "1" if ai_cache else "0",
+            "FEATURE_WAIT_DELAY_SECS": str(poll_delay_ms / 1000.0),
+            "DECISION_LOG_SPILL_PATH": os.path.join(tempfile.gettempdir(), "bench_decision_spill.jsonl"),
+            # Scenarios swap rule sets; a snapshot left by the previous one would be served first
+            "RULE_SNAPSHOT_PATH": "",
+        }
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        import config as cfg
+        import core
+        import index
+        import stage_timing
+        from feature_record import FeatureRecord
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of index.handler with local stand-ins.")
+    parser.add_argument("--scenarios", default="all", help="comma-separated names (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="timed invocations per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=20, help="records per Kafka batch")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    parser.add_argument(
+        "--scan-latency-ms", type=float, default=5.0,
+        help="extra server cost of the ORDER BY update_time fallback scan (measure with EXPLAIN ANALYZE)",
+    )
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    parser.add_argument("--lark-latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--poll-delay-ms", type=float, default=20.0,
+        help="FEATURE_WAIT_DELAY_SECS stand-in (production: 1000)",
+    )
+    parser.add_argument("--ai-cache", action="store_true", help="keep the AI verdict cache on")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--show-logs", action="store_true", help="do not swallow handler logs")
+    parser.add_argument("--json-report", help="also write results as JSON here")
+    parser.add_argument("--save-baseline", help="write results as the new baseline JSON")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--max-regression-pct", type=float, default=20.0)
+    parser.add_argument(
+        "--trace-alloc", type=int, nargs="?", const=50, default=0, metavar="N",
+        help="after timing, run N more invocations under tracemalloc and report peak KB (default N: 50)",
+    )
+    args = parser.parse_args(argv)
+
+    by_name = {s.name: s for s in SCENARIOS}
+    names   = list(by_name) if args.scenarios == "all" else [n.strip() for n in args.scenarios.split(",")]
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}; known: {', '.join(by_name)}")
+
+    servers, gemini_url, lark_url = start_mock_servers(args.gemini_latency_ms, args.lark_latency_ms)
+    import_service(gemini_url, lark_url, ai_cache=args.ai_cache, poll_delay_ms=args.poll_delay_ms)
+
+    store = FakeRiskStore(args.db_latency_ms, args.scan_latency_ms)
+    install_fakes(store)
+
+    results = {}
+    for name in names:
+        results[name] = run_scenario(
+            by_name[name], store, args.iterations, args.warmup, args.batch_size, args.seed,
+            show_logs=args.show_logs, trace_alloc=args.trace_alloc,
+        )
+
+    settings = (
+        f"db={args.db_latency_ms}ms scan=+{args.scan_latency_ms}ms gemini={args.gemini_latency_ms}ms lark={args.lark_latency_ms}ms "
+        f"poll={args.poll_delay_ms}ms x{cfg.FEATURE_WAIT_RETRIES} batch={args.batch_size} "
+        f"ai_cache={'on' if args.ai_cache else 'off'}"
+    )
+    print_results(results, settings)
+
+    for server in servers:
+        server.shutdown()
+
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump({"settings": settings, "results": results}, fh, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"[BENCH] Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        problems = check_regressions(results, baseline, args.max_regression_pct)
+        if problems:
+            print("[BENCH] REGRESSION:")
+            for line in problems:
+                print(f"  {line}")
+            return 1
+        print(f"[BENCH] No regression beyond {args.max_regression_pct:.0f}% vs {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# circuit_breaker.py
+# Instance-wide circuit breaker for a slow / failing dependency (Gemini).
+# Module-level instances are shared by every invocation in the FC instance.
+
+import threading
+import time
+from collections import deque
+
+print("[RISK_FC] Loading circuit_breaker.py")
+
+CLOSED    = "CLOSED"
+OPEN      = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreaker:
+    """
+    CLOSED    -> OPEN      after `failure_threshold` consecutive failures, or when
+                           p95 latency over the last `window` calls exceeds
+                           `p95_threshold_ms` (needs `min_samples` calls).
+    OPEN      -> HALF_OPEN after `open_secs`; up to `half_open_probes` calls pass.
+    HALF_OPEN -> CLOSED on a probe success, back to OPEN on a probe failure.
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=3,
+        p95_threshold_ms=15000.0,
+        window=20,
+        min_samples=5,
+        open_secs=30.0,
+        half_open_probes=1,
+    ):
+        self.name               = name
+        self._failure_threshold = failure_threshold
+        self._p95_threshold_ms  = p95_threshold_ms
+        self._min_samples       = min_samples
+        self._open_secs         = open_secs
+        self._half_open_probes  = half_open_probes
+        self._latencies_ms      = deque(maxlen=window)
+        self._lock              = threading.Lock()
+        self._state             = CLOSED
+        self._consecutive_fails = 0
+        self._opened_at         = 0.0
+        self._probes_in_flight  = 0
+        self.stats              = {"short_circuited": 0, "opened": 0, "successes": 0, "failures": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _p95_ms(self):
+        if len(self._latencies_ms) < self._min_samples:
+            return None
+        ordered = sorted(self._latencies_ms)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+    def _trip(self, reason):
+        self._state            = OPEN
+        self._opened_at        = time.monotonic()
+        self._probes_in_flight = 0
+        self.stats["opened"]  += 1
+        print(f"[RISK_FC] Circuit {self.name} OPEN: {reason}")
+
+    def allow(self):
+        """
+        True if a call may go out now; False = short-circuit to the fallback.
+        """
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self._open_secs:
+                    self.stats["short_circuited"] += 1
+                    return False
+                self._state            = HALF_OPEN
+                self._probes_in_flight = 0
+                print(f"[RISK_FC] Circuit {self.name} HALF_OPEN: sending probe")
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self._half_open_probes:
+                    self.stats["short_circuited"] += 1
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record_success(self, latency_ms):
+        with self._lock:
+            self.stats["successes"] += 1
+            self._consecutive_fails = 0
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._latencies_ms.clear()
+                print(f"[RISK_FC] Circuit {self.name} CLOSED: probe succeeded")
+                return
+            self._latencies_ms.append(latency_ms)
+            p95 = self._p95_ms()
+            if p95 is not None and p95 > self._p95_threshold_ms:
+                self._trip(f"p95 {p95:.0f}ms > {self._p95_threshold_ms:.0f}ms")
+                self._latencies_ms.clear()
+
+    def record_failure(self, latency_ms=None):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._consecutive_fails += 1
+            if latency_ms is not None:
+                self._latencies_ms.append(latency_ms)
+            if self._state == HALF_OPEN:
+                self._trip("probe failed")
+            elif self._state == CLOSED and self._consecutive_fails >= self._failure_threshold:
+                self._trip(f"{self._consecutive_fails} consecutive failures")
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["state"] = self._state
+            stats["p95_ms"] = self._p95_ms()
+        return stats
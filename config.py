@@ -14,18 +14,96 @@ DB_NAME = os.environ.get("DB_NAME", "onebullex_rt")
 DB_USER = os.environ.get("DB_USER", "YOUR_DB_USER")
 DB_PASS = os.environ.get("DB_PASS", "YOUR_DB_PASSWORD")
 
+# Connection pool (kept warm across FC invocations)
+DB_POOL_MAXCONN          = int(os.environ.get("DB_POOL_MAXCONN", "4"))
+DB_POOL_HEALTHCHECK_SECS = float(os.environ.get("DB_POOL_HEALTHCHECK_SECS", "30"))
+
+# Write-behind decision log (rt.risk_withdraw_decision)
+DECISION_LOG_MAX_ROWS            = int(os.environ.get("DECISION_LOG_MAX_ROWS", "200"))
+DECISION_LOG_MAX_AGE_SECS        = float(os.environ.get("DECISION_LOG_MAX_AGE_SECS", "2"))
+DECISION_LOG_SPILL_PATH          = os.environ.get("DECISION_LOG_SPILL_PATH", "/tmp/risk_decision_spill.jsonl")
+# Spill bounds: rows past these (or failing alone MAX_ATTEMPTS times) go to the dead-letter file
+DECISION_LOG_SPILL_MAX_ROWS      = int(os.environ.get("DECISION_LOG_SPILL_MAX_ROWS", "10000"))
+DECISION_LOG_SPILL_MAX_AGE_SECS  = float(os.environ.get("DECISION_LOG_SPILL_MAX_AGE_SECS", "86400"))
+DECISION_LOG_MAX_ATTEMPTS        = int(os.environ.get("DECISION_LOG_MAX_ATTEMPTS", "5"))
+DECISION_LOG_DEAD_LETTER_PATH    = os.environ.get("DECISION_LOG_DEAD_LETTER_PATH", "/tmp/risk_decision_dead.jsonl")
+DECISION_LOG_DEAD_LETTER_MAX_MB  = float(os.environ.get("DECISION_LOG_DEAD_LETTER_MAX_MB", "64"))
+
 # -----------------------------
 # AI Config (Gemini)
 # -----------------------------
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 GEMINI_MODEL   = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
 
+# Gemini latency budget + circuit breaker
+GEMINI_DEADLINE_SECS      = float(os.environ.get("GEMINI_DEADLINE_SECS", "20"))   # whole retry loop
+GEMINI_MAX_ATTEMPTS       = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "3"))
+GEMINI_RETRY_BACKOFF_SECS = float(os.environ.get("GEMINI_RETRY_BACKOFF_SECS", "1"))
+GEMINI_BREAKER_FAILURES   = int(os.environ.get("GEMINI_BREAKER_FAILURES", "3"))
+GEMINI_BREAKER_P95_MS     = float(os.environ.get("GEMINI_BREAKER_P95_MS", "15000"))
+GEMINI_BREAKER_OPEN_SECS  = float(os.environ.get("GEMINI_BREAKER_OPEN_SECS", "30"))
+GEMINI_BATCH_SIZE         = int(os.environ.get("GEMINI_BATCH_SIZE", "8"))   # HOLD cases per request (1 = off)
+
+# Features sent to the AI (order = order in the prompt). Left out on purpose:
+#  - identifiers / timestamps: user_code, txn_id, destination_address, update_time
+#  - Phase-1-only signals: is_sanctioned, *_blacklisted
+#  - placeholders (always NULL/0 today): time_since_critical_event,
+#    kyc_limit_utilization, source_risk_score, abnormal_pnl, days_since_whitelist_add
+AI_FEATURES = (
+    "withdrawal_amount",
+    "withdraw_currency",
+    "chain",
+    "withdrawal_ratio",
+    "withdrawal_deviation",
+    "is_round_number",
+    "account_maturity",
+    "destination_age_hours",
+    "age_status",
+    "sanctions_status",
+    "withdrawal_fan_in",
+    "deposit_fan_out",
+    "passthrough_turnover",
+    "structuring_velocity",
+    "rapid_cycling",
+    "hours_since_fiat_deposit",
+    "arbitrage_flag",
+    "time_since_user_login",
+    "session_risk_score",
+    "is_new_device",
+    "is_new_ip",
+    "is_impossible_travel",
+    "ip_density",
+    "device_density",
+    "cluster_newness_ratio",
+    "user_whitelisted",
+    "address_whitelisted",
+    "user_greylisted",
+    "address_greylisted",
+    "ip_greylisted",
+)
+AI_FLOAT_DIGITS = int(os.environ.get("AI_FLOAT_DIGITS", "4"))   # significant digits in the prompt
+
+# AI verdict cache (LRU + TTL, keyed on a canonical case fingerprint)
+AI_CACHE_ENABLED     = os.environ.get("AI_CACHE_ENABLED", "1") == "1"
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "2000"))
+AI_CACHE_MAX_BYTES   = int(os.environ.get("AI_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+AI_CACHE_TTL_SECS    = float(os.environ.get("AI_CACHE_TTL_SECS", "600"))
+AI_CACHE_SIG_DIGITS  = int(os.environ.get("AI_CACHE_SIG_DIGITS", "2"))   # bucketing of continuous features
+
 # -----------------------------
 # Chainalysis Config
 # -----------------------------
 CHAINALYSIS_API_KEY = os.environ.get("CHAINALYSIS_API_KEY", "")
 CHAINALYSIS_URL     = "https://public.chainalysis.com/api/v1/address"
 
+# -----------------------------
+# Outbound HTTP (shared keep-alive pools, see http_client.py)
+# -----------------------------
+HTTP_POOL_MAX_CONNS      = int(os.environ.get("HTTP_POOL_MAX_CONNS", "4"))      # concurrent requests per host
+HTTP_POOL_IDLE_SECS      = float(os.environ.get("HTTP_POOL_IDLE_SECS", "50"))   # drop idle sockets older than this
+GEMINI_API_BASE          = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_MAX_CONNS         = int(os.environ.get("GEMINI_MAX_CONNS", "4"))
+
 # -----------------------------
 # Lark Config
 # -----------------------------
@@ -33,6 +111,12 @@ LARK_WEBHOOK_URL = os.environ.get(
     "LARK_WEBHOOK_URL",
     "https://open.larksuite.com/open-apis/bot/v2/hook/REPLACE_ME",
 )
+# Background delivery (off the decision path)
+LARK_TIMEOUT_SECS        = float(os.environ.get("LARK_TIMEOUT_SECS", "2"))
+LARK_QUEUE_MAX           = int(os.environ.get("LARK_QUEUE_MAX", "200"))
+LARK_MAX_RETRIES         = int(os.environ.get("LARK_MAX_RETRIES", "3"))
+LARK_BACKOFF_BASE_SECS   = float(os.environ.get("LARK_BACKOFF_BASE_SECS", "0.2"))
+LARK_FLUSH_DEADLINE_SECS = float(os.environ.get("LARK_FLUSH_DEADLINE_SECS", "1.5"))
 
 # -----------------------------
 # Blockchair & Sanctions Config
@@ -49,7 +133,76 @@ BLOCKCHAIR_BASE_URL  = os.environ.get("BLOCKCHAIR_BASE_URL", "https://api.blockc
 
 SANCTIONS_CACHE_TTL  = int(os.environ.get("SANCTIONS_CACHE_TTL", "3600"))      # 1 hour
 DEST_AGE_CACHE_TTL   = int(os.environ.get("DEST_AGE_CACHE_TTL", "21600"))     # 6 hours
-RULE_CACHE_TTL      = 300         # 5 minutes
+RULE_CACHE_TTL       = int(os.environ.get("RULE_CACHE_TTL", "300"))            # 5 minutes; then revalidated in the background
+
+# Cheap change token for rt.risk_rules; rules are re-fetched only when it moves.
+# Default: count + md5 over every column the compiled set depends on, computed
+# server-side (one row back). With an updated_at column maintained on every
+# edit, "SELECT count(*), max(updated_at) FROM rt.risk_rules WHERE status =
+# 'ACTIVE'" is cheaper:
+#   ALTER TABLE rt.risk_rules ADD COLUMN updated_at TIMESTAMPTZ DEFAULT now();
+RULE_VERSION_PROBE_SQL = os.environ.get(
+    "RULE_VERSION_PROBE_SQL",
+    "SELECT count(*), md5(string_agg("
+    "concat_ws(':', rule_id, priority, action, rule_name, logic_expression, narrative), "
+    "'|' ORDER BY priority, rule_id)) "
+    "FROM rt.risk_rules WHERE status = 'ACTIVE'",
+)
+
+# Compiled rule set persisted after each DB validation; cold instances load it
+# first and revalidate in the background. Point at a NAS mount to share it
+# across instances; empty disables. Older snapshots are not served.
+RULE_SNAPSHOT_PATH         = os.environ.get("RULE_SNAPSHOT_PATH", "/tmp/risk_rules_snapshot.bin")
+RULE_SNAPSHOT_MAX_AGE_SECS = int(os.environ.get("RULE_SNAPSHOT_MAX_AGE_SECS", "3600"))   # 1 hour
+
+# Shared-predicate index (rule_index.py) built with every compiled rule set;
+# "0" evaluates rule by rule
+RULE_INDEX_ENABLED = os.environ.get("RULE_INDEX_ENABLED", "1") == "1"
+
+# Per-rule counters (rule_stats.py): evaluations / hits / exceptions on every
+# txn, time on every RULE_STATS_SAMPLE_EVERY-th txn (0 = never). Flushed as
+# RULE_STATS log lines every RULE_STATS_FLUSH_SECS and at pre-freeze; also as
+# rows in RULE_STATS_TABLE when set (columns: rule_stats.STATS_COLUMNS).
+RULE_STATS_ENABLED      = os.environ.get("RULE_STATS_ENABLED", "1") == "1"
+RULE_STATS_SAMPLE_EVERY = int(os.environ.get("RULE_STATS_SAMPLE_EVERY", "100"))
+RULE_STATS_FLUSH_SECS   = float(os.environ.get("RULE_STATS_FLUSH_SECS", "60"))
+RULE_STATS_TABLE        = os.environ.get("RULE_STATS_TABLE", "")   # e.g. rt.risk_rule_stats
+
+# Polling rt.risk_features until the Flink job has written the txn
+FEATURE_WAIT_RETRIES    = int(os.environ.get("FEATURE_WAIT_RETRIES", "5"))
+FEATURE_WAIT_DELAY_SECS = float(os.environ.get("FEATURE_WAIT_DELAY_SECS", "1.0"))
+
+# rt.risk_features reads: "full" = SELECT *, so the logged features_snapshot
+# holds every column (auditing / rule_replay.py of candidate rules);
+# "projected" selects only the columns the active rules and AI_FEATURES read
+# (+ FEATURE_BASE_COLUMNS): narrower reads, but snapshots then lack whatever
+# a future candidate rule reads (rule_replay.py reports those names).
+FEATURE_FETCH_MODE   = os.environ.get("FEATURE_FETCH_MODE", "full")
+FEATURE_BASE_COLUMNS = (
+    "user_code",
+    "txn_id",
+    "update_time",
+    "destination_address",
+    "withdrawal_amount",
+    "withdraw_currency",
+    "chain",
+)
+
+# "Latest features for user" fallback: in-process LRU, then a point lookup on
+# the per-user table the Flink job upserts (PK user_code); empty table name
+# falls back to the ORDER BY update_time scan of rt.risk_features.
+# Off by default: set to rt.risk_features_latest once risk_latest_sink is
+# deployed (a missing table also switches the lookup off on first use).
+LATEST_FEATURES_TABLE      = os.environ.get("LATEST_FEATURES_TABLE", "")
+LATEST_FEATURES_CACHE_SIZE = int(os.environ.get("LATEST_FEATURES_CACHE_SIZE", "5000"))
+LATEST_FEATURES_CACHE_TTL  = int(os.environ.get("LATEST_FEATURES_CACHE_TTL", "60"))   # seconds
+
+# Idempotent decisioning on (user_code, txn_id): redeliveries / FC retries of
+# an already-decided txn replay the recorded decision (LRU, then DB probe)
+IDEMPOTENCY_ENABLED    = os.environ.get("IDEMPOTENCY_ENABLED", "1") == "1"
+IDEMPOTENCY_DB_PROBE   = os.environ.get("IDEMPOTENCY_DB_PROBE", "1") == "1"
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "20000"))
+IDEMPOTENCY_CACHE_TTL  = int(os.environ.get("IDEMPOTENCY_CACHE_TTL", "86400"))   # 24 hours
 
 # -----------------------------
 # Comprehensive Reasoning Prompt
@@ -77,15 +230,18 @@ The pipeline has TWO stages:
 You will receive a JSON object with this structure:
 
 {
-  "features": { ... all risk_features columns ... },
+  "features": { ... decision-relevant risk_features columns ... },
   "rule_engine": {
     "initial_decision": "HOLD",
-    "rule_id": <int or null>,
-    "rule_name": "<string or null>",
+    "rule_id": <int>,
+    "rule_name": "<string>",
     "rule_narrative": "<original rule narrative>"
   }
 }
 
+The JSON is compact. Features that are null or not applicable are omitted,
+so reason only about the fields that are present.
+
 Use the features to reason about:
 
 - AML / Money Mule / Layering
@@ -117,3 +273,28 @@ Guidance:
 
 DO NOT output anything except the JSON object.
 """
+
+# Appended to COMPREHENSIVE_REASONING_PROMPT when several HOLD cases are
+# adjudicated in one request.
+BATCH_REASONING_INSTRUCTIONS = """
+BATCH MODE (this overrides the single-object output format above):
+
+You will receive a JSON ARRAY of cases. Each case has a "case_id" plus the
+"features" / "rule_engine" structure described above. Evaluate every case
+independently; never let one case influence another.
+
+Your output MUST be a STRICT JSON ARRAY with exactly one object per case,
+with NO extra text, code fences, or commentary:
+
+[
+  {
+    "case_id": "<case_id from the input>",
+    "final_decision": "PASS" | "HOLD" | "REJECT",
+    "primary_threat": "AML" | "SCAM" | "ATO" | "INTEGRITY" | "NONE",
+    "risk_score": <integer 0-100>,
+    "confidence": <float 0.0-1.0>,
+    "narrative": "Short explanation in 2-4 sentences.",
+    "rule_alignment": "AGREES_WITH_RULE" | "OVERRIDES_TO_PASS" | "OVERRIDES_TO_REJECT"
+  }
+]
+"""
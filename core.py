@@ -4,24 +4,37 @@
 
 import json
 import time
-import psycopg2
-import urllib.request
-import urllib.error
-from datetime import datetime, timezone   # <-- ADD THIS
+from urllib.parse import urlsplit
 
 import config as cfg
+# Kept eager: stdlib-only modules behind the module-level pools, caches and
+# senders below, which must exist before the first invocation and survive
+# warm ones. Optional or heavy code is imported where used: psycopg2
+# (get_db_conn), rule_index (RULE_INDEX_ENABLED), rule_stats
+# (RULE_STATS_ENABLED), http.client/ssl (http_client, first request).
+import ai_encoding
+import background_sender
+import circuit_breaker
+import db_pool
+import decision_log
+import feature_projection
+import feature_record
+import http_client
+import idempotency
+import latest_features
+import rule_cache
+import rule_engine
+import verdict_cache
 
 print("[RISK_FC] Loading core.py")
 
-_RULES_CACHE     = None
-_LAST_CACHE_TIME = 0
-
-
 
 # ==========================
 # DB HELPERS
 # ==========================
 def get_db_conn():
+    import psycopg2  # lazy: libpq load stays off the import path
+
     return psycopg2.connect(
         host=cfg.DB_HOST,
         port=cfg.DB_PORT,
@@ -31,6 +44,98 @@ def get_db_conn():
     )
 
 
+# stage_timings:    JSONB, per-stage ms of the invocation that made the decision
+# rule_set_version: TEXT, version of the compiled rule set that was applied
+#   ALTER TABLE rt.risk_withdraw_decision ADD COLUMN stage_timings JSONB;
+#   ALTER TABLE rt.risk_withdraw_decision ADD COLUMN rule_set_version TEXT;
+# The idempotency probe (_query_final_decisions) looks rows up by
+# (user_code, txn_id). Hologres has no CREATE INDEX: the keys are table
+# properties, set when the table is created:
+#   BEGIN;
+#   CREATE TABLE rt.risk_withdraw_decision (...);
+#   CALL set_table_property('rt.risk_withdraw_decision', 'distribution_key', 'user_code');
+#   CALL set_table_property('rt.risk_withdraw_decision', 'clustering_key', 'user_code,txn_id');
+#   COMMIT;
+# On an existing table, bitmap columns can be added in place:
+#   CALL set_table_property('rt.risk_withdraw_decision', 'bitmap_columns', 'user_code,txn_id');
+DECISION_INSERT_COLUMNS = (
+    "user_code, txn_id, decision, primary_threat, confidence, narrative, "
+    "features_snapshot, decision_source, llm_reasoning, stage_timings, "
+    "rule_set_version"
+)
+_DECISION_N_COLUMNS     = len(DECISION_INSERT_COLUMNS.split(","))
+_STAGE_TIMINGS_COLUMN   = 9
+_DECISION_ROW_SQL       = "(" + ", ".join(["%s"] * _DECISION_N_COLUMNS) + ")"
+
+# Hot statements, PREPAREd once per pooled connection.
+_PREPARED_STATEMENTS = {
+    "rf_point_lookup": (
+        "SELECT * FROM rt.risk_features WHERE user_code = $1 AND txn_id = $2"
+    ),
+    "decision_insert": (
+        f"INSERT INTO rt.risk_withdraw_decision ({DECISION_INSERT_COLUMNS}) "
+        "VALUES (" + ", ".join(f"${i + 1}" for i in range(_DECISION_N_COLUMNS)) + ")"
+    ),
+}
+
+_DB_POOL = db_pool.ConnectionPool(
+    get_db_conn,
+    maxconn=cfg.DB_POOL_MAXCONN,
+    healthcheck_secs=cfg.DB_POOL_HEALTHCHECK_SECS,
+    prepared=_PREPARED_STATEMENTS,
+    tag="RISK_FC",
+)
+
+# Module-level keep-alive HTTPS pools (Gemini + Lark): survive warm invocations.
+_HTTP = http_client.HttpClient(
+    tag="RISK_FC",
+    max_conns=cfg.HTTP_POOL_MAX_CONNS,
+    idle_secs=cfg.HTTP_POOL_IDLE_SECS,
+    host_limits={
+        urlsplit(cfg.GEMINI_API_BASE).hostname: {"timeout": cfg.GEMINI_DEADLINE_SECS, "max_conns": cfg.GEMINI_MAX_CONNS},
+        urlsplit(cfg.LARK_WEBHOOK_URL).hostname: {"timeout": cfg.LARK_TIMEOUT_SECS, "max_conns": 1},
+    },
+)
+
+
+def http_stats():
+    """
+    Per-host connection reuse counters for the shared HTTPS client.
+    """
+    return _HTTP.snapshot_stats()
+
+
+def warm_up():
+    """
+    FC initializer work, done before traffic arrives: open a pooled DB
+    connection (PREPAREs included), load + compile rt.risk_rules and build
+    the feature column list they need, open the Gemini / Lark TLS
+    connections. Returns {step: ms}; a failed step is logged and left to
+    the first request.
+    """
+    steps = [
+        ("db_pool", _warm_db_pool),
+        ("rules", load_dynamic_rules),
+        ("feature_projection", current_feature_projection),
+        ("http_gemini", lambda: _HTTP.warm(cfg.GEMINI_API_BASE) if cfg.GEMINI_API_KEY else None),
+        ("http_lark", lambda: _HTTP.warm(cfg.LARK_WEBHOOK_URL)),
+    ]
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as exc:
+            print(f"[RISK_FC] Warm-up step {name} failed: {exc}")
+        timings[name] = round((time.perf_counter() - started) * 1000.0, 3)
+    return timings
+
+
+def _warm_db_pool():
+    with _DB_POOL.connection():
+        pass
+
+
 def dict_factory(cursor, row):
     d = {}
     for idx, col in enumerate(cursor.description):
@@ -38,23 +143,218 @@ def dict_factory(cursor, row):
     return d
 
 
+# ==========================
+# FEATURE READS (rt.risk_features)
+# ==========================
+_FEATURE_SCHEMA      = {"columns": None}   # rt.risk_features column names, in order
+_FEATURE_PROJECTIONS = {}                  # rule set version -> FeatureProjection
+
+
+def _query_feature_columns():
+    with _DB_POOL.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM rt.risk_features LIMIT 0")
+        return tuple(col.name for col in cur.description)
+
+
+def current_feature_projection():
+    """
+    Columns to read for the active rule set, built once per rule set version:
+    rule-referenced names + AI_FEATURES + FEATURE_BASE_COLUMNS.
+    feature_projection.FULL in "full" mode or when the schema is unknown.
+    """
+    if cfg.FEATURE_FETCH_MODE == "full":
+        return feature_projection.FULL
+
+    rule_set   = load_rule_snapshot()
+    version    = rule_set["version"]
+    projection = _FEATURE_PROJECTIONS.get(version)
+    if projection is not None:
+        return projection
+
+    wanted = set(cfg.FEATURE_BASE_COLUMNS) | set(cfg.AI_FEATURES)
+    wanted |= rule_engine.referenced_features(rule_set["rules"])
+    try:
+        columns = _FEATURE_SCHEMA["columns"]
+        if columns is None or feature_projection.unknown_names(columns, wanted):
+            # First use, or the rules read a column we have not seen yet
+            columns = _FEATURE_SCHEMA["columns"] = _query_feature_columns()
+    except Exception as exc:
+        print(f"[RISK_FC] rt.risk_features schema unavailable, reading all columns: {exc}")
+        return feature_projection.FULL
+
+    unknown = feature_projection.unknown_names(columns, wanted)
+    if unknown:
+        print(f"[RISK_FC] Rule set {version} reads names that are not rt.risk_features columns: {unknown}")
+    projection = feature_projection.projection_for(columns, wanted)
+    if len(_FEATURE_PROJECTIONS) >= 8:
+        _FEATURE_PROJECTIONS.clear()
+    _FEATURE_PROJECTIONS[version] = projection
+    print(
+        f"[RISK_FC] Feature projection for rule set {version}: "
+        f"{len(projection.columns)}/{len(columns)} columns"
+    )
+    return projection
+
+
+_POINT_LOOKUP_WHERE = "user_code = %s AND txn_id = %s"
+
+
+def _select_features(table, where_sql, params):
+    """
+    SELECT <projected columns> FROM table WHERE <where_sql> -> FeatureRecords.
+    where_sql may end in ORDER BY / LIMIT.
+    """
+    projection = current_feature_projection()
+    with _DB_POOL.connection() as conn:
+        if projection.is_full and table == "rt.risk_features" and where_sql == _POINT_LOOKUP_WHERE:
+            cur = _DB_POOL.execute_prepared(conn, "rf_point_lookup", params)
+        else:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {projection.select_list} FROM {table} WHERE {where_sql}", params)
+        return projection.rows_to_records(cur, cur.fetchall())
+
+
 def fetch_risk_features(user_code, txn_id):
-    conn = None
     try:
-        conn = get_db_conn()
-        cur  = conn.cursor()
-        sql  = "SELECT * FROM rt.risk_features WHERE user_code = %s AND txn_id = %s"
-        cur.execute(sql, (str(user_code), str(txn_id)))
-        row = cur.fetchone()
-        if row:
-            return dict_factory(cur, row)
-        return None
+        rows = _select_features("rt.risk_features", _POINT_LOOKUP_WHERE, (str(user_code), str(txn_id)))
+        return rows[0] if rows else None
     except Exception as exc:
         print(f"[RISK_FC] Error fetching features: {exc}")
         return None
-    finally:
-        if conn:
-            conn.close()
+
+
+def fetch_risk_features_bulk(keys):
+    """
+    Fetches rt.risk_features for many (user_code, txn_id) pairs in ONE query.
+    Returns {(user_code, txn_id): features_dict}; missing pairs are absent.
+    """
+    keys = list(dict.fromkeys((str(u), str(t)) for u, t in keys))
+    if not keys:
+        return {}
+
+    try:
+        placeholders = ", ".join(["(%s, %s)"] * len(keys))
+        rows = _select_features(
+            "rt.risk_features",
+            f"(user_code, txn_id) IN ({placeholders})",
+            [v for key in keys for v in key],
+        )
+        return {(str(f.get("user_code")), str(f.get("txn_id"))): f for f in rows}
+    except Exception as exc:
+        print(f"[RISK_FC] Error bulk fetching features: {exc}")
+        return {}
+
+
+# Newest row per user, fed by every features read (see latest_features.py)
+_LATEST_FEATURES = latest_features.LatestFeaturesCache(
+    max_entries=cfg.LATEST_FEATURES_CACHE_SIZE,
+    ttl_secs=cfg.LATEST_FEATURES_CACHE_TTL,
+)
+
+
+# Set when LATEST_FEATURES_TABLE turns out not to exist (Flink sink not
+# deployed yet): the lookup is skipped for the life of this instance.
+_LATEST_TABLE_MISSING = False
+
+
+def _is_undefined_table(exc):
+    # SQLSTATE 42P01 = undefined_table
+    return getattr(exc, "pgcode", None) == "42P01"
+
+
+def _query_latest_features_table(user_code):
+    """
+    Point lookup on the per-user latest table (PK user_code).
+    Not PREPAREd: a missing table must not break pooled connections.
+    """
+    rows = _select_features(cfg.LATEST_FEATURES_TABLE, "user_code = %s", (str(user_code),))
+    return rows[0] if rows else None
+
+
+def _query_latest_features_scan(user_code):
+    """
+    Legacy path: sorts the user's rt.risk_features history.
+    """
+    rows = _select_features(
+        "rt.risk_features", "user_code = %s ORDER BY update_time DESC LIMIT 1", (str(user_code),)
+    )
+    return rows[0] if rows else None
+
+
+def fetch_latest_risk_features(user_code):
+    """
+    Fallback: latest rt.risk_features row for this user (any txn).
+    LRU first, then the latest-per-user table, then the history scan.
+    """
+    features = _LATEST_FEATURES.get(user_code)
+    if features is not None:
+        print("[RISK_FC] Fallback to cached latest risk_features for user_code", user_code)
+        return features
+
+    global _LATEST_TABLE_MISSING
+    features = None
+    if cfg.LATEST_FEATURES_TABLE and not _LATEST_TABLE_MISSING:
+        try:
+            features = _query_latest_features_table(user_code)
+        except Exception as exc:
+            if _is_undefined_table(exc):
+                _LATEST_TABLE_MISSING = True
+                print(
+                    f"[RISK_FC] {cfg.LATEST_FEATURES_TABLE} does not exist, "
+                    f"latest-features lookup disabled (history scan only): {exc}"
+                )
+            else:
+                print(f"[RISK_FC] Error in latest-features lookup, scanning history: {exc}")
+    if features is None:
+        try:
+            features = _query_latest_features_scan(user_code)
+        except Exception as exc:
+            print(f"[RISK_FC] Error in fallback feature fetch: {exc}")
+            return None
+
+    if features:
+        print("[RISK_FC] Fallback to latest risk_features for user_code", user_code)
+        _LATEST_FEATURES.offer(features)
+        return features.copy()
+    return None
+
+
+def latest_features_stats():
+    return _LATEST_FEATURES.snapshot_stats()
+
+
+def wait_for_risk_features_bulk(keys, max_retries=5, delay=1.0):
+    """
+    Batch version of wait_for_risk_features: one query per attempt,
+    only re-polling the pairs that are still missing.
+    """
+    pending = list(dict.fromkeys((str(u), str(t)) for u, t in keys))
+    found   = {}
+    for attempt in range(max_retries):
+        batch = fetch_risk_features_bulk(pending)
+        for features in batch.values():
+            _LATEST_FEATURES.offer(features)
+        found.update(batch)
+        pending = [key for key in pending if key not in found]
+        if not pending:
+            if attempt > 0:
+                print(
+                    f"[RISK_FC] risk_features batch complete on attempt {attempt+1}/{max_retries}"
+                )
+            return found
+
+        print(
+            f"[RISK_FC] risk_features NOT found yet for {len(pending)} txn(s) "
+            f"(attempt {attempt+1}/{max_retries}), sleeping {delay}s"
+        )
+        time.sleep(delay)
+
+    print(
+        f"[RISK_FC] risk_features still missing after {max_retries} attempts for "
+        f"{len(pending)} txn(s): {pending[:10]}"
+    )
+    return found
 
 
 def wait_for_risk_features(user_code, txn_id, max_retries=5, delay=1.0):
@@ -65,6 +365,7 @@ def wait_for_risk_features(user_code, txn_id, max_retries=5, delay=1.0):
     for attempt in range(max_retries):
         features = fetch_risk_features(user_code, txn_id)
         if features:
+            _LATEST_FEATURES.offer(features)
             if attempt > 0:
                 print(
                     f"[RISK_FC] risk_features found on attempt {attempt+1}/{max_retries}"
@@ -87,252 +388,644 @@ def wait_for_risk_features(user_code, txn_id, max_retries=5, delay=1.0):
 # ==========================
 # LARK NOTIFICATION
 # ==========================
-def send_lark_notification(data):
+def build_lark_card(data):
     """
-    Sends a rich card message to Lark for HOLD/REJECT.
+    Rich card message for HOLD/REJECT; None when nothing should be sent.
     """
-    webhook = cfg.LARK_WEBHOOK_URL
-    if not webhook:
-        return
-
     decision = data.get("decision", "HOLD")
     if decision not in ("REJECT", "HOLD"):
-        return
+        return None
 
-    try:
-        color       = "red"
-        title_emoji = "🚨"
-
-        reasons = data.get("reasons", [])
-        reason_text = (
-            reasons[0]
-            if isinstance(reasons, list) and reasons
-            else str(reasons or data.get("narrative", "No details provided"))
-        )
+    color       = "red"
+    title_emoji = "🚨"
 
-        # NEW: read amount + token
-        withdrawal_amount = data.get("withdrawal_amount")
-        withdraw_token    = data.get("withdraw_currency")
-
-        card_content = {
-            "msg_type": "interactive",
-            "card": {
-                "config": {"wide_screen_mode": True},
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": f"{title_emoji} Risk Decision: {decision}",
-                    },
-                    "template": color,
+    reasons = data.get("reasons", [])
+    reason_text = (
+        reasons[0]
+        if isinstance(reasons, list) and reasons
+        else str(reasons or data.get("narrative", "No details provided"))
+    )
+
+    # NEW: read amount + token
+    withdrawal_amount = data.get("withdrawal_amount")
+    withdraw_token    = data.get("withdraw_currency")
+
+    card_content = {
+        "msg_type": "interactive",
+        "card": {
+            "config": {"wide_screen_mode": True},
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": f"{title_emoji} Risk Decision: {decision}",
                 },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "fields": [
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**User:**\n{data.get('user_code')}",
-                                },
+                "template": color,
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "fields": [
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**User:**\n{data.get('user_code')}",
                             },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**Txn ID:**\n{data.get('txn_id')}",
-                                },
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**Txn ID:**\n{data.get('txn_id')}",
                             },
-                            # NEW: Token
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**Token:**\n{withdraw_token}",
-                                },
+                        },
+                        # NEW: Token
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**Token:**\n{withdraw_token}",
                             },
-                            # NEW: Amount
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**Amount:**\n{withdrawal_amount}",
-                                },
+                        },
+                        # NEW: Amount
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**Amount:**\n{withdrawal_amount}",
                             },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**Threat:**\n{data.get('primary_threat')}",
-                                },
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**Threat:**\n{data.get('primary_threat')}",
                             },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**Score:**\n{data.get('risk_score')}",
-                                },
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**Score:**\n{data.get('risk_score')}",
                             },
-                            
-                        ],
-                    },
-                    {"tag": "hr"},
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": f"**Reasoning:**\n{reason_text}",
                         },
+                        
+                    ],
+                },
+                {"tag": "hr"},
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": f"**Reasoning:**\n{reason_text}",
                     },
-                    {
-                        "tag": "note",
-                        "elements": [
-                            {
-                                "tag": "plain_text",
-                                "content": f"Source: {data.get('source')}",
-                            }
-                        ],
-                    },
-                ],
-            },
-        }
+                },
+                {
+                    "tag": "note",
+                    "elements": [
+                        {
+                            "tag": "plain_text",
+                            "content": f"Source: {data.get('source')}",
+                        }
+                    ],
+                },
+            ],
+        },
+    }
 
-        req = urllib.request.Request(
-            webhook,
-            data=json.dumps(card_content).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-        )
-        with urllib.request.urlopen(req, timeout=2) as response:
-            if response.status == 200:
-                print("[RISK_FC] Lark notification sent.")
+    return card_content
+
+
+def _post_lark_card(card_content):
+    """
+    Blocking webhook POST; raises so the background sender can retry.
+    Not resent on a stale keep-alive socket: the card may already be posted.
+    """
+    response = _HTTP.post_json(cfg.LARK_WEBHOOK_URL, card_content)
+    if response.status != 200:
+        raise RuntimeError(f"Lark HTTP {response.status}")
+    print("[RISK_FC] Lark notification sent.")
+
+
+_LARK_SENDER = background_sender.BackgroundSender(
+    _post_lark_card,
+    name="LARK",
+    maxsize=cfg.LARK_QUEUE_MAX,
+    max_retries=cfg.LARK_MAX_RETRIES,
+    backoff_base=cfg.LARK_BACKOFF_BASE_SECS,
+)
+
+
+def send_lark_notification(data):
+    """
+    Queues a rich card message to Lark for HOLD/REJECT.
+    Delivery happens on a background thread; this never blocks on Lark.
+    """
+    if not cfg.LARK_WEBHOOK_URL:
+        return
+
+    try:
+        card_content = build_lark_card(data)
+        if card_content is not None:
+            _LARK_SENDER.submit(card_content)
     except Exception as e:
         print(f"[RISK_FC] Lark Notification Error (Ignored): {e}")
 
 
+def flush_lark_notifications(deadline_secs=None):
+    """
+    Drain queued notifications before the instance freezes (bounded wait).
+    """
+    if deadline_secs is None:
+        deadline_secs = cfg.LARK_FLUSH_DEADLINE_SECS
+    drained = _LARK_SENDER.flush(deadline_secs)
+    print(f"[RISK_FC] Lark sender stats: {json.dumps(_LARK_SENDER.snapshot_stats())}")
+    return drained
+
+
+def lark_sender_stats():
+    return _LARK_SENDER.snapshot_stats()
+
+
 # ==========================
 # RULES CACHE & DECISION LOGGING
 # ==========================
-def load_dynamic_rules():
-    global _RULES_CACHE, _LAST_CACHE_TIME
-    if _RULES_CACHE is not None and (time.time() - _LAST_CACHE_TIME < cfg.RULE_CACHE_TTL):
-        return _RULES_CACHE
-
-    conn = None
-    try:
-        conn = get_db_conn()
+def fetch_rule_rows():
+    """
+    ACTIVE rt.risk_rules rows (dicts), in priority order.
+    """
+    with _DB_POOL.connection() as conn:
         cur  = conn.cursor()
         cur.execute(
             "SELECT * FROM rt.risk_rules WHERE status = 'ACTIVE' ORDER BY priority ASC"
         )
         rows  = cur.fetchall()
-        rules = []
-        if rows:
-            for row in rows:
-                rules.append(dict_factory(cur, row))
-        _RULES_CACHE     = rules
-        _LAST_CACHE_TIME = time.time()
-        return rules
-    except Exception as exc:
-        print(f"[RISK_FC] Error loading rules: {exc}")
-        return _RULES_CACHE if _RULES_CACHE else []
-    finally:
-        if conn:
-            conn.close()
+        return [dict_factory(cur, row) for row in rows or []]
 
 
-def log_decision_to_db(user_code, txn_id, result, features, source):
-    conn = None
+def fetch_rule_version():
+    """
+    Change token for the ACTIVE rule set (RULE_VERSION_PROBE_SQL), one row.
+    """
+    with _DB_POOL.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(cfg.RULE_VERSION_PROBE_SQL)
+        row = cur.fetchone()
+        return json.dumps(list(row) if row else None, default=str)
+
+
+def _build_rule_index(rules):
+    import rule_index  # lazy: only loaded with RULE_INDEX_ENABLED
+
+    return rule_index.build_rule_index(rules)
+
+
+# Compiled rules are served stale-while-revalidate: after RULE_CACHE_TTL a
+# background thread probes the version and reloads only on change.
+_RULE_CACHE = rule_cache.RuleCache(
+    fetch_rows=lambda: fetch_rule_rows(),
+    fetch_version=lambda: fetch_rule_version(),
+    revalidate_secs=cfg.RULE_CACHE_TTL,
+    snapshot_path=cfg.RULE_SNAPSHOT_PATH or None,
+    snapshot_max_age_secs=cfg.RULE_SNAPSHOT_MAX_AGE_SECS,
+    build_index=_build_rule_index if cfg.RULE_INDEX_ENABLED else None,
+    tag="RISK_FC",
+)
+
+
+def load_rule_snapshot():
+    """
+    {"rules": [...compiled...], "version": "<rule set version>"}; never blocks
+    on a refresh once a set is loaded.
+    No set at all (DB and snapshot both failed) or a snapshot-loaded set past
+    RULE_SNAPSHOT_MAX_AGE_SECS -> empty rules with "unavailable" set, which
+    the handler turns into a HOLD (fail closed).
+    """
     try:
-        conn = get_db_conn()
-        cur  = conn.cursor()
-        sql  = """
-            INSERT INTO rt.risk_withdraw_decision 
-            (user_code, txn_id, decision, primary_threat, confidence, narrative, features_snapshot, decision_source, llm_reasoning)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        decision      = result.get("decision", "HOLD")
-        threat        = result.get("primary_threat", "UNKNOWN")
-        narrative     = result.get("narrative", "")
-        llm_reasoning = narrative
-
-        # NEW: prefer explicit confidence if provided, else derive from risk_score
-        if "confidence" in result:
-            try:
-                confidence = float(result.get("confidence"))
-            except Exception:
-                confidence = 0.7
+        return _RULE_CACHE.snapshot()
+    except rule_cache.StaleRuleSetError as exc:
+        print(f"[RISK_FC] Rule set unavailable, holding decisions: {exc}")
+        return {"rules": [], "version": None, "unavailable": str(exc)}
+    except Exception as exc:
+        print(f"[RISK_FC] Error loading rules, holding decisions: {exc}")
+        return {"rules": [], "version": None, "unavailable": str(exc)}
+
+
+def load_dynamic_rules():
+    return load_rule_snapshot()["rules"]
+
+
+def rule_cache_stats():
+    return _RULE_CACHE.snapshot_stats()
+
+
+def serialize_features(features):
+    """
+    features_snapshot JSON; compute once per txn and reuse for every row.
+    """
+    if isinstance(features, feature_record.FeatureRecord):
+        return features.to_json()
+    return json.dumps(features, default=str)
+
+
+def build_decision_row(
+    user_code,
+    txn_id,
+    result,
+    features,
+    source,
+    features_json=None,
+    stage_timings=None,
+    rule_set_version=None,
+):
+    """
+    Maps a decision result onto a rt.risk_withdraw_decision row tuple
+    (column order = DECISION_INSERT_COLUMNS). stage_timings is usually
+    filled in later by with_stage_timings().
+    """
+    decision      = result.get("decision", "HOLD")
+    threat        = result.get("primary_threat", "UNKNOWN")
+    narrative     = result.get("narrative", "")
+    llm_reasoning = narrative
+
+    # NEW: prefer explicit confidence if provided, else derive from risk_score
+    if "confidence" in result:
+        try:
+            confidence = float(result.get("confidence"))
+        except Exception:
+            confidence = 0.7
+    else:
+        score = result.get("risk_score", 0)
+        confidence = float(score) / 100.0 if isinstance(score, (int, float)) and score >= 0 else 1.0
+
+    if features_json is None:
+        features_json = serialize_features(features)
+
+    return (
+        str(user_code),
+        str(txn_id),
+        decision,
+        threat,
+        confidence,
+        narrative,
+        features_json,
+        source,
+        llm_reasoning,
+        json.dumps(stage_timings) if stage_timings is not None else None,
+        rule_set_version,
+    )
+
+
+def with_stage_timings(rows, stage_timings):
+    """
+    Returns the rows with their stage_timings column set (one JSON dump
+    shared by every row of the invocation).
+    """
+    timings_json = json.dumps(stage_timings)
+    col = _STAGE_TIMINGS_COLUMN
+    return [row[:col] + (timings_json,) + row[col + 1:] for row in rows]
+
+
+_DECISION_INSERT_PAGE_SIZE = 500
+
+
+def _insert_decision_rows(rows):
+    """
+    Multi-row INSERT of decision rows (raises on failure so the writer can spill).
+    """
+    # Rows spilled before a column was added are padded with NULLs
+    rows = [
+        tuple(row) + (None,) * (_DECISION_N_COLUMNS - len(row))
+        for row in rows
+    ]
+    with _DB_POOL.connection() as conn:
+        if len(rows) == 1:
+            _DB_POOL.execute_prepared(conn, "decision_insert", rows[0])
         else:
-            score = result.get("risk_score", 0)
-            confidence = float(score) / 100.0 if isinstance(score, (int, float)) and score >= 0 else 1.0
+            cur = conn.cursor()
+            for i in range(0, len(rows), _DECISION_INSERT_PAGE_SIZE):
+                page = rows[i:i + _DECISION_INSERT_PAGE_SIZE]
+                placeholders = ", ".join([_DECISION_ROW_SQL] * len(page))
+                cur.execute(
+                    f"INSERT INTO rt.risk_withdraw_decision ({DECISION_INSERT_COLUMNS}) "
+                    f"VALUES {placeholders}",
+                    [v for row in page for v in row],
+                )
+        conn.commit()
+
+
+_DECISION_WRITER = decision_log.BufferedDecisionWriter(
+    _insert_decision_rows,
+    max_rows=cfg.DECISION_LOG_MAX_ROWS,
+    max_age_secs=cfg.DECISION_LOG_MAX_AGE_SECS,
+    spill_path=cfg.DECISION_LOG_SPILL_PATH,
+    max_spill_rows=cfg.DECISION_LOG_SPILL_MAX_ROWS,
+    max_spill_age_secs=cfg.DECISION_LOG_SPILL_MAX_AGE_SECS,
+    max_attempts=cfg.DECISION_LOG_MAX_ATTEMPTS,
+    dead_letter_path=cfg.DECISION_LOG_DEAD_LETTER_PATH,
+    dead_letter_max_bytes=int(cfg.DECISION_LOG_DEAD_LETTER_MAX_MB * 1024 * 1024),
+)
 
-        features_json = json.dumps(features, default=str)
 
+def log_decisions_bulk(rows):
+    """
+    Buffers rt.risk_withdraw_decision rows (from build_decision_row); they
+    are written as one multi-row INSERT by flush_decision_log() or when the
+    size/age threshold is hit.
+    """
+    try:
+        _DECISION_WRITER.append(rows)
+    except Exception as exc:
+        print(f"[RISK_FC] Error buffering decisions: {exc}")
+
+
+# Final rows only: rule PASS/REJECT, default PASS and real AI verdicts (no
+# idempotency.RETRYABLE_THREATS). Cheap with the table keys noted above.
+_FINAL_DECISION_FILTER = (
+    "(decision_source IN ('AI_AGENT_REVIEW', 'AI_AGENT_REVIEW_CACHED', 'RULE_ENGINE_DEFAULT_PASS') "
+    "OR (decision_source = 'RULE_ENGINE_RULES' AND decision IN ('PASS', 'REJECT'))) "
+    "AND primary_threat NOT IN ("
+    + ", ".join(f"'{threat}'" for threat in sorted(idempotency.RETRYABLE_THREATS))
+    + ")"
+)
+
+
+def _query_final_decisions(keys):
+    """
+    One probe of rt.risk_withdraw_decision for many (user_code, txn_id) keys.
+    Returns {key: result_payload} for the keys that already have a final row.
+    """
+    with _DB_POOL.connection() as conn:
+        cur = conn.cursor()
+        placeholders = ", ".join(["(%s, %s)"] * len(keys))
         cur.execute(
-            sql,
-            (
-                str(user_code),
-                str(txn_id),
-                decision,
-                threat,
-                confidence,
-                narrative,
-                features_json,
-                source,
-                llm_reasoning,
-            ),
+            "SELECT user_code, txn_id, decision, primary_threat, confidence, narrative, decision_source "
+            f"FROM rt.risk_withdraw_decision WHERE (user_code, txn_id) IN ({placeholders}) "
+            f"AND {_FINAL_DECISION_FILTER}",
+            [v for key in keys for v in key],
         )
-        conn.commit()
-        print(f"[RISK_FC] Decision logged. Source: {source}, decision={decision}")
-    except Exception as exc:
-        print(f"[RISK_FC] Error logging decision: {exc}")
-    finally:
-        if conn:
-            conn.close()
+        found = {}
+        for row in cur.fetchall():
+            user_code, txn_id, decision, threat, confidence, narrative, source = row
+            found.setdefault(
+                idempotency.decision_key(user_code, txn_id),
+                {
+                    "user_code": user_code,
+                    "txn_id": txn_id,
+                    "decision": decision,
+                    "reasons": [narrative],
+                    "primary_threat": threat,
+                    "confidence": confidence,
+                    "source": source,
+                },
+            )
+        return found
+
+
+_DECISION_LEDGER = idempotency.DecisionLedger(
+    probe=(lambda keys: _query_final_decisions(keys)) if cfg.IDEMPOTENCY_DB_PROBE else None,
+    max_entries=cfg.IDEMPOTENCY_CACHE_SIZE,
+    ttl_secs=cfg.IDEMPOTENCY_CACHE_TTL,
+    tag="RISK_FC",
+)
+
+
+def lookup_final_decisions(keys):
+    """
+    {(user_code, txn_id): recorded result_payload} for already-decided txns
+    (keys without a txn_id are never looked up).
+    """
+    keys = [(u, t) for u, t in keys if t]
+    if not cfg.IDEMPOTENCY_ENABLED or not keys:
+        return {}
+    return _DECISION_LEDGER.lookup(keys)
+
+
+def record_final_decision(user_code, txn_id_input, result_payload):
+    if cfg.IDEMPOTENCY_ENABLED:
+        _DECISION_LEDGER.record(user_code, txn_id_input, result_payload)
+
+
+def idempotency_stats():
+    return _DECISION_LEDGER.snapshot_stats()
+
+
+def log_decision_to_db(user_code, txn_id, result, features, source):
+    row = build_decision_row(user_code, txn_id, result, features, source)
+    log_decisions_bulk([row])
+    print(f"[RISK_FC] Decision buffered. Source: {source}, decision={row[2]}")
+
+
+def flush_decision_log():
+    """
+    Always called at handler exit (and pre-freeze); failures go to the spill file.
+    """
+    return _DECISION_WRITER.flush()
 
 
 
 # ==========================
 # RULE EVALUATION (rt.risk_rules)
 # ==========================
+# id(rules) -> (rules, RuleView); the list is kept so its id is not reused
+_RULE_VIEWS = {}
+
+
+def _rule_view(rules):
+    entry = _RULE_VIEWS.get(id(rules))
+    if entry is not None and entry[0] is rules:
+        return entry[1]
+    if any("code" not in rule for rule in rules):
+        return None  # uncompiled rules: names unknown, use the full record
+    view = feature_record.RuleView(rule_engine.referenced_features(rules))
+    if len(_RULE_VIEWS) >= 8:
+        _RULE_VIEWS.clear()
+    _RULE_VIEWS[id(rules)] = (rules, view)
+    return view
+
+
 def evaluate_fixed_rules(features, rules):
     """
     Evaluate rules from rt.risk_rules based purely on features in rt.risk_features.
+    `rules` are compiled by rule_engine (load_dynamic_rules does this once);
+    only the names they reference are read from the record (None -> 0).
     """
-    safe_locals = {}
-    for k, v in features.items():
-        safe_locals[k] = 0 if v is None else v
+    view = _rule_view(rules)
+    if view is not None:
+        safe_locals = view.get(features)
+    else:
+        safe_locals = {k: (0 if v is None else v) for k, v in features.items()}
+
+    served   = _RULE_CACHE.served(rules)
+    counters = None
+    sampled  = False
+    if _RULE_STATS is not None:
+        counters = _RULE_STATS.counters(rules, served["version"] if served else None)
+        sampled  = _RULE_STATS.sample_due()
 
-    for rule in rules:
+    # Served set: each distinct predicate once, first hit by priority.
+    # Sampled txns go rule by rule so each rule's time is seen.
+    index = served.get("rule_index") if served and not sampled else None
+    if index is not None:
+        position = index.first_index(
+            safe_locals, on_error=counters.record_error if counters is not None else None
+        )
+        if counters is not None:
+            counters.record_stop(position if position >= 0 else len(rules))
+        if position < 0:
+            return {"triggered": False}
+        rule = rules[position]
+        print(f"[RISK_FC] Rule HIT: {rule.get('rule_name')}")
+        return rule_engine.rule_hit_result(rule)
+
+    for position, rule in enumerate(rules):
+        started = time.perf_counter_ns() if sampled else 0
         try:
-            logic = rule["logic_expression"]
-            if eval(logic, {"__builtins__": None}, safe_locals):
-                print(f"[RISK_FC] Rule HIT: {rule.get('rule_name')}")
-                return {
-                    "triggered": True,
-                    "decision": rule["action"],  # PASS / HOLD / REJECT
-                    "primary_threat": "RULE_HIT",
-                    "risk_score": 100,
-                    "narrative": f"[Rule #{rule.get('rule_id')}] {rule.get('narrative')}",
-                    # NEW: pass rule metadata to AI
-                    "rule_id": rule.get("rule_id"),
-                    "rule_name": rule.get("rule_name"),
-                }
+            if "code" not in rule:
+                rule = rule_engine.compile_rule(rule)
+            matched = rule_engine.eval_compiled_rule(rule, safe_locals)
         except Exception as exc:
+            if counters is not None:
+                counters.record_error(position)
+            if sampled:
+                counters.record_sample(position, time.perf_counter_ns() - started)
             print(f"[RISK_FC] Error evaluating rule: {exc}")
             continue
+        if sampled:
+            counters.record_sample(position, time.perf_counter_ns() - started)
+        if matched:
+            if counters is not None:
+                counters.record_stop(position, sampled)
+            print(f"[RISK_FC] Rule HIT: {rule.get('rule_name')}")
+            return rule_engine.rule_hit_result(rule)
+    if counters is not None:
+        counters.record_stop(len(rules), sampled)
     return {"triggered": False}
 
 
+def _insert_rule_stats(rows):
+    """
+    One multi-row INSERT of rule_stats.STATS_COLUMNS rows into RULE_STATS_TABLE.
+    """
+    import rule_stats
+
+    columns = ", ".join(rule_stats.STATS_COLUMNS)
+    row_sql = "(to_timestamp(%s), to_timestamp(%s), " + ", ".join(["%s"] * (len(rule_stats.STATS_COLUMNS) - 2)) + ")"
+    with _DB_POOL.connection() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(rows), _DECISION_INSERT_PAGE_SIZE):
+            page = rows[i:i + _DECISION_INSERT_PAGE_SIZE]
+            cur.execute(
+                f"INSERT INTO {cfg.RULE_STATS_TABLE} ({columns}) VALUES {', '.join([row_sql] * len(page))}",
+                [v for row in page for v in row],
+            )
+        conn.commit()
+
+
+# Table writes go through a background thread, never on the decision path
+_RULE_STATS_SENDER = background_sender.BackgroundSender(_insert_rule_stats, name="RULE_STATS", maxsize=20)
+
+_RULE_STATS = None
+if cfg.RULE_STATS_ENABLED:
+    import rule_stats  # lazy: only loaded with RULE_STATS_ENABLED
+
+    _RULE_STATS = rule_stats.RuleStats(
+        sample_every=cfg.RULE_STATS_SAMPLE_EVERY,
+        flush_secs=cfg.RULE_STATS_FLUSH_SECS,
+        sink=_RULE_STATS_SENDER.submit if cfg.RULE_STATS_TABLE else None,
+    )
+
+
+def flush_rule_stats(force=False):
+    """
+    Periodic (every RULE_STATS_FLUSH_SECS; cheap check otherwise) or forced
+    at pre-freeze, where queued table writes are also drained.
+    """
+    if _RULE_STATS is None:
+        return 0
+    flushed = _RULE_STATS.flush(force)
+    if force and cfg.RULE_STATS_TABLE:
+        _RULE_STATS_SENDER.flush(cfg.LARK_FLUSH_DEADLINE_SECS)
+    return flushed
+
+
+def rule_stats_stats():
+    return _RULE_STATS.snapshot_stats() if _RULE_STATS is not None else None
+
+
 # ==========================
 # AI AGENT
 # ==========================
-def call_gemini_reasoning_rest(features, rule_context=None):
+_AI_VERDICT_CACHE = verdict_cache.VerdictCache(
+    max_entries=cfg.AI_CACHE_MAX_ENTRIES,
+    max_bytes=cfg.AI_CACHE_MAX_BYTES,
+    ttl_secs=cfg.AI_CACHE_TTL_SECS,
+)
+
+
+# Model + prompt text + encoding settings: a change to any of them must not
+# serve verdicts given under the old ones.
+_AI_PROMPT_KEY = verdict_cache.prompt_hash(
+    cfg.GEMINI_MODEL,
+    cfg.COMPREHENSIVE_REASONING_PROMPT,
+    cfg.BATCH_REASONING_INSTRUCTIONS,
+    cfg.AI_FLOAT_DIGITS,
+)
+
+
+def _verdict_cache_key(features, rule_context, rule_set_version):
+    return verdict_cache.case_fingerprint(
+        features,
+        rule_context,
+        cfg.AI_FEATURES,
+        sig_digits=cfg.AI_CACHE_SIG_DIGITS,
+        rule_set_version=rule_set_version,
+        prompt_key=_AI_PROMPT_KEY,
+    )
+
+
+_AI_PROMPT_STATS = {"calls": 0, "case_bytes": 0, "prompt_bytes": 0, "prompt_tokens_est": 0}
+
+
+def _record_prompt_size(case_str, full_text_prompt):
+    case_bytes, _                = ai_encoding.prompt_size(case_str)
+    prompt_bytes, prompt_tokens  = ai_encoding.prompt_size(full_text_prompt)
+    _AI_PROMPT_STATS["calls"]             += 1
+    _AI_PROMPT_STATS["case_bytes"]        += case_bytes
+    _AI_PROMPT_STATS["prompt_bytes"]      += prompt_bytes
+    _AI_PROMPT_STATS["prompt_tokens_est"] += prompt_tokens
+    print(
+        f"[RISK_FC] Gemini prompt size: case={case_bytes}B "
+        f"prompt={prompt_bytes}B ~{prompt_tokens} tokens"
+    )
+
+
+def ai_prompt_stats():
+    return dict(_AI_PROMPT_STATS)
+
+
+def ai_cache_stats():
+    return _AI_VERDICT_CACHE.snapshot_stats()
+
+
+# Shared by every invocation in this instance
+_GEMINI_BREAKER = circuit_breaker.CircuitBreaker(
+    "GEMINI",
+    failure_threshold=cfg.GEMINI_BREAKER_FAILURES,
+    p95_threshold_ms=cfg.GEMINI_BREAKER_P95_MS,
+    open_secs=cfg.GEMINI_BREAKER_OPEN_SECS,
+)
+
+
+def call_gemini_reasoning_rest(features, rule_context=None, rule_set_version=None, deadline=None):
     """
     Phase-2 AI Agent.
 
     Input:
       - features: dict from rt.risk_features
       - rule_context: dict from evaluate_fixed_rules (contains rule_id, rule_name, narrative, decision=HOLD)
+      - rule_set_version: version of the rule set that produced rule_context (verdict cache key)
+      - deadline: time.monotonic() by which the call must end (default: now + GEMINI_DEADLINE_SECS)
 
     Output (dict):
       {
@@ -343,97 +1036,59 @@ def call_gemini_reasoning_rest(features, rule_context=None):
         "narrative": str,
         "rule_alignment": "AGREES_WITH_RULE" | "OVERRIDES_TO_PASS" | "OVERRIDES_TO_REJECT"
       }
+    Verdicts served from the verdict cache additionally carry "cached": True.
     """
     if not cfg.GEMINI_API_KEY:
         return {
             "final_decision": "HOLD",
-            "primary_threat": "NONE",
+            "primary_threat": "AI_CONFIG",
             "risk_score": 0,
             "confidence": 0.5,
             "narrative": "AI config missing. Keeping HOLD for manual review.",
             "rule_alignment": "AGREES_WITH_RULE",
         }
 
-    try:
-        case_payload = {
-            "features": features,
-            "rule_engine": {
-                "initial_decision": (rule_context or {}).get("decision", "HOLD"),
-                "rule_id": (rule_context or {}).get("rule_id"),
-                "rule_name": (rule_context or {}).get("rule_name"),
-                "rule_narrative": (rule_context or {}).get("narrative"),
-            },
-        }
+    cache_key = None
+    if cfg.AI_CACHE_ENABLED:
+        cache_key = _verdict_cache_key(features, rule_context, rule_set_version)
+        cached    = _AI_VERDICT_CACHE.get(cache_key)
+        if cached is not None:
+            print(f"[RISK_FC] AI verdict cache HIT ({cache_key[:12]})")
+            cached["cached"] = True
+            return cached
 
-        case_str          = json.dumps(case_payload, indent=2, default=str)
-        full_text_prompt  = f"{cfg.COMPREHENSIVE_REASONING_PROMPT}\n\nCase JSON:\n{case_str}"
+    if deadline is not None and deadline <= time.monotonic():
+        return _ai_net_err_fallback("AI time budget spent. Keeping HOLD for manual review.")
 
-        api_url = (
-            f"https://generativelanguage.googleapis.com/v1/models/"
-            f"{cfg.GEMINI_MODEL}:generateContent?key={cfg.GEMINI_API_KEY}"
-        )
-        payload = {"contents": [{"parts": [{"text": full_text_prompt}]}]}
-        data    = json.dumps(payload).encode("utf-8")
-        req     = urllib.request.Request(
-            api_url, data=data, headers={"Content-Type": "application/json"}
+    if not _GEMINI_BREAKER.allow():
+        print("[RISK_FC] Gemini circuit OPEN, short-circuiting to HOLD")
+        return _ai_net_err_fallback("AI circuit open (Gemini degraded). Keeping HOLD for manual review.")
+
+    call_started = time.monotonic()
+    try:
+        case_str          = ai_encoding.encode_case(
+            features, rule_context, cfg.AI_FEATURES, cfg.AI_FLOAT_DIGITS
         )
+        full_text_prompt  = f"{cfg.COMPREHENSIVE_REASONING_PROMPT}\n\nCase JSON:\n{case_str}"
+        _record_prompt_size(case_str, full_text_prompt)
 
-        for attempt in range(3):
-            try:
-                with urllib.request.urlopen(req, timeout=30) as response:
-                    if response.status == 200:
-                        resp_json  = json.loads(response.read().decode("utf-8"))
-                        candidates = resp_json.get("candidates", [])
-                        if not candidates:
-                            break
-
-                        raw_text = (
-                            candidates[0]
-                            .get("content", {})
-                            .get("parts", [])[0]
-                            .get("text", "")
-                        )
-                        clean_text = (
-                            raw_text.strip()
-                            .replace("```json", "")
-                            .replace("```", "")
-                            .strip()
-                        )
-                        ai_obj = json.loads(clean_text)
-
-                        # Normalise / validate fields & defaults
-                        final_decision = ai_obj.get("final_decision", "HOLD")
-                        primary_threat = ai_obj.get("primary_threat", "NONE")
-                        risk_score     = int(ai_obj.get("risk_score", 0) or 0)
-                        confidence     = float(ai_obj.get("confidence", 0.7) or 0.7)
-                        narrative      = ai_obj.get("narrative", "AI evaluation.")
-                        rule_alignment = ai_obj.get("rule_alignment", "AGREES_WITH_RULE")
-
-                        return {
-                            "final_decision": final_decision,
-                            "primary_threat": primary_threat,
-                            "risk_score": risk_score,
-                            "confidence": confidence,
-                            "narrative": narrative,
-                            "rule_alignment": rule_alignment,
-                        }
-            except urllib.error.HTTPError as e:
-                print(f"[RISK_FC] HTTP Error (Gemini): {e.code}")
-                time.sleep(1)
-            except Exception as e:
-                print(f"[RISK_FC] Gemini error attempt {attempt+1}: {e}")
-                time.sleep(1)
-
-        # Fallback if all attempts fail or JSON is bad
-        return {
-            "final_decision": "HOLD",
-            "primary_threat": "AI_NET_ERR",
-            "risk_score": -1,
-            "confidence": 0.5,
-            "narrative": "AI unavailable or invalid response. Keeping HOLD for manual review.",
-            "rule_alignment": "AGREES_WITH_RULE",
-        }
+        verdict = _gemini_generate_with_budget(full_text_prompt, call_started, deadline=deadline)
+        latency_ms = (time.monotonic() - call_started) * 1000.0
+        _record_ai_throughput("single", 1, latency_ms)
+        if verdict is None:
+            _GEMINI_BREAKER.record_failure(latency_ms)
+            # Fallback if all attempts fail or JSON is bad
+            return _ai_net_err_fallback(
+                "AI unavailable or invalid response. Keeping HOLD for manual review."
+            )
+
+        _GEMINI_BREAKER.record_success(latency_ms)
+        # Only real model verdicts are cached, never fallbacks
+        if cache_key is not None:
+            _AI_VERDICT_CACHE.put(cache_key, verdict)
+        return verdict
     except Exception as exc:
+        _GEMINI_BREAKER.record_failure((time.monotonic() - call_started) * 1000.0)
         print(f"[RISK_FC] Gemini fatal error: {exc}")
         return {
             "final_decision": "HOLD",
@@ -445,3 +1100,264 @@ def call_gemini_reasoning_rest(features, rule_context=None):
         }
 
 
+def _ai_net_err_fallback(narrative):
+    return {
+        "final_decision": "HOLD",
+        "primary_threat": "AI_NET_ERR",
+        "risk_score": -1,
+        "confidence": 0.5,
+        "narrative": narrative,
+        "rule_alignment": "AGREES_WITH_RULE",
+    }
+
+
+def _gemini_response_text(resp_json):
+    """
+    Text of the first candidate with code fences stripped, or None if the
+    model returned no candidates.
+    """
+    candidates = resp_json.get("candidates", [])
+    if not candidates:
+        return None
+
+    raw_text = (
+        candidates[0]
+        .get("content", {})
+        .get("parts", [])[0]
+        .get("text", "")
+    )
+    return (
+        raw_text.strip()
+        .replace("```json", "")
+        .replace("```", "")
+        .strip()
+    )
+
+
+def _parse_gemini_verdict(resp_json):
+    """
+    Gemini generateContent response -> normalised verdict dict, or None if
+    the model returned no candidates. Raises on malformed JSON text.
+    """
+    clean_text = _gemini_response_text(resp_json)
+    if clean_text is None:
+        return None
+    ai_obj = json.loads(clean_text)
+    return _normalise_verdict(ai_obj)
+
+
+def _normalise_verdict(ai_obj):
+    # Normalise / validate fields & defaults
+    final_decision = ai_obj.get("final_decision", "HOLD")
+    primary_threat = ai_obj.get("primary_threat", "NONE")
+    risk_score     = int(ai_obj.get("risk_score", 0) or 0)
+    confidence     = float(ai_obj.get("confidence", 0.7) or 0.7)
+    narrative      = ai_obj.get("narrative", "AI evaluation.")
+    rule_alignment = ai_obj.get("rule_alignment", "AGREES_WITH_RULE")
+
+    return {
+        "final_decision": final_decision,
+        "primary_threat": primary_threat,
+        "risk_score": risk_score,
+        "confidence": confidence,
+        "narrative": narrative,
+        "rule_alignment": rule_alignment,
+    }
+
+
+def _gemini_generate_with_budget(prompt_text, started, parse=_parse_gemini_verdict, deadline=None):
+    """
+    Retries the generateContent call until it yields a verdict or the budget
+    is spent: `deadline` (time.monotonic()) when given, else
+    GEMINI_DEADLINE_SECS measured from `started`.
+    Each attempt's socket timeout is whatever budget is left.
+    Returns parse(resp_json), or None when the budget is exhausted.
+    """
+    if deadline is None:
+        deadline = started + cfg.GEMINI_DEADLINE_SECS
+    api_url = (
+        f"{cfg.GEMINI_API_BASE}/v1/models/"
+        f"{cfg.GEMINI_MODEL}:generateContent?key={cfg.GEMINI_API_KEY}"
+    )
+    payload = {"contents": [{"parts": [{"text": prompt_text}]}]}
+
+    for attempt in range(cfg.GEMINI_MAX_ATTEMPTS):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print("[RISK_FC] Gemini time budget exhausted")
+            break
+        try:
+            # generateContent has no side effects: safe to resend on a stale socket
+            response = _HTTP.post_json(api_url, payload, timeout=remaining, resend_stale=True)
+            if response.status == 200:
+                return parse(response.json())
+        except http_client.HTTPStatusError as e:
+            print(f"[RISK_FC] HTTP Error (Gemini): {e.code}")
+        except Exception as e:
+            print(f"[RISK_FC] Gemini error attempt {attempt+1}: {e}")
+        # Back off, but never past the deadline
+        time.sleep(max(0.0, min(cfg.GEMINI_RETRY_BACKOFF_SECS, deadline - time.monotonic())))
+    return None
+
+
+_BATCH_VERDICT_DECISIONS = ("PASS", "HOLD", "REJECT")
+
+
+def _parse_gemini_batch(resp_json):
+    """
+    Batch response -> {case_id: verdict}. Items that are not objects, lack a
+    case_id, carry an unknown final_decision or fail normalisation are
+    skipped (their cases fall back to single-case calls). None when the
+    response carries no text.
+    """
+    clean_text = _gemini_response_text(resp_json)
+    if clean_text is None:
+        return None
+    items = json.loads(clean_text)
+    if isinstance(items, dict):
+        items = items.get("verdicts") or items.get("cases") or [items]
+    if not isinstance(items, list):
+        raise ValueError("batch response is not a JSON array")
+
+    by_id = {}
+    for item in items:
+        if not isinstance(item, dict) or item.get("case_id") is None:
+            continue
+        if item.get("final_decision") not in _BATCH_VERDICT_DECISIONS:
+            continue
+        try:
+            by_id[str(item["case_id"])] = _normalise_verdict(item)
+        except Exception as exc:
+            print(f"[RISK_FC] Malformed batch verdict for case {item.get('case_id')}: {exc}")
+    return by_id
+
+
+def _chunk_fallback(chunk_cases, narrative):
+    fallback = _ai_net_err_fallback(narrative)
+    return {pos: dict(fallback) for pos, _, _ in chunk_cases}
+
+
+def _adjudicate_chunk(chunk_cases, deadline):
+    """
+    One Gemini request for several cases, bounded by `deadline`.
+    Returns {position: verdict}:
+      - a valid answer: the cases it answered; missing or malformed cases
+        are absent (the caller sends them one by one)
+      - transport failure, budget spent or unparseable answer: every case
+        gets the AI_NET_ERR HOLD, so a dead Gemini costs one budget, not one
+        per case
+    """
+    if not _GEMINI_BREAKER.allow():
+        print("[RISK_FC] Gemini circuit OPEN, short-circuiting batch to HOLD")
+        return _chunk_fallback(chunk_cases, "AI circuit open (Gemini degraded). Keeping HOLD for manual review.")
+
+    case_ids = {f"c{n + 1}": pos for n, (pos, _, _) in enumerate(chunk_cases)}
+    started  = time.monotonic()
+    try:
+        cases_str = ai_encoding.encode_batch(
+            [(cid, f, r) for cid, (_, f, r) in zip(case_ids, chunk_cases)],
+            cfg.AI_FEATURES,
+            cfg.AI_FLOAT_DIGITS,
+        )
+        full_text_prompt = (
+            f"{cfg.COMPREHENSIVE_REASONING_PROMPT}\n{cfg.BATCH_REASONING_INSTRUCTIONS}"
+            f"\n\nCases JSON:\n{cases_str}"
+        )
+        _record_prompt_size(cases_str, full_text_prompt)
+        by_id = _gemini_generate_with_budget(
+            full_text_prompt, started, parse=_parse_gemini_batch, deadline=deadline
+        )
+    except Exception as exc:
+        print(f"[RISK_FC] Gemini batch error: {exc}")
+        by_id = None
+
+    latency_ms = (time.monotonic() - started) * 1000.0
+    if by_id is None:
+        _GEMINI_BREAKER.record_failure(latency_ms)
+        return _chunk_fallback(chunk_cases, "AI unavailable or invalid response. Keeping HOLD for manual review.")
+    _GEMINI_BREAKER.record_success(latency_ms)
+    _record_ai_throughput("batch", len(chunk_cases), latency_ms)
+    return {case_ids[cid]: verdict for cid, verdict in by_id.items() if cid in case_ids}
+
+
+def call_gemini_reasoning_batch(cases, rule_set_version=None):
+    """
+    Phase-2 AI Agent for several HOLD cases at once.
+
+    Input:  list of (features, rule_context), plus the rule set version
+    Output: list of verdict dicts (same order, same shape as
+            call_gemini_reasoning_rest). Cases are packed GEMINI_BATCH_SIZE per
+            request; any case missing or malformed in an otherwise valid
+            batch answer falls back to a single-case call. A failed batch
+            request HOLDs its whole chunk (AI_NET_ERR). Batches and fallbacks
+            share one GEMINI_DEADLINE_SECS budget.
+    """
+    if not cases:
+        return []
+    if not cfg.GEMINI_API_KEY or cfg.GEMINI_BATCH_SIZE <= 1 or len(cases) == 1:
+        return [
+            call_gemini_reasoning_rest(f, rule_context=r, rule_set_version=rule_set_version)
+            for f, r in cases
+        ]
+
+    verdicts   = [None] * len(cases)
+    cache_keys = [None] * len(cases)
+    if cfg.AI_CACHE_ENABLED:
+        for pos, (features, rule_context) in enumerate(cases):
+            cache_keys[pos] = _verdict_cache_key(features, rule_context, rule_set_version)
+            cached = _AI_VERDICT_CACHE.get(cache_keys[pos])
+            if cached is not None:
+                cached["cached"] = True
+                verdicts[pos] = cached
+
+    deadline = time.monotonic() + cfg.GEMINI_DEADLINE_SECS
+    todo     = [(pos, f, r) for pos, (f, r) in enumerate(cases) if verdicts[pos] is None]
+    for i in range(0, len(todo), cfg.GEMINI_BATCH_SIZE):
+        chunk = todo[i:i + cfg.GEMINI_BATCH_SIZE]
+        if len(chunk) == 1:
+            continue  # single-case path below
+        for pos, verdict in _adjudicate_chunk(chunk, deadline).items():
+            verdicts[pos] = verdict
+            if cache_keys[pos] is not None and verdict.get("primary_threat") != "AI_NET_ERR":
+                _AI_VERDICT_CACHE.put(cache_keys[pos], verdict)
+
+    missing = [pos for pos, v in enumerate(verdicts) if v is None]
+    if missing:
+        print(f"[RISK_FC] {len(missing)} case(s) missing from batch verdicts, calling one by one")
+    for pos in missing:
+        features, rule_context = cases[pos]
+        verdicts[pos] = call_gemini_reasoning_rest(
+            features, rule_context=rule_context, rule_set_version=rule_set_version,
+            deadline=deadline,
+        )
+    return verdicts
+
+
+_AI_THROUGHPUT = {
+    "single": {"requests": 0, "cases": 0, "seconds": 0.0},
+    "batch": {"requests": 0, "cases": 0, "seconds": 0.0},
+}
+
+
+def _record_ai_throughput(mode, n_cases, latency_ms):
+    stats = _AI_THROUGHPUT[mode]
+    stats["requests"] += 1
+    stats["cases"]    += n_cases
+    stats["seconds"]  += latency_ms / 1000.0
+
+
+def ai_throughput_stats():
+    """
+    Cases/sec of Gemini wall time, one-by-one vs batched.
+    """
+    out = {}
+    for mode, stats in _AI_THROUGHPUT.items():
+        out[mode] = dict(stats)
+        out[mode]["cases_per_sec"] = (
+            stats["cases"] / stats["seconds"] if stats["seconds"] > 0 else None
+        )
+    return out
+
+
+def gemini_breaker_stats():
+    return _GEMINI_BREAKER.snapshot_stats()
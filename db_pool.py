@@ -0,0 +1,171 @@
+# db_pool.py
+# Persistent Hologres connection pool shared across warm FC invocations.
+# Used by core.py (risk decision FC) and enrichment-worker.py.
+
+import threading
+import time
+from contextlib import contextmanager
+
+print("[DB_POOL] Loading db_pool.py")
+
+
+def _is_connection_error(exc):
+    """
+    True for connection-level psycopg2 failures. psycopg2 is imported lazily:
+    by the time a connection exists, the module is already loaded.
+    """
+    import psycopg2
+
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+def _is_stale_plan(exc):
+    # SQLSTATE 0A000 = feature_not_supported, raised for a prepared statement
+    # whose result columns changed since it was PREPAREd.
+    return (
+        getattr(exc, "pgcode", None) == "0A000"
+        and "cached plan must not change result type" in str(exc)
+    )
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of psycopg2 connections.
+
+    - Connections live at module level, so they survive warm invocations.
+    - Before reuse, a connection is checked cheaply (conn.closed); if it sat
+      idle longer than healthcheck_secs it is also pinged with SELECT 1.
+    - Broken connections (network blip, server restart) are discarded and
+      replaced transparently on the next acquire.
+    - `prepared` = {name: sql}; each statement is PREPAREd server-side once
+      per physical connection and is run with execute_prepared().
+    """
+
+    def __init__(self, connect, maxconn=4, healthcheck_secs=30.0, prepared=None, tag="DB_POOL"):
+        self._connect          = connect
+        self._maxconn          = maxconn
+        self._healthcheck_secs = healthcheck_secs
+        self._prepared         = dict(prepared or {})
+        self._tag              = tag
+        self._idle             = []   # [(conn, last_used_monotonic)]
+        self._lock             = threading.Lock()
+        self.stats             = {"opened": 0, "reused": 0, "discarded": 0, "reprepared": 0}
+
+    # --------------------------
+    # internals
+    # --------------------------
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _open(self):
+        conn = self._connect()
+        self._count("opened")
+        if self._prepared:
+            cur = conn.cursor()
+            for name, sql in self._prepared.items():
+                cur.execute(f"PREPARE {name} AS {sql}")
+            conn.commit()
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self._healthcheck_secs:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            conn.rollback()
+            return True
+        except Exception as exc:
+            print(f"[{self._tag}] Health check failed, reconnecting: {exc}")
+            return False
+
+    def _discard(self, conn):
+        self._count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if self._is_healthy(conn, time.monotonic() - last_used):
+                self._count("reused")
+                return conn
+            self._discard(conn)
+        return self._open()
+
+    def _release(self, conn):
+        if conn.closed:
+            self._count("discarded")
+            return
+        try:
+            conn.rollback()  # no-op when idle; clears aborted transactions
+        except Exception:
+            self._discard(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self._maxconn:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    # --------------------------
+    # public API
+    # --------------------------
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn: ...
+        Commit explicitly; anything uncommitted is rolled back on release.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception as exc:
+            if _is_connection_error(exc):
+                # Connection-level failure: never hand this one out again.
+                self._discard(conn)
+            else:
+                self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def execute_prepared(self, conn, name, params):
+        """
+        Runs EXECUTE name (params...) on conn and returns the cursor.
+        Must be the first statement of its transaction: when the statement's
+        result columns changed under it (ALTER TABLE behind a SELECT *:
+        "cached plan must not change result type") the transaction is rolled
+        back, the statement is PREPAREd again and run once more.
+        """
+        sql = f"EXECUTE {name} (" + ", ".join(["%s"] * len(params)) + ")"
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            return cur
+        except Exception as exc:
+            if not _is_stale_plan(exc):
+                raise
+        print(f"[{self._tag}] Result type of prepared {name} changed, preparing it again")
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f"DEALLOCATE {name}")
+        cur.execute(f"PREPARE {name} AS {self._prepared[name]}")
+        cur.execute(sql, params)
+        self._count("reprepared")
+        return cur
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
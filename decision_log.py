@@ -0,0 +1,238 @@
+# decision_log.py
+# Write-behind buffer for rt.risk_withdraw_decision rows.
+# Rows are appended in memory and written as ONE multi-row INSERT when the
+# buffer hits max_rows / max_age_secs, and always at handler exit.
+# A failed flush spills the rows to a local JSONL file instead of losing them.
+# Spilled rows are retried on later flushes separately from the fresh rows,
+# so one bad row never blocks new decisions:
+#   - a failing spill batch is bisected (once the DB is known to be up) down
+#     to the rows that fail on their own
+#   - a row that failed on its own max_attempts times, or sat in the spill
+#     longer than max_spill_age_secs, or overflows max_spill_rows, moves to
+#     a dead-letter JSONL file (same line format; move it back over the
+#     spill file to retry, e.g. after an ALTER TABLE)
+
+import json
+import os
+import threading
+import time
+
+print("[RISK_FC] Loading decision_log.py")
+
+
+class BufferedDecisionWriter:
+    """
+    write_fn(rows) must insert all rows (list of tuples) or raise.
+    """
+
+    def __init__(
+        self,
+        write_fn,
+        max_rows=200,
+        max_age_secs=2.0,
+        spill_path=None,
+        max_spill_rows=10000,
+        max_spill_age_secs=86400.0,
+        max_attempts=5,
+        dead_letter_path=None,
+        dead_letter_max_bytes=64 * 1024 * 1024,
+    ):
+        self._write_fn              = write_fn
+        self._max_rows              = max_rows
+        self._max_age_secs          = max_age_secs
+        self._spill_path            = spill_path
+        self._max_spill_rows        = max_spill_rows
+        self._max_spill_age_secs    = max_spill_age_secs
+        self._max_attempts          = max_attempts
+        self._dead_letter_path      = dead_letter_path or (spill_path + ".dead" if spill_path else None)
+        self._dead_letter_max_bytes = dead_letter_max_bytes
+        self._buffer                = []
+        self._oldest_at             = None
+        self._buffer_lock           = threading.Lock()
+        self._flush_lock            = threading.Lock()
+        self.stats                  = {
+            "buffered": 0,
+            "flushes": 0,
+            "written": 0,
+            "spilled": 0,
+            "unspilled": 0,
+            "dead_lettered": 0,
+            "dropped": 0,
+        }
+
+    def append(self, rows):
+        if not rows:
+            return
+        with self._buffer_lock:
+            if not self._buffer:
+                self._oldest_at = time.monotonic()
+            self._buffer.extend(rows)
+            self.stats["buffered"] += len(rows)
+            due = (
+                len(self._buffer) >= self._max_rows
+                or time.monotonic() - self._oldest_at >= self._max_age_secs
+            )
+        if due:
+            self.flush()
+
+    def pending(self):
+        with self._buffer_lock:
+            return len(self._buffer)
+
+    # --------------------------
+    # spill / dead-letter files
+    # --------------------------
+    # One JSON object per line: {"row": [...], "attempts": n, "spilled_at": epoch}
+    @staticmethod
+    def _entry(row, attempts=0, spilled_at=None):
+        return {"row": list(row), "attempts": attempts, "spilled_at": spilled_at or time.time()}
+
+    def _read_spill(self):
+        if not self._spill_path or not os.path.exists(self._spill_path):
+            return []
+        entries = []
+        try:
+            with open(self._spill_path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if isinstance(item, list):   # bare row, written before attempts were tracked
+                        item = self._entry(item)
+                    entries.append(item)
+        except Exception as exc:
+            print(f"[RISK_FC] Could not read decision spill file: {exc}")
+        return entries
+
+    def _write_spill(self, entries):
+        """
+        Rewrites the spill file with exactly `entries` (empty -> remove file).
+        """
+        if not self._spill_path:
+            if entries:
+                self.stats["dropped"] += len(entries)
+                print(f"[RISK_FC] No spill path configured, {len(entries)} decision row(s) lost")
+            return
+        try:
+            if not entries:
+                if os.path.exists(self._spill_path):
+                    os.remove(self._spill_path)
+                return
+            tmp_path = self._spill_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                for entry in entries:
+                    fh.write(json.dumps(entry, default=str) + "\n")
+            os.replace(tmp_path, self._spill_path)
+        except Exception as exc:
+            print(f"[RISK_FC] Could not write decision spill file: {exc}")
+
+    def _dead_letter(self, entries, reason):
+        """
+        Appends entries to the dead-letter file (dropped once it is full).
+        """
+        if not entries:
+            return
+        path = self._dead_letter_path
+        try:
+            if path is None:
+                raise OSError("no dead-letter path configured")
+            if os.path.exists(path) and os.path.getsize(path) >= self._dead_letter_max_bytes:
+                raise OSError(f"{path} is full ({self._dead_letter_max_bytes} bytes)")
+            with open(path, "a", encoding="utf-8") as fh:
+                for entry in entries:
+                    fh.write(json.dumps(entry, default=str) + "\n")
+        except Exception as exc:
+            self.stats["dropped"] += len(entries)
+            print(f"[RISK_FC] {len(entries)} decision row(s) dropped ({reason}): {exc}")
+            return
+        self.stats["dead_lettered"] += len(entries)
+        print(f"[RISK_FC] {len(entries)} decision row(s) moved to {path} ({reason})")
+
+    # --------------------------
+    # flush
+    # --------------------------
+    def _try_write(self, rows):
+        try:
+            self._write_fn(rows)
+            return True
+        except Exception as exc:
+            print(f"[RISK_FC] Decision log write of {len(rows)} row(s) failed: {exc}")
+            return False
+
+    def _retry_spilled(self, entries, db_up):
+        """
+        Writes spilled entries; a failing chunk is split in halves while the
+        DB is known to be up (something was written in this flush), so rows
+        that fail on their own are isolated. Returns (kept, dead, written).
+        """
+        kept, dead = [], []
+        written    = 0
+        chunks     = [entries]
+        while chunks:
+            chunk = chunks.pop(0)
+            if self._try_write([tuple(e["row"]) for e in chunk]):
+                db_up    = True
+                written += len(chunk)
+                continue
+            if not db_up:
+                kept += chunk   # DB may just be down: no attempt is charged
+            elif len(chunk) > 1:
+                mid = len(chunk) // 2
+                chunks[:0] = [chunk[:mid], chunk[mid:]]
+            else:
+                entry = chunk[0]
+                entry["attempts"] = entry.get("attempts", 0) + 1
+                (dead if entry["attempts"] >= self._max_attempts else kept).append(entry)
+        return kept, dead, written
+
+    def flush(self):
+        """
+        Writes buffered rows in one INSERT, then retries spilled rows on their
+        own. Returns True when the buffered rows were written.
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer, self._oldest_at = self._buffer, [], None
+
+            spilled = self._read_spill()
+            if not rows and not spilled:
+                return True
+
+            self.stats["flushes"] += 1
+            ok = True
+            if rows:
+                ok = self._try_write(rows)
+                if ok:
+                    self.stats["written"] += len(rows)
+                    print(f"[RISK_FC] {len(rows)} decision(s) logged in one INSERT.")
+
+            kept = []
+            if spilled:
+                cutoff = time.time() - self._max_spill_age_secs
+                live   = [e for e in spilled if e.get("spilled_at", 0) >= cutoff]
+                self._dead_letter([e for e in spilled if e.get("spilled_at", 0) < cutoff], "spill age limit")
+                if ok and live:
+                    kept, dead, written = self._retry_spilled(live, db_up=bool(rows))
+                    self._dead_letter(dead, f"failed {self._max_attempts} times on its own")
+                    self.stats["unspilled"] += written
+                    self.stats["written"]   += written
+                    if written:
+                        print(f"[RISK_FC] {written} spilled decision(s) logged.")
+                elif not ok:
+                    kept = live   # DB unreachable: leave the spill alone
+
+            if not ok:
+                print(f"[RISK_FC] Spilling {len(rows)} decision row(s) to {self._spill_path}")
+                now   = time.time()
+                kept += [self._entry(row, spilled_at=now) for row in rows]
+                self.stats["spilled"] += len(rows)
+
+            overflow = len(kept) - self._max_spill_rows
+            if overflow > 0:
+                self._dead_letter(kept[:overflow], "spill size limit")
+                kept = kept[overflow:]
+
+            if spilled or kept:
+                self._write_spill(kept)
+            return ok
@@ -8,12 +8,14 @@ import os
 import json
 import base64
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone, timedelta
+from urllib.parse import urlsplit
 
 import psycopg2
-import psycopg2.extras
-import urllib.request
-import urllib.error
+
+import db_pool
+import http_client
 
 
 print("[ENRICH_WORKER] Initializing enrichment worker...")
@@ -33,6 +35,17 @@ CHAINALYSIS_URL     = "https://public.chainalysis.com/api/v1/address"
 BLOCKCHAIR_API_KEY  = os.environ.get("BLOCKCHAIR_API_KEY")
 BLOCKCHAIR_BASE_URL = "https://api.blockchair.com"
 
+# Outbound HTTP: per-provider timeout + concurrency cap
+PROVIDER_TIMEOUT_SECS = float(os.environ.get("PROVIDER_TIMEOUT_SECS", "5"))
+PROVIDER_MAX_CONNS    = int(os.environ.get("PROVIDER_MAX_CONNS", "4"))
+
+# Provider fan-out: concurrent calls per provider, and a wall-clock budget for
+# the calls of one batch (keep it under the function timeout, leaving room for
+# the upserts). Calls unfinished at the deadline are recorded as PENDING.
+SANCTIONS_MAX_CONCURRENCY = int(os.environ.get("SANCTIONS_MAX_CONCURRENCY", str(PROVIDER_MAX_CONNS)))
+AGE_MAX_CONCURRENCY       = int(os.environ.get("AGE_MAX_CONCURRENCY", str(PROVIDER_MAX_CONNS)))
+BATCH_DEADLINE_SECS       = float(os.environ.get("BATCH_DEADLINE_SECS", "45"))
+
 # Re-enrichment threshold (how often we re-check an address)
 RECHECK_INTERVAL_HOURS = 24
 
@@ -50,162 +63,175 @@ def get_db_conn():
     )
 
 
-def should_refresh_sanctions(chain, address):
+# Module-level pool: survives warm invocations, reconnects after blips.
+_DB_POOL = db_pool.ConnectionPool(
+    get_db_conn,
+    maxconn=int(os.environ.get("DB_POOL_MAXCONN", "4")),
+    healthcheck_secs=float(os.environ.get("DB_POOL_HEALTHCHECK_SECS", "30")),
+    tag="ENRICH_WORKER",
+)
+
+
+# Keys per freshness query / rows per upsert statement
+DB_BATCH_PAGE_SIZE = int(os.environ.get("DB_BATCH_PAGE_SIZE", "500"))
+
+
+def _needs_refresh(status, last_checked_at, now_utc):
     """
-    Returns True if we should call sanctions API for this (chain, address).
-    Logic:
-      - If no row => True
-      - If status in ('ERROR', 'PENDING') => True
-      - If last_checked_at older than RECHECK_INTERVAL_HOURS => True
-      - Else => False (already fresh)
+    True if the provider should be called again for this dim row:
+      - status in ('ERROR', 'PENDING') (or missing)
+      - last_checked_at missing or older than RECHECK_INTERVAL_HOURS
     """
-    conn = None
-    try:
-        conn = get_db_conn()
-        cur  = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute(
-            """
-            SELECT sanctions_status, last_checked_at
-            FROM rt.dim_sanctions_address
-            WHERE chain = %s AND destination_address = %s
-            """,
-            (chain, address),
-        )
-        row = cur.fetchone()
-        if not row:
-            return True
-
-        status = row["sanctions_status"] or "PENDING"
-        last_checked_at = row["last_checked_at"]
-
-        if status in ("ERROR", "PENDING"):
-            return True
-
-        if last_checked_at is None:
-            return True
-
-        # Check recency
-        now_utc = datetime.now(timezone.utc)
-        if now_utc - last_checked_at > timedelta(hours=RECHECK_INTERVAL_HOURS):
-            return True
-
-        return False
-    except Exception as e:
-        print(f"[ENRICH_WORKER] should_refresh_sanctions error: {e}")
-        # If we can't decide, better to re-check
+    if (status or "PENDING") in ("ERROR", "PENDING"):
+        return True
+    if last_checked_at is None:
         return True
-    finally:
-        if conn:
-            conn.close()
+    if last_checked_at.tzinfo is None:
+        last_checked_at = last_checked_at.replace(tzinfo=timezone.utc)
+    return now_utc - last_checked_at > timedelta(hours=RECHECK_INTERVAL_HOURS)
+
+
+def _pages(items):
+    for i in range(0, len(items), DB_BATCH_PAGE_SIZE):
+        yield items[i:i + DB_BATCH_PAGE_SIZE]
 
 
-def upsert_sanctions(chain, address, is_sanctioned, status, error_msg=None):
-    conn = None
+def keys_needing_refresh(table, status_column, keys):
+    """
+    ONE query per page of (chain, address) keys against a dim table.
+    Returns the subset of keys to re-enrich: no row yet, ERROR / PENDING,
+    or stale. If the check fails, every key is re-checked.
+    """
+    if not keys:
+        return set()
     try:
-        conn = get_db_conn()
-        cur  = conn.cursor()
-        sql = """
-            INSERT INTO rt.dim_sanctions_address
-                (chain, destination_address, is_sanctioned, sanctions_status, last_checked_at, last_error)
-            VALUES (%s, %s, %s, %s, now(), %s)
-            ON CONFLICT (chain, destination_address)
-            DO UPDATE SET
-                is_sanctioned    = EXCLUDED.is_sanctioned,
-                sanctions_status = EXCLUDED.sanctions_status,
-                last_checked_at  = EXCLUDED.last_checked_at,
-                last_error       = EXCLUDED.last_error
-        """
-        cur.execute(sql, (chain, address, is_sanctioned, status, error_msg))
-        conn.commit()
-        print(
-            f"[ENRICH_WORKER] Upsert sanctions ({chain}, {address}) "
-            f"is_sanctioned={is_sanctioned}, status={status}"
-        )
+        found = {}
+        with _DB_POOL.connection() as conn:
+            cur = conn.cursor()
+            for page in _pages(keys):
+                placeholders = ", ".join(["(%s, %s)"] * len(page))
+                cur.execute(
+                    f"""
+                    SELECT chain, destination_address, {status_column}, last_checked_at
+                    FROM {table}
+                    WHERE (chain, destination_address) IN ({placeholders})
+                    """,
+                    [v for key in page for v in key],
+                )
+                for chain, address, status, last_checked_at in cur.fetchall():
+                    found[(chain, address)] = (status, last_checked_at)
     except Exception as e:
-        print(f"[ENRICH_WORKER] upsert_sanctions error: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"[ENRICH_WORKER] Freshness check on {table} failed, re-checking all: {e}")
+        return set(keys)
 
+    now_utc = datetime.now(timezone.utc)
+    stale   = set()
+    for key in keys:
+        row = found.get(key)
+        if row is None or _needs_refresh(row[0], row[1], now_utc):
+            stale.add(key)
+    return stale
 
-def should_refresh_age(chain, address):
+
+def bulk_upsert_sanctions(rows):
     """
-    Returns True if we should call Blockchair for this (chain, address).
+    rows = [(chain, address, is_sanctioned, status, error_msg)], distinct keys.
+    One INSERT ... ON CONFLICT per page. A PENDING / ERROR row updates the
+    status, check time and error only: the last CHECKED flag is kept.
     """
-    conn = None
+    if not rows:
+        return
     try:
-        conn = get_db_conn()
-        cur  = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute(
-            """
-            SELECT age_status, last_checked_at
-            FROM rt.dim_destination_age
-            WHERE chain = %s AND destination_address = %s
-            """,
-            (chain, address),
-        )
-        row = cur.fetchone()
-        if not row:
-            return True
-
-        status = row["age_status"] or "PENDING"
-        last_checked_at = row["last_checked_at"]
-
-        if status in ("ERROR", "PENDING"):
-            return True
-
-        if last_checked_at is None:
-            return True
-
-        now_utc = datetime.now(timezone.utc)
-        if now_utc - last_checked_at > timedelta(hours=RECHECK_INTERVAL_HOURS):
-            return True
-
-        return False
+        with _DB_POOL.connection() as conn:
+            cur = conn.cursor()
+            for page in _pages(rows):
+                placeholders = ", ".join(["(%s, %s, %s, %s, now(), %s)"] * len(page))
+                cur.execute(
+                    f"""
+                    INSERT INTO rt.dim_sanctions_address
+                        (chain, destination_address, is_sanctioned, sanctions_status, last_checked_at, last_error)
+                    VALUES {placeholders}
+                    ON CONFLICT (chain, destination_address)
+                    DO UPDATE SET
+                        is_sanctioned    = CASE WHEN EXCLUDED.sanctions_status = 'CHECKED'
+                                                THEN EXCLUDED.is_sanctioned
+                                                ELSE rt.dim_sanctions_address.is_sanctioned END,
+                        sanctions_status = EXCLUDED.sanctions_status,
+                        last_checked_at  = EXCLUDED.last_checked_at,
+                        last_error       = EXCLUDED.last_error
+                    """,
+                    [v for row in page for v in row],
+                )
+            conn.commit()
+        for chain, address, is_sanctioned, status, _ in rows:
+            print(
+                f"[ENRICH_WORKER] Upsert sanctions ({chain}, {address}) "
+                f"is_sanctioned={is_sanctioned}, status={status}"
+            )
     except Exception as e:
-        print(f"[ENRICH_WORKER] should_refresh_age error: {e}")
-        return True
-    finally:
-        if conn:
-            conn.close()
+        print(f"[ENRICH_WORKER] bulk_upsert_sanctions error ({len(rows)} rows): {e}")
 
 
-def upsert_age(chain, address, age_hours, status, first_seen_at=None, error_msg=None):
-    conn = None
+def bulk_upsert_age(rows):
+    """
+    rows = [(chain, address, age_hours, status, first_seen_at, error_msg)], distinct keys.
+    One INSERT ... ON CONFLICT per page. A PENDING / ERROR row keeps the last
+    CHECKED age.
+    """
+    if not rows:
+        return
     try:
-        conn = get_db_conn()
-        cur  = conn.cursor()
-        sql = """
-            INSERT INTO rt.dim_destination_age
-                (chain, destination_address, destination_age_hours, age_status, first_seen_at, last_checked_at, last_error)
-            VALUES (%s, %s, %s, %s, %s, now(), %s)
-            ON CONFLICT (chain, destination_address)
-            DO UPDATE SET
-                destination_age_hours = EXCLUDED.destination_age_hours,
-                age_status            = EXCLUDED.age_status,
-                first_seen_at         = COALESCE(rt.dim_destination_age.first_seen_at, EXCLUDED.first_seen_at),
-                last_checked_at       = EXCLUDED.last_checked_at,
-                last_error            = EXCLUDED.last_error
-        """
-        cur.execute(sql, (chain, address, age_hours, status, first_seen_at, error_msg))
-        conn.commit()
-        print(
-            f"[ENRICH_WORKER] Upsert age ({chain}, {address}) "
-            f"age_hours={age_hours}, status={status}"
-        )
+        with _DB_POOL.connection() as conn:
+            cur = conn.cursor()
+            for page in _pages(rows):
+                placeholders = ", ".join(["(%s, %s, %s, %s, %s, now(), %s)"] * len(page))
+                cur.execute(
+                    f"""
+                    INSERT INTO rt.dim_destination_age
+                        (chain, destination_address, destination_age_hours, age_status, first_seen_at, last_checked_at, last_error)
+                    VALUES {placeholders}
+                    ON CONFLICT (chain, destination_address)
+                    DO UPDATE SET
+                        destination_age_hours = CASE WHEN EXCLUDED.age_status = 'CHECKED'
+                                                     THEN EXCLUDED.destination_age_hours
+                                                     ELSE rt.dim_destination_age.destination_age_hours END,
+                        age_status            = EXCLUDED.age_status,
+                        first_seen_at         = COALESCE(rt.dim_destination_age.first_seen_at, EXCLUDED.first_seen_at),
+                        last_checked_at       = EXCLUDED.last_checked_at,
+                        last_error            = EXCLUDED.last_error
+                    """,
+                    [v for row in page for v in row],
+                )
+            conn.commit()
+        for chain, address, age_hours, status, _, _ in rows:
+            print(
+                f"[ENRICH_WORKER] Upsert age ({chain}, {address}) "
+                f"age_hours={age_hours}, status={status}"
+            )
     except Exception as e:
-        print(f"[ENRICH_WORKER] upsert_age error: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"[ENRICH_WORKER] bulk_upsert_age error ({len(rows)} rows): {e}")
 
 
 # ==========================
 # EXTERNAL API HELPERS
 # ==========================
-def call_chainalysis(address):
+# Module-level keep-alive HTTPS pools: warm invocations skip DNS/TCP/TLS setup.
+# Each provider host gets as many connection slots as its fan-out pool has threads.
+_HTTP = http_client.HttpClient(
+    tag="ENRICH_WORKER",
+    timeout=PROVIDER_TIMEOUT_SECS,
+    max_conns=PROVIDER_MAX_CONNS,
+    host_limits={
+        urlsplit(CHAINALYSIS_URL).hostname: {"max_conns": SANCTIONS_MAX_CONCURRENCY},
+        urlsplit(BLOCKCHAIR_BASE_URL).hostname: {"max_conns": AGE_MAX_CONCURRENCY},
+    },
+)
+
+
+def call_chainalysis(address, timeout=None):
     """
-    Call Chainalysis public API.
+    Call Chainalysis public API (timeout: per socket operation, default
+    PROVIDER_TIMEOUT_SECS).
     Returns (is_sanctioned, error_msg or None)
     """
     if not CHAINALYSIS_API_KEY:
@@ -223,17 +249,15 @@ def call_chainalysis(address):
     }
 
     try:
-        #req = urllib.request.Request(url, headers=headers, method="GET")
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            if resp.status != 200:
-                return False, f"HTTP_{resp.status}"
-            data = json.loads(resp.read().decode("utf-8"))
-            # According to Chainalysis docs, identifications array indicates hits
-            identifications = data.get("identifications", [])
-            is_sanctioned = len(identifications) > 0
-            return is_sanctioned, None
-    except urllib.error.HTTPError as e:
+        resp = _HTTP.get(url, headers=headers, timeout=timeout)
+        if resp.status != 200:
+            return False, f"HTTP_{resp.status}"
+        data = resp.json()
+        # According to Chainalysis docs, identifications array indicates hits
+        identifications = data.get("identifications", [])
+        is_sanctioned = len(identifications) > 0
+        return is_sanctioned, None
+    except http_client.HTTPStatusError as e:
         return False, f"HTTPError_{e.code}"
     except Exception as e:
         return False, f"EXC_{e}"
@@ -257,9 +281,10 @@ def map_chain_to_blockchair_chain(chain_code):
     return mapping.get(c)
 
 
-def call_blockchair_for_age(chain_code, address):
+def call_blockchair_for_age(chain_code, address, timeout=None):
     """
-    Calls Blockchair to approximate destination_age_hours.
+    Calls Blockchair to approximate destination_age_hours (timeout: per
+    socket operation, default PROVIDER_TIMEOUT_SECS).
     Returns (age_hours, first_seen_at, error_msg or None)
     """
     if not BLOCKCHAIR_API_KEY:
@@ -277,43 +302,41 @@ def call_blockchair_for_age(chain_code, address):
     url = f"{BLOCKCHAIR_BASE_URL}/{chain_name}/dashboards/address/{address}?key={BLOCKCHAIR_API_KEY}"
     headers = {"Accept": "application/json", "User-Agent": "Mozilla/5.0"}
     try:
-        #req = urllib.request.Request(url, method="GET")
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as resp:
-            if resp.status != 200:
-                return None, None, f"HTTP_{resp.status}"
-
-            data = json.loads(resp.read().decode("utf-8"))
-            # Response structure depends on chain; this is a generic example:
-            addr_data = data.get("data", {}).get(address)
-            if not addr_data:
-                # Address might be new or unknown in chain index
-                return 0.0, None, None
-
-            # Try to read a "first seen" timestamp if present
-            # This is pseudo-parsing; adjust once you inspect actual response
-            meta = addr_data.get("address") or addr_data.get("address_data") or {}
-            first_seen_str = meta.get("first_seen_receiving") or meta.get("first_seen")
-            if not first_seen_str:
-                # If unknown, treat as very new (0 hours)
-                return 0.0, None, None
-
-            try:
-                # Often returns ISO format; adjust format if needed
-                first_seen_dt = datetime.fromisoformat(first_seen_str.replace("Z", "+00:00"))
-            except Exception:
-                first_seen_dt = None
+        resp = _HTTP.get(url, headers=headers, timeout=timeout)
+        if resp.status != 200:
+            return None, None, f"HTTP_{resp.status}"
+
+        data = resp.json()
+        # Response structure depends on chain; this is a generic example:
+        addr_data = data.get("data", {}).get(address)
+        if not addr_data:
+            # Address might be new or unknown in chain index
+            return 0.0, None, None
+
+        # Try to read a "first seen" timestamp if present
+        # This is pseudo-parsing; adjust once you inspect actual response
+        meta = addr_data.get("address") or addr_data.get("address_data") or {}
+        first_seen_str = meta.get("first_seen_receiving") or meta.get("first_seen")
+        if not first_seen_str:
+            # If unknown, treat as very new (0 hours)
+            return 0.0, None, None
 
-            if first_seen_dt:
-                now_utc = datetime.now(timezone.utc)
-                delta   = now_utc - first_seen_dt
-                hours   = delta.total_seconds() / 3600.0
-            else:
-                hours = None
+        try:
+            # Often returns ISO format; adjust format if needed
+            first_seen_dt = datetime.fromisoformat(first_seen_str.replace("Z", "+00:00"))
+        except Exception:
+            first_seen_dt = None
+
+        if first_seen_dt:
+            now_utc = datetime.now(timezone.utc)
+            delta   = now_utc - first_seen_dt
+            hours   = delta.total_seconds() / 3600.0
+        else:
+            hours = None
 
-            return hours, first_seen_dt, None
+        return hours, first_seen_dt, None
 
-    except urllib.error.HTTPError as e:
+    except http_client.HTTPStatusError as e:
         return None, None, f"HTTPError_{e.code}"
     except Exception as e:
         return None, None, f"EXC_{e}"
@@ -322,16 +345,14 @@ def call_blockchair_for_age(chain_code, address):
 # ==========================
 # CORE ENRICHMENT LOGIC
 # ==========================
-def enrich_one_withdraw_row(row):
+def withdraw_row_key(row):
     """
-    row = single Canal JSON data row from withdraw_record
-    We only care about (chain, address).
+    Canal JSON withdraw_record row -> (chain, address), or None without address.
     """
     # You can refine this mapping based on your actual columns in withdraw_record
     address = row.get("address") or row.get("withdraw_address")
     if not address:
-        print("[ENRICH_WORKER] No address in row, skipping")
-        return "SKIP_NO_ADDRESS"
+        return None
 
     raw_chain = (
         row.get("chain")
@@ -340,32 +361,173 @@ def enrich_one_withdraw_row(row):
         or row.get("withdraw_currency")
         or "UNKNOWN"
     )
-    chain = str(raw_chain).upper()
+    return str(raw_chain).upper(), address
+
+
+# Dim rows for a provider call that produced no result (status PENDING / ERROR)
+def _unresolved_sanctions(chain, address, status, err):
+    return (chain, address, None, status, err)
+
+
+def _unresolved_age(chain, address, status, err):
+    return (chain, address, None, status, None, err)
+
+
+def _provider_timeout(deadline):
+    """
+    HTTP timeout for one provider call: PROVIDER_TIMEOUT_SECS, cut to what is
+    left of the batch deadline (time.monotonic(); None = no deadline).
+    """
+    if deadline is None:
+        return PROVIDER_TIMEOUT_SECS
+    return min(PROVIDER_TIMEOUT_SECS, deadline - time.monotonic())
+
+
+def enrich_sanctions(chain, address, deadline=None):
+    timeout = _provider_timeout(deadline)
+    if timeout <= 0:   # queued past the deadline: do not start the call
+        return _unresolved_sanctions(chain, address, "PENDING", "DEADLINE")
+    is_sanctioned, err = call_chainalysis(address, timeout=timeout)
+    status = "CHECKED" if err is None else "ERROR"
+    return (chain, address, is_sanctioned, status, err)
+
+
+def enrich_age(chain, address, deadline=None):
+    timeout = _provider_timeout(deadline)
+    if timeout <= 0:
+        return _unresolved_age(chain, address, "PENDING", "DEADLINE")
+    age_hours, first_seen_at, err = call_blockchair_for_age(chain, address, timeout=timeout)
+    status = "CHECKED" if err is None else "ERROR"
+
+    # If we get no age info but no hard error, treat as 0 hours (very new)
+    if age_hours is None and err is None:
+        age_hours = 0.0
+    return (chain, address, age_hours, status, first_seen_at, err)
+
+
+# One bounded thread pool per provider: the pool size is that provider's
+# concurrency cap, and the two pools run side by side so sanctions and age
+# lookups overlap. Module-level, so warm invocations reuse the threads.
+_SANCTIONS_POOL = ThreadPoolExecutor(max_workers=SANCTIONS_MAX_CONCURRENCY, thread_name_prefix="sanctions")
+_AGE_POOL       = ThreadPoolExecutor(max_workers=AGE_MAX_CONCURRENCY, thread_name_prefix="age")
+
+# Per instance: calls submitted, PENDING at the deadline, of those cancelled
+# before they started and still running (their threads stay busy until the
+# HTTP timeout, which is capped at the deadline, ends them)
+_PROVIDER_STATS = {"calls": 0, "pending": 0, "cancelled": 0, "overran": 0}
+
+
+def call_providers(sanctions_keys, age_keys, deadline_secs=None):
+    """
+    Runs enrich_sanctions / enrich_age for the given keys on the provider
+    pools and waits at most deadline_secs for all of them. Every HTTP call
+    gets a timeout that ends by the deadline.
+    Returns (sanctions_rows, age_rows, pending): a call that did not finish
+    in time comes back as a PENDING row, which the next batch's freshness
+    check picks up again. Queued calls are cancelled; calls already running
+    cannot be, so they are counted (overran) and their results dropped.
+    """
+    deadline_secs = BATCH_DEADLINE_SECS if deadline_secs is None else deadline_secs
+    started  = time.monotonic()
+    deadline = started + deadline_secs
+
+    jobs = [
+        (_SANCTIONS_POOL.submit(enrich_sanctions, chain, address, deadline), _unresolved_sanctions, chain, address)
+        for chain, address in sanctions_keys
+    ]
+    n_sanctions = len(jobs)
+    jobs += [
+        (_AGE_POOL.submit(enrich_age, chain, address, deadline), _unresolved_age, chain, address)
+        for chain, address in age_keys
+    ]
+    if not jobs:
+        return [], [], 0
+
+    wait([job[0] for job in jobs], timeout=deadline_secs)
+
+    out        = []
+    unfinished = 0
+    cancelled  = 0
+    for future, unresolved, chain, address in jobs:
+        if not future.done():
+            unfinished += 1
+            if future.cancel():
+                cancelled += 1
+            out.append(unresolved(chain, address, "PENDING", "DEADLINE"))
+            continue
+        try:
+            out.append(future.result())
+        except Exception as e:
+            print(f"[ENRICH_WORKER] Provider call for ({chain}, {address}) failed: {e}")
+            out.append(unresolved(chain, address, "ERROR", f"EXC_{e}"))
+
+    # PENDING also covers calls that started past the deadline and gave up
+    pending = sum(1 for row in out if row[3] == "PENDING")
+    overran = unfinished - cancelled
+    _PROVIDER_STATS["calls"]     += len(jobs)
+    _PROVIDER_STATS["pending"]   += pending
+    _PROVIDER_STATS["cancelled"] += cancelled
+    _PROVIDER_STATS["overran"]   += overran
+    print(
+        f"[ENRICH_WORKER] Provider calls: sanctions={n_sanctions}, age={len(jobs) - n_sanctions}, "
+        f"pending={pending} (cancelled={cancelled}, still running={overran}), "
+        f"elapsed={time.monotonic() - started:.2f}s"
+    )
+    return out[:n_sanctions], out[n_sanctions:], pending
 
-    print(f"[ENRICH_WORKER] Processing ({chain}, {address})")
 
-    # 1) Sanctions enrichment
-    if should_refresh_sanctions(chain, address):
-        is_sanctioned, err = call_chainalysis(address)
-        status = "CHECKED" if err is None else "ERROR"
-        upsert_sanctions(chain, address, is_sanctioned, status, err)
-    else:
-        print("[ENRICH_WORKER] Sanctions info fresh, skipping API")
+def enrich_withdraw_rows(rows, deadline_secs=None):
+    """
+    Enriches a whole batch of withdraw rows with a constant number of DB
+    round trips: distinct (chain, address) keys, one freshness query per
+    dim table, concurrent provider calls for the stale keys only (see
+    call_providers), one bulk upsert per dim table.
+    Returns one result per row ("OK" / "PENDING" / "SKIP_NO_ADDRESS").
+    """
+    results = []
+    keys    = {}
+    for row in rows:
+        key = withdraw_row_key(row)
+        if key is None:
+            print("[ENRICH_WORKER] No address in row, skipping")
+            results.append(None)
+            continue
+        keys[key] = None
+        results.append(key)
+    keys = list(keys)
+    if not keys:
+        return ["SKIP_NO_ADDRESS"] * len(rows)
+
+    sanctions_due = keys_needing_refresh("rt.dim_sanctions_address", "sanctions_status", keys)
+    age_due       = keys_needing_refresh("rt.dim_destination_age", "age_status", keys)
+    print(
+        f"[ENRICH_WORKER] Batch: {len(rows)} rows, {len(keys)} distinct (chain, address), "
+        f"sanctions due={len(sanctions_due)}, age due={len(age_due)}"
+    )
 
-    # 2) Destination age enrichment
-    if should_refresh_age(chain, address):
-        age_hours, first_seen_at, err = call_blockchair_for_age(chain, address)
-        status = "CHECKED" if err is None else "ERROR"
+    sanctions_rows, age_rows, _ = call_providers(
+        [key for key in keys if key in sanctions_due],
+        [key for key in keys if key in age_due],
+        deadline_secs,
+    )
 
-        # If we get no age info but no hard error, treat as 0 hours (very new)
-        if age_hours is None and err is None:
-            age_hours = 0.0
+    bulk_upsert_sanctions(sanctions_rows)
+    bulk_upsert_age(age_rows)
 
-        upsert_age(chain, address, age_hours, status, first_seen_at, err)
-    else:
-        print("[ENRICH_WORKER] Age info fresh, skipping API")
+    pending_keys = {row[:2] for row in sanctions_rows if row[3] == "PENDING"}
+    pending_keys.update(row[:2] for row in age_rows if row[3] == "PENDING")
+    return [
+        "SKIP_NO_ADDRESS" if key is None else ("PENDING" if key in pending_keys else "OK")
+        for key in results
+    ]
 
-    return "OK"
+
+def enrich_one_withdraw_row(row):
+    """
+    row = single Canal JSON data row from withdraw_record
+    We only care about (chain, address).
+    """
+    return enrich_withdraw_rows([row])[0]
 
 
 # ==========================
@@ -397,6 +559,7 @@ def handler(event, context):
             return "SKIP_NOT_LIST"
 
         results = []
+        rows    = []
         for rec in envelope:
             raw_val = rec.get("value")
             if raw_val is None:
@@ -432,15 +595,18 @@ def handler(event, context):
                 print("[ENRICH_WORKER] Canal JSON has empty data[], skipping")
                 continue
 
-            # We can process all rows in the batch (usually it's 1, but be safe)
-            for row in data_list:
-                try:
-                    r = enrich_one_withdraw_row(row)
-                    results.append(r)
-                except Exception as e:
-                    print(f"[ENRICH_WORKER] Error enriching row: {e}")
-                    results.append("ERROR_ROW")
+            # Collected across the whole Kafka batch, enriched together below
+            rows.extend(data_list)
+
+        if rows:
+            try:
+                results = enrich_withdraw_rows(rows)
+            except Exception as e:
+                print(f"[ENRICH_WORKER] Error enriching batch: {e}")
+                results = ["ERROR_ROW"] * len(rows)
 
+        print(f"[ENRICH_WORKER] HTTP pools: {json.dumps(_HTTP.snapshot_stats())}")
+        print(f"[ENRICH_WORKER] Provider calls: {json.dumps(_PROVIDER_STATS)}")
         # Simple aggregated result
         return f"Processed {len(results)} rows"
 
@@ -0,0 +1,58 @@
+# feature_projection.py
+# Column list for rt.risk_features reads. Instead of SELECT * on the wide
+# table, the handler selects only what the active rules reference (names from
+# the parsed expressions), the AI feature subset and a few identifiers.
+# Each projection precomputes its SELECT list once and maps rows straight
+# into slot-based FeatureRecords (see feature_record.py); FULL keeps SELECT *
+# for complete audit snapshots.
+
+from feature_record import FeatureRecord
+
+print("[RISK_FC] Loading feature_projection.py")
+
+
+class FeatureProjection:
+    """
+    columns=None -> full snapshot (SELECT *, names from cursor.description).
+    """
+
+    __slots__ = ("columns", "select_list")
+
+    def __init__(self, columns=None):
+        self.columns     = tuple(columns) if columns is not None else None
+        self.select_list = (
+            "*" if self.columns is None else ", ".join(f'"{c}"' for c in self.columns)
+        )
+
+    @property
+    def is_full(self):
+        return self.columns is None
+
+    def _columns(self, cursor):
+        if self.columns is None:
+            return tuple(col.name for col in cursor.description)
+        return self.columns
+
+    def rows_to_dicts(self, cursor, rows):
+        columns = self._columns(cursor)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def rows_to_records(self, cursor, rows):
+        columns = self._columns(cursor)
+        return [FeatureRecord.from_row(columns, row) for row in rows]
+
+
+FULL = FeatureProjection()
+
+
+def projection_for(schema_columns, wanted):
+    """
+    Projection of `wanted` feature names, in table column order; names that
+    are not columns of the table are dropped.
+    """
+    wanted = set(wanted)
+    return FeatureProjection([c for c in schema_columns if c in wanted])
+
+
+def unknown_names(schema_columns, wanted):
+    return sorted(set(wanted) - set(schema_columns))
@@ -0,0 +1,49 @@
+# feature_schema.py
+# GENERATED by `python feature_record.py --generate` from risk_agent_flink.sql
+# (risk_sink = rt.risk_features). Do not edit by hand.
+
+RISK_FEATURES_COLUMNS = (
+    ('user_code', 'STRING'),
+    ('txn_id', 'STRING'),
+    ('deposit_fan_out', 'INT'),
+    ('withdrawal_fan_in', 'INT'),
+    ('ip_density', 'INT'),
+    ('device_density', 'INT'),
+    ('cluster_newness_ratio', 'DOUBLE'),
+    ('is_new_device', 'BOOLEAN'),
+    ('is_new_ip', 'BOOLEAN'),
+    ('is_impossible_travel', 'BOOLEAN'),
+    ('time_since_critical_event', 'DOUBLE'),
+    ('withdrawal_ratio', 'DOUBLE'),
+    ('session_risk_score', 'INT'),
+    ('is_sanctioned', 'BOOLEAN'),
+    ('kyc_limit_utilization', 'DOUBLE'),
+    ('source_risk_score', 'INT'),
+    ('destination_age_hours', 'INT'),
+    ('passthrough_turnover', 'DOUBLE'),
+    ('structuring_velocity', 'INT'),
+    ('account_maturity', 'INT'),
+    ('is_round_number', 'BOOLEAN'),
+    ('abnormal_pnl', 'DOUBLE'),
+    ('days_since_whitelist_add', 'DOUBLE'),
+    ('hours_since_fiat_deposit', 'DOUBLE'),
+    ('arbitrage_flag', 'DOUBLE'),
+    ('update_time', 'TIMESTAMP_LTZ'),
+    ('destination_address', 'STRING'),
+    ('withdrawal_deviation', 'DOUBLE'),
+    ('rapid_cycling', 'BOOLEAN'),
+    ('time_since_user_login', 'INT'),
+    ('withdrawal_amount', 'DOUBLE'),
+    ('sanctions_status', 'STRING'),
+    ('age_status', 'STRING'),
+    ('user_whitelisted', 'BOOLEAN'),
+    ('address_whitelisted', 'BOOLEAN'),
+    ('user_blacklisted', 'BOOLEAN'),
+    ('address_blacklisted', 'BOOLEAN'),
+    ('ip_blacklisted', 'BOOLEAN'),
+    ('user_greylisted', 'BOOLEAN'),
+    ('address_greylisted', 'BOOLEAN'),
+    ('ip_greylisted', 'BOOLEAN'),
+    ('withdraw_currency', 'STRING'),
+    ('chain', 'STRING'),
+)
@@ -0,0 +1,288 @@
+# http_client.py
+# Shared keep-alive HTTPS client with per-host persistent connection pools.
+# Used by core.py (Gemini, Lark) and enrichment-worker.py (Chainalysis,
+# Blockchair). Pools live at module level, so warm invocations skip the
+# DNS + TCP + TLS handshake.
+# http.client (and with it ssl, ~25ms) is imported on first use, not at load.
+
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+print("[HTTP_CLIENT] Loading http_client.py")
+
+
+# Methods a server may see twice without side effects (RFC 9110 9.2.2)
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def _stale_conn_errors():
+    """
+    Raised by a kept-alive socket the server already closed. The request may
+    still have reached the server, so only idempotent requests are resent.
+    (RemoteDisconnected is a ConnectionResetError.)
+    """
+    import http.client
+
+    return (http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+
+
+class HTTPStatusError(Exception):
+    """
+    Non-2xx response; `code` and `body` mirror urllib.error.HTTPError.
+    """
+
+    def __init__(self, code, body=b"", url=None):
+        super().__init__(f"HTTP {code} for {url}")
+        self.code = code
+        self.body = body
+        self.url  = url
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status  = status
+        self.headers = headers
+        self.body    = body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+class _HostPool:
+    """
+    Idle connections + a semaphore capping concurrent requests to one host.
+    """
+
+    def __init__(self, scheme, host, port, timeout, max_conns, idle_secs):
+        self.scheme    = scheme
+        self.host      = host
+        self.port      = port
+        self.timeout   = timeout
+        self.idle_secs = idle_secs
+        self.slots     = threading.BoundedSemaphore(max_conns)
+        self._idle     = []   # [(conn, last_used_monotonic)]
+        self._lock     = threading.Lock()
+        self.stats     = {
+            "requests": 0,
+            "opened": 0,
+            "reused": 0,
+            "discarded": 0,
+            "stale_retries": 0,
+            "errors": 0,
+            "cap_timeouts": 0,
+        }
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def open(self, timeout):
+        import http.client
+
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self.count("opened")
+        return cls(self.host, self.port, timeout=timeout)
+
+    def acquire(self, timeout):
+        """
+        (conn, reused). Idle connections past idle_secs are closed, not reused.
+        """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if now - last_used < self.idle_secs and conn.sock is not None:
+                conn.timeout = timeout
+                conn.sock.settimeout(timeout)
+                self.count("reused")
+                return conn, True
+            self.discard(conn)
+        return self.open(timeout), False
+
+    def release(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def discard(self, conn):
+        self.count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["idle"] = len(self._idle)
+        return stats
+
+
+class HttpClient:
+    """
+    Thread-safe client; one _HostPool per (scheme, host, port).
+
+    - host_limits = {host or "host:port": {"timeout": secs, "max_conns": n}}
+      overrides the defaults for that host.
+    - A connection goes back to the pool only after its response was read in
+      full and the server did not ask to close; any error discards it.
+    - A request that fails on a reused connection with a "server closed the
+      idle socket" error is resent once on a fresh connection, if it is
+      idempotent: GET/HEAD/PUT/DELETE/OPTIONS by default, other methods only
+      with resend_stale=True (never for a POST that must not run twice).
+    - Non-2xx responses raise HTTPStatusError (the connection is still reused).
+    """
+
+    def __init__(self, tag="HTTP_CLIENT", timeout=5.0, max_conns=4, idle_secs=60.0, host_limits=None):
+        self._tag         = tag
+        self._timeout     = timeout
+        self._max_conns   = max_conns
+        self._idle_secs   = idle_secs
+        self._host_limits = dict(host_limits or {})
+        self._pools       = {}
+        self._lock        = threading.Lock()
+
+    def _pool_for(self, scheme, host, port):
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    limits = self._host_limits.get(
+                        f"{host}:{port}", self._host_limits.get(host, {})
+                    )
+                    pool = _HostPool(
+                        scheme,
+                        host,
+                        port,
+                        timeout=limits.get("timeout", self._timeout),
+                        max_conns=limits.get("max_conns", self._max_conns),
+                        idle_secs=self._idle_secs,
+                    )
+                    self._pools[key] = pool
+        return pool
+
+    def request(self, method, url, body=None, headers=None, timeout=None, resend_stale=None):
+        """
+        Returns a Response with the body fully read. `timeout` (secs) bounds
+        both the wait for a free host slot and each socket operation; it
+        defaults to the host's configured timeout. `resend_stale` overrides
+        whether a stale keep-alive failure is resent (default: idempotent
+        methods only).
+        """
+        if resend_stale is None:
+            resend_stale = method.upper() in _IDEMPOTENT_METHODS
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        port   = parts.port or (443 if scheme == "https" else 80)
+        path   = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        pool    = self._pool_for(scheme, parts.hostname, port)
+        timeout = pool.timeout if timeout is None else timeout
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        if not pool.slots.acquire(timeout=timeout):
+            pool.count("cap_timeouts")
+            raise TimeoutError(f"no free connection slot for {parts.hostname} within {timeout:.1f}s")
+        try:
+            pool.count("requests")
+            conn, reused = pool.acquire(timeout)
+            try:
+                response = self._send(conn, method, path, body, headers)
+            except _stale_conn_errors():
+                pool.discard(conn)
+                if not (reused and resend_stale):
+                    pool.count("errors")
+                    raise
+                pool.count("stale_retries")
+                print(f"[{self._tag}] Stale keep-alive socket to {pool.host}, resending on a fresh one")
+                conn = pool.open(timeout)
+                try:
+                    response = self._send(conn, method, path, body, headers)
+                except Exception:
+                    pool.count("errors")
+                    pool.discard(conn)
+                    raise
+            except Exception:
+                pool.count("errors")
+                pool.discard(conn)
+                raise
+
+            if response.will_close:
+                pool.discard(conn)
+            else:
+                pool.release(conn)
+        finally:
+            pool.slots.release()
+
+        result = Response(response.status, dict(response.getheaders()), response.body)
+        if not 200 <= result.status < 300:
+            raise HTTPStatusError(result.status, result.body, url)
+        return result
+
+    @staticmethod
+    def _send(conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        response.body = response.read()
+        return response
+
+    def get(self, url, headers=None, timeout=None):
+        return self.request("GET", url, headers=headers, timeout=timeout)
+
+    def post_json(self, url, payload, headers=None, timeout=None, resend_stale=False):
+        """
+        resend_stale=True only for POSTs that are safe to repeat (read-only
+        calls such as Gemini generateContent).
+        """
+        all_headers = {"Content-Type": "application/json"}
+        all_headers.update(headers or {})
+        return self.request(
+            "POST", url, body=json.dumps(payload), headers=all_headers, timeout=timeout,
+            resend_stale=resend_stale,
+        )
+
+    def warm(self, url, timeout=None):
+        """
+        Opens (TCP + TLS) one idle connection to url's host without sending a
+        request, so the first real call reuses it. Raises on connect failure.
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        port   = parts.port or (443 if scheme == "https" else 80)
+        pool    = self._pool_for(scheme, parts.hostname, port)
+        timeout = pool.timeout if timeout is None else timeout
+        conn = pool.open(timeout)
+        try:
+            conn.connect()
+        except Exception:
+            pool.discard(conn)
+            raise
+        pool.release(conn)
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close_all()
+
+    def snapshot_stats(self):
+        """
+        {host: {requests, opened, reused, discarded, ...}}.
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        return {pool.host: pool.snapshot_stats() for pool in pools}
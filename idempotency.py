@@ -0,0 +1,122 @@
+# idempotency.py
+# Final decisions keyed on (user_code, txn_id), so a Kafka redelivery or an
+# FC retry returns the recorded decision instead of re-running the pipeline
+# (feature wait, rules, Gemini, duplicate rt.risk_withdraw_decision rows).
+# Lookup order: in-process LRU, then one batched DB probe for the misses.
+
+import threading
+import time
+from collections import OrderedDict
+
+print("[RISK_FC] Loading idempotency.py")
+
+# Verdicts a retry could improve on are never treated as final
+# (AI_CONFIG: no Gemini key configured, fixed by a redeploy)
+RETRYABLE_SOURCES = frozenset({"NO_DATA", "RULES_UNAVAILABLE"})
+RETRYABLE_THREATS = frozenset({"AI_NET_ERR", "AI_ERR", "AI_CONFIG"})
+
+
+def is_final(result_payload, txn_id_input):
+    """
+    True when result_payload may be replayed for (user_code, txn_id_input):
+    decided on THIS txn's own features (not the latest-row fallback) and
+    not a no-data / AI-failure HOLD.
+    """
+    if not txn_id_input or not result_payload:
+        return False
+    if str(result_payload.get("txn_id")) != str(txn_id_input):
+        return False
+    if result_payload.get("source") in RETRYABLE_SOURCES:
+        return False
+    return result_payload.get("primary_threat") not in RETRYABLE_THREATS
+
+
+def decision_key(user_code, txn_id):
+    return (str(user_code), str(txn_id))
+
+
+class DecisionLedger:
+    """
+    probe(keys) -> {key: result_payload} for keys that already have a final
+    decision in the DB; a failing probe counts as "not decided" (fail open).
+    """
+
+    def __init__(self, probe=None, max_entries=20000, ttl_secs=86400, tag="RISK_FC"):
+        self._probe       = probe
+        self._max_entries = max_entries
+        self._ttl_secs    = ttl_secs
+        self._tag         = tag
+        self._entries     = OrderedDict()  # key -> (expires_at, result_payload)
+        self._lock        = threading.Lock()
+        self.stats        = {
+            "lru_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "recorded": 0,
+            "evicted": 0,
+            "probe_errors": 0,
+        }
+
+    def _get_local(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_local(self, key, result_payload, now):
+        self._entries[key] = (now + self._ttl_secs, dict(result_payload))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def lookup(self, keys):
+        """
+        {key: recorded result_payload} for the keys already decided.
+        """
+        keys  = list(dict.fromkeys(decision_key(u, t) for u, t in keys))
+        found = {}
+        now   = time.monotonic()
+        with self._lock:
+            for key in keys:
+                payload = self._get_local(key, now)
+                if payload is not None:
+                    found[key] = dict(payload)
+            self.stats["lru_hits"] += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing and self._probe is not None:
+            try:
+                from_db = self._probe(missing) or {}
+            except Exception as exc:
+                self.stats["probe_errors"] += 1
+                print(f"[{self._tag}] Decision idempotency probe failed, deciding anyway: {exc}")
+                from_db = {}
+            with self._lock:
+                for key, payload in from_db.items():
+                    self._put_local(key, payload, now)
+                    found[key] = dict(payload)
+                self.stats["db_hits"] += len(from_db)
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def record(self, user_code, txn_id_input, result_payload):
+        """
+        Remembers a freshly made decision if it is final (see is_final).
+        """
+        if not is_final(result_payload, txn_id_input):
+            return False
+        with self._lock:
+            self._put_local(decision_key(user_code, txn_id_input), result_payload, time.monotonic())
+            self.stats["recorded"] += 1
+        return True
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
@@ -0,0 +1,219 @@
+# import_profile.py
+# Cold-start profile of the decision function, in two parts:
+#   1. `python -X importtime -c "import index"` in a fresh interpreter,
+#      reported as the slowest modules (self / cumulative, ms)
+#   2. time-to-first-decision in a fresh interpreter against the offline
+#      stand-ins of bench_handler.py: import -> initializer -> 1st / 2nd decision,
+#      with and without the FC initializer
+#
+# Usage:
+#   python import_profile.py                       # both parts
+#   python import_profile.py --top 15 --skip-first-decision
+#   python import_profile.py --json-report cold_start.json
+#
+# Note: the stand-ins replace the DB, so part 2 never loads psycopg2/libpq;
+# part 1 shows what the real import graph costs.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==========================
+# 1. IMPORT TIME
+# ==========================
+def parse_importtime(stderr_text):
+    """
+    -X importtime stderr -> [{"module", "self_ms", "cumulative_ms", "depth"}].
+    """
+    rows = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cum_us, name = parts
+        try:
+            self_ms = int(self_us) / 1000.0
+            cum_ms  = int(cum_us) / 1000.0
+        except ValueError:
+            continue
+        indent = len(name) - len(name.lstrip(" ")) - 1
+        rows.append(
+            {
+                "module": name.strip(),
+                "self_ms": self_ms,
+                "cumulative_ms": cum_ms,
+                "depth": max(0, indent // 2),
+            }
+        )
+    return rows
+
+
+def profile_imports(module):
+    """
+    Imports `module` in a fresh interpreter with -X importtime.
+    Returns (rows, wall_ms).
+    """
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000.0
+    rows = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-3:])
+        raise RuntimeError(f"import {module} failed:\n{tail}")
+    return rows, wall_ms
+
+
+def print_import_report(module, rows, wall_ms, top):
+    ours  = {os.path.splitext(f)[0] for f in os.listdir(_HERE) if f.endswith(".py")}
+    root  = next((r for r in rows if r["module"] == module and r["depth"] == 0), None)
+    total = root["cumulative_ms"] if root else sum(r["self_ms"] for r in rows)
+
+    print(f"[IMPORT] import {module}: {total:.1f}ms in-import, {wall_ms:.1f}ms process wall")
+    print()
+    print(f"Slowest by cumulative (top {top}):")
+    print(f"  {'module':<34} {'self ms':>9} {'cum ms':>9}")
+    for r in sorted(rows, key=lambda r: -r["cumulative_ms"])[:top]:
+        flag = "*" if r["module"].split(".")[0] in ours else " "
+        print(f" {flag}{r['module']:<34} {r['self_ms']:>9.2f} {r['cumulative_ms']:>9.2f}")
+    print()
+    print("Service modules (self ms):")
+    for r in sorted((r for r in rows if r["module"] in ours), key=lambda r: -r["self_ms"]):
+        print(f"  {r['module']:<34} {r['self_ms']:>9.2f}")
+
+
+# ==========================
+# 2. TIME TO FIRST DECISION
+# ==========================
+def _first_decision_child(use_initializer):
+    """
+    Runs in a fresh interpreter; prints one JSON line of phase timings (ms).
+    """
+    import bench_handler
+
+    servers, gemini_url, lark_url = bench_handler.start_mock_servers(0, 0)
+
+    t0 = time.perf_counter()
+    bench_handler.import_service(gemini_url, lark_url)
+    t_import = time.perf_counter()
+
+    store = bench_handler.FakeRiskStore(db_latency_ms=0)
+    store.rule_rows = bench_handler.build_rule_rows(50)
+    bench_handler.install_fakes(store)
+    scenario = next(s for s in bench_handler.SCENARIOS if s.name == "rule_pass")
+    rng = random.Random(1)
+    events = [scenario.make_event(store, rng, seq, 1)[0] for seq in range(2)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t1 = time.perf_counter()
+        if use_initializer:
+            bench_handler.index.initializer(None)
+        t_init = time.perf_counter()
+        bench_handler.index.handler(events[0], None)
+        t_first = time.perf_counter()
+        bench_handler.index.handler(events[1], None)
+        t_second = time.perf_counter()
+
+    for server in servers:
+        server.shutdown()
+    print(
+        json.dumps(
+            {
+                "import_ms": round((t_import - t0) * 1000.0, 3),
+                "initializer_ms": round((t_init - t1) * 1000.0, 3),
+                "first_decision_ms": round((t_first - t_init) * 1000.0, 3),
+                "second_decision_ms": round((t_second - t_first) * 1000.0, 3),
+                "import_to_first_decision_ms": round(
+                    (t_import - t0 + t_first - t1) * 1000.0, 3
+                ),
+            }
+        )
+    )
+
+
+def profile_first_decision(use_initializer, runs):
+    """
+    Median of `runs` fresh-interpreter runs, per phase.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--first-decision-child"]
+    if use_initializer:
+        cmd.append("--with-initializer")
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(cmd, cwd=_HERE, capture_output=True, text=True)
+        if proc.returncode != 0:
+            tail = "\n".join(proc.stderr.strip().splitlines()[-3:])
+            raise RuntimeError(f"first-decision run failed:\n{tail}")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        key: sorted(s[key] for s in samples)[len(samples) // 2]
+        for key in samples[0]
+    }
+
+
+def print_first_decision_report(results):
+    print()
+    print("Time to first decision (median of fresh interpreters, ms):")
+    phases = [
+        "import_ms",
+        "initializer_ms",
+        "first_decision_ms",
+        "second_decision_ms",
+        "import_to_first_decision_ms",
+    ]
+    print(f"  {'mode':<18} " + " ".join(f"{p[:-3].replace('_decision', ''):>18}" for p in phases))
+    for mode, res in results.items():
+        print(f"  {mode:<18} " + " ".join(f"{res[p]:>18.2f}" for p in phases))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time and time-to-first-decision profile.")
+    parser.add_argument("--module", default="index", help="entry module to import (default: index)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per first-decision mode")
+    parser.add_argument("--skip-first-decision", action="store_true")
+    parser.add_argument("--json-report", help="also write the numbers as JSON here")
+    parser.add_argument("--first-decision-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--with-initializer", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.first_decision_child:
+        _first_decision_child(args.with_initializer)
+        return 0
+
+    rows, wall_ms = profile_imports(args.module)
+    print_import_report(args.module, rows, wall_ms, args.top)
+    report = {"module": args.module, "process_wall_ms": round(wall_ms, 3), "imports": rows}
+
+    if not args.skip_first_decision:
+        first = {
+            "no_initializer": profile_first_decision(False, args.runs),
+            "with_initializer": profile_first_decision(True, args.runs),
+        }
+        print_first_decision_report(first)
+        report["first_decision"] = first
+
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,21 @@
 # index.py
 import json
+import time
 import base64
 from urllib.parse import parse_qs
 
+import config as cfg
 import core
+import stage_timing
+
+_LOADED_AT = time.perf_counter()   # end of module load (imports included)
 
 print("[RISK_FC] System initializing - Final Production with Rule Engine v2.1 (no feature logic)")
 
+_COLD = True   # first invocation in this instance
+
+_NO_RULES = {"rules": [], "version": None}
+
 def _make_response(status_code, data):
     return {
         "statusCode": status_code,
@@ -16,160 +25,128 @@ def _make_response(status_code, data):
     }
 
 
-def handler(event, context):
-    print("[RISK_FC] Handler invoked")
-    payload      = {}
-    user_code    = None
-    txn_id_input = None
-
-    # ==========================
-    # 1. Parse event (Kafka / HTTP)
-    # ==========================
-    try:
-        if isinstance(event, (bytes, bytearray)):
-            event_str = event.decode("utf-8", errors="ignore")
-        else:
-            event_str = event if isinstance(event, str) else json.dumps(event)
-
-        print("[RISK_FC] Raw event snippet:", event_str[:500])
-
+# ==========================
+# KAFKA BATCH PARSING
+# ==========================
+def _decode_kafka_value(raw_val):
+    """
+    Kafka record value -> Canal JSON dict (base64 or plain JSON), or None.
+    """
+    canal_obj = None
+    if isinstance(raw_val, str):
         try:
-            envelope = json.loads(event_str)
-        except Exception as e:
-            print("[RISK_FC] JSON parse failed:", e)
-            envelope = None
-
-        # Kafka trigger
-        if (
-            isinstance(envelope, list)
-            and len(envelope) > 0
-            and isinstance(envelope[0], dict)
-            and "value" in envelope[0]
-        ):
-            print("[RISK_FC] Detected Kafka trigger event")
-            rec     = envelope[0]
-            raw_val = rec.get("value")
-
-            canal_obj = None
-            if isinstance(raw_val, str):
-                try:
-                    decoded   = base64.b64decode(raw_val).decode("utf-8")
-                    canal_obj = json.loads(decoded)
-                    print("[RISK_FC] Kafka value decoded from base64")
-                except Exception:
-                    try:
-                        canal_obj = json.loads(raw_val)
-                        print("[RISK_FC] Kafka value treated as plain JSON")
-                    except Exception as e2:
-                        print("[RISK_FC] Failed to parse Kafka value:", e2)
-            elif isinstance(raw_val, dict):
-                canal_obj = raw_val
-
-            if not canal_obj:
-                print("[RISK_FC] No valid Canal JSON in Kafka record, skipping")
-                return "SKIPPED_INVALID_VALUE"
-
-            print("[RISK_FC] Canal JSON snippet:", str(canal_obj)[:300])
-
-            if canal_obj.get("type") and canal_obj.get("type") != "INSERT":
-                print("[RISK_FC] Not an INSERT event, skipping")
-                return "SKIPPED_NON_INSERT"
-
-            data_list = canal_obj.get("data") or []
-            if not data_list:
-                print("[RISK_FC] Canal JSON has empty data[], skipping")
-                return "SKIPPED_EMPTY_DATA"
-
-            data_row = data_list[0]
-
-            user_code    = data_row.get("user_code") or data_row.get("userCode")
-            txn_id_input = (
-                data_row.get("code")
-                or data_row.get("transaction_id")
-                or data_row.get("id")
-            )
-
+            decoded   = base64.b64decode(raw_val).decode("utf-8")
+            canal_obj = json.loads(decoded)
+            print("[RISK_FC] Kafka value decoded from base64")
+        except Exception:
+            try:
+                canal_obj = json.loads(raw_val)
+                print("[RISK_FC] Kafka value treated as plain JSON")
+            except Exception as e2:
+                print("[RISK_FC] Failed to parse Kafka value:", e2)
+    elif isinstance(raw_val, dict):
+        canal_obj = raw_val
+    return canal_obj
+
+
+def _extract_txn_keys(data_row):
+    user_code    = data_row.get("user_code") or data_row.get("userCode")
+    txn_id_input = (
+        data_row.get("code")
+        or data_row.get("transaction_id")
+        or data_row.get("id")
+    )
+    return user_code, txn_id_input
+
+
+def _parse_kafka_batch(envelope):
+    """
+    Decodes EVERY record of a Kafka trigger batch (and every Canal data row).
+    Returns a list of entries, one per record/row:
+      {"record": i, "status": "PENDING", "user_code": ..., "txn_id": ...}
+      {"record": i, "status": "SKIPPED_..."}
+    """
+    entries = []
+    for idx, rec in enumerate(envelope):
+        if not isinstance(rec, dict):
+            entries.append({"record": idx, "status": "SKIPPED_INVALID_VALUE"})
+            continue
+
+        canal_obj = _decode_kafka_value(rec.get("value"))
+        if not canal_obj:
+            print("[RISK_FC] No valid Canal JSON in Kafka record, skipping")
+            entries.append({"record": idx, "status": "SKIPPED_INVALID_VALUE"})
+            continue
+
+        print("[RISK_FC] Canal JSON snippet:", str(canal_obj)[:300])
+
+        if canal_obj.get("type") and canal_obj.get("type") != "INSERT":
+            print("[RISK_FC] Not an INSERT event, skipping")
+            entries.append({"record": idx, "status": "SKIPPED_NON_INSERT"})
+            continue
+
+        data_list = canal_obj.get("data") or []
+        if not data_list:
+            print("[RISK_FC] Canal JSON has empty data[], skipping")
+            entries.append({"record": idx, "status": "SKIPPED_EMPTY_DATA"})
+            continue
+
+        for data_row in data_list:
+            user_code, txn_id_input = _extract_txn_keys(data_row)
             print(
                 f"[RISK_FC] Kafka payload extracted: user_code={user_code}, txn_id={txn_id_input}"
             )
-
             if not user_code:
                 print("[RISK_FC] No user_code in Kafka data row, skipping")
-                return "SKIPPED_NO_USER_CODE"
-
-            payload = {"user_code": user_code, "txn_id": txn_id_input}
-
-        # HTTP / API style
-        else:
-            print("[RISK_FC] Non-Kafka event, using HTTP-style parsing")
-            if isinstance(envelope, dict) and "body" in envelope:
-                body_str = envelope.get("body") or ""
-                if envelope.get("isBase64Encoded", False) and body_str:
-                    body_str = base64.b64decode(body_str).decode(
-                        "utf-8", errors="ignore"
-                    )
-                try:
-                    payload = json.loads(body_str)
-                except Exception:
-                    form_data = parse_qs(body_str)
-                    for k, v in form_data.items():
-                        payload[k] = v[0]
-            elif isinstance(envelope, dict):
-                payload = envelope
-            else:
-                try:
-                    payload = json.loads(event_str)
-                except Exception:
-                    payload = {}
-
-            user_code    = payload.get("user_code")
-            txn_id_input = (
-                payload.get("txn_id")
-                or payload.get("txnId")
-                or payload.get("code")
-                or payload.get("id")
+                entries.append({"record": idx, "status": "SKIPPED_NO_USER_CODE"})
+                continue
+
+            entries.append(
+                {
+                    "record": idx,
+                    "status": "PENDING",
+                    "user_code": user_code,
+                    "txn_id": txn_id_input,
+                }
             )
+    return entries
 
-        if not user_code:
-            return _make_response(400, {"error": "Missing user_code"})
-
-    except Exception as exc:
-        print("[RISK_FC] Request parsing failed:", exc)
-        return _make_response(
-            400, {"error": f"Request Parsing Failed: {str(exc)}"}
-        )
-
-    # ==========================
-    # 2. Fetch risk_features
-    # ==========================
-    features = None
-    if txn_id_input:
-        features = core.wait_for_risk_features(
-            user_code, txn_id_input, max_retries=5, delay=1.0
-        )
 
-    # Fallback: latest txn for this user
-    if not features:
-        conn = None
-        try:
-            conn = core.get_db_conn()
-            cur  = conn.cursor()
-            cur.execute(
-                "SELECT * FROM rt.risk_features WHERE user_code = %s ORDER BY update_time DESC LIMIT 1",
-                (str(user_code),),
-            )
-            row = cur.fetchone()
-            if row:
-                features = core.dict_factory(cur, row)
-                print(
-                    "[RISK_FC] Fallback to latest risk_features for user_code",
-                    user_code,
-                )
-        except Exception as e:
-            print("[RISK_FC] Error in fallback feature fetch:", e)
-        finally:
-            if conn:
-                conn.close()
+# ==========================
+# DECISION PIPELINE
+# ==========================
+def _stamp_features(user_code, txn_id_input, features):
+    """
+    Ensure user_code & txn_id in snapshot; returns the final txn_id.
+    """
+    final_txn_id = features.get(
+        "txn_id", str(txn_id_input) if txn_id_input else "unknown"
+    )
+    features["user_code"] = user_code
+    features["txn_id"]    = final_txn_id
+    return final_txn_id
+
+
+def _decide(
+    user_code,
+    txn_id_input,
+    features,
+    rules,
+    rule_result=None,
+    ai_raw=None,
+    timer=None,
+    rule_version=None,
+    rules_unavailable=None,
+):
+    """
+    Runs rules (and the Phase-2 AI for HOLD) for ONE transaction.
+    Batch mode passes a precomputed rule_result / ai_raw to skip those steps.
+    rule_version (the compiled rule set's version) is stamped on every row.
+    rules_unavailable (reason) -> HOLD without rules or AI (fail closed).
+    Returns (result_payload, decision_rows); rows are written by the caller.
+    """
+    rows  = []
+    timer = timer or stage_timing.StageTimer()
 
     if not features:
         print(
@@ -186,49 +163,72 @@ def handler(event, context):
             "source": "NO_DATA",
         }
 
-        core.log_decision_to_db(
-            user_code,
-            txn_id_input,
-            {
-                "decision": "HOLD",
-                "primary_threat": "UNKNOWN",
-                "risk_score": 0,
-                "narrative": "Risk data not found in rt.risk_features.",
-            },
-            {},
-            "NO_DATA",
+        rows.append(
+            core.build_decision_row(
+                user_code,
+                txn_id_input,
+                {
+                    "decision": "HOLD",
+                    "primary_threat": "UNKNOWN",
+                    "risk_score": 0,
+                    "narrative": "Risk data not found in rt.risk_features.",
+                },
+                {},
+                "NO_DATA",
+                rule_set_version=rule_version,
+            )
         )
-        core.send_lark_notification(result_payload)
-        return _make_response(200, result_payload)
-
-    final_txn_id = features.get(
-        "txn_id", str(txn_id_input) if txn_id_input else "unknown"
-    )
+        return result_payload, rows
 
-    # Ensure user_code & txn_id in snapshot
-    features["user_code"] = user_code
-    features["txn_id"]    = final_txn_id
+    final_txn_id = _stamp_features(user_code, txn_id_input, features)
 
     withdrawal_amount = features.get("withdrawal_amount")
     withdraw_currency = features.get("withdraw_currency")
 
-    dest_address = features.get("destination_address")
-    chain        = features.get("chain")  # optional, if you store it
-
-    
+    # Serialize the snapshot once; every decision row for this txn reuses it
+    features_json = core.serialize_features(features)
+
+    if rules_unavailable:
+        narrative = f"Rule set unavailable ({rules_unavailable}). Held until rules are revalidated."
+        source    = "RULES_UNAVAILABLE"
+        rows.append(
+            core.build_decision_row(
+                user_code, final_txn_id,
+                {"decision": "HOLD", "primary_threat": "RULES_UNAVAILABLE", "risk_score": 0, "narrative": narrative},
+                features, source, features_json=features_json, rule_set_version=rule_version,
+            )
+        )
+        result_payload = {
+            "user_code": user_code,
+            "txn_id": final_txn_id,
+            "decision": "HOLD",
+            "reasons": [narrative],
+            "risk_score": 0,
+            "primary_threat": "RULES_UNAVAILABLE",
+            "source": source,
+            "withdrawal_amount": withdrawal_amount,
+            "withdraw_currency": withdraw_currency,
+        }
+        return result_payload, rows
 
     # ==========================
     # 6. Dynamic rt.risk_rules
     # ==========================
-    rules       = core.load_dynamic_rules()
-    rule_result = core.evaluate_fixed_rules(features, rules)
+    if rule_result is None:
+        with timer.stage("evaluate_rules"):
+            rule_result = core.evaluate_fixed_rules(features, rules)
 
     if rule_result.get("triggered"):
         decision = rule_result.get("decision", "HOLD")  # PASS / HOLD / REJECT from rules
         source   = "RULE_ENGINE_RULES"
 
         # 6.1 Log Phase-1 (rule engine) decision for traceability
-        core.log_decision_to_db(user_code, final_txn_id, rule_result, features, source)
+        rows.append(
+            core.build_decision_row(
+                user_code, final_txn_id, rule_result, features, source,
+                features_json=features_json, rule_set_version=rule_version,
+            )
+        )
 
         # --- CASE A: PASS or REJECT → final, NO AI ---
         if decision in ("PASS", "REJECT"):
@@ -243,15 +243,16 @@ def handler(event, context):
                 "withdrawal_amount": withdrawal_amount,
                 "withdraw_currency": withdraw_currency,
             }
-            # REJECT → notify; PASS → no Lark
-            if decision in ("REJECT", "HOLD"):
-                core.send_lark_notification(result_payload)
-            return _make_response(200, result_payload)
+            return result_payload, rows
 
         # --- CASE B: HOLD → Phase 2 AI Agent ---
         if decision == "HOLD":
             # Phase 2: call AI agent with features + rule context
-            ai_raw = core.call_gemini_reasoning_rest(features, rule_context=rule_result)
+            if ai_raw is None:
+                with timer.stage("gemini"):
+                    ai_raw = core.call_gemini_reasoning_rest(
+                        features, rule_context=rule_result, rule_set_version=rule_version
+                    )
 
             final_decision      = ai_raw.get("final_decision", "HOLD")
             final_primary_threat = ai_raw.get("primary_threat", "NONE")
@@ -268,9 +269,12 @@ def handler(event, context):
                 "narrative": final_narrative,
             }
 
-            ai_source = "AI_AGENT_REVIEW"
-            core.log_decision_to_db(
-                user_code, final_txn_id, ai_log_result, features, ai_source
+            ai_source = "AI_AGENT_REVIEW_CACHED" if ai_raw.get("cached") else "AI_AGENT_REVIEW"
+            rows.append(
+                core.build_decision_row(
+                    user_code, final_txn_id, ai_log_result, features, ai_source,
+                    features_json=features_json, rule_set_version=rule_version,
+                )
             )
 
             final_payload = {
@@ -284,12 +288,7 @@ def handler(event, context):
                 "withdrawal_amount": withdrawal_amount,
                 "withdraw_currency": withdraw_currency,
             }
-
-            # Only final decision goes to Lark (HOLD or REJECT)
-            if final_decision in ("REJECT", "HOLD"):
-                core.send_lark_notification(final_payload)
-
-            return _make_response(200, final_payload)
+            return final_payload, rows
 
 
     # ==========================
@@ -302,7 +301,12 @@ def handler(event, context):
         "narrative": "No whitelist/blacklist/greylist or dynamic rule triggered. Default PASS.",
     }
     source = "RULE_ENGINE_DEFAULT_PASS"
-    core.log_decision_to_db(user_code, final_txn_id, default_result, features, source)
+    rows.append(
+        core.build_decision_row(
+            user_code, final_txn_id, default_result, features, source,
+            features_json=features_json, rule_set_version=rule_version,
+        )
+    )
 
     result_payload = {
         "user_code": user_code,
@@ -316,4 +320,354 @@ def handler(event, context):
         "withdrawal_amount": withdrawal_amount,
         "withdraw_currency": withdraw_currency,
     }
+    return result_payload, rows
+
+
+def _notify(result_payload):
+    # Only HOLD / REJECT go to Lark; PASS → no Lark
+    if result_payload.get("decision") in ("REJECT", "HOLD"):
+        core.send_lark_notification(result_payload)
+
+
+def _collapse_duplicates(pending):
+    """
+    One evaluation per (user_code, txn_id) within a batch. Later copies get
+    status DUPLICATE_IN_BATCH and "_first" -> the entry that is decided.
+    Returns ({key: first entry}, [duplicate entries]).
+    """
+    first_by_key = {}
+    duplicates   = []
+    for entry in pending:
+        if not entry["txn_id"]:
+            continue
+        key = (str(entry["user_code"]), str(entry["txn_id"]))
+        if key in first_by_key:
+            entry["status"] = "DUPLICATE_IN_BATCH"
+            entry["_first"] = first_by_key[key]
+            duplicates.append(entry)
+        else:
+            first_by_key[key] = entry
+    return first_by_key, duplicates
+
+
+def _handle_kafka_batch(envelope, timer):
+    """
+    Batch mode: one bulk feature fetch, one rule load, batched Gemini
+    adjudication of HOLDs, one multi-row decision INSERT.
+    Returns a per-record status list (JSON string).
+    """
+    with timer.stage("parse"):
+        entries = _parse_kafka_batch(envelope)
+    pending = [e for e in entries if e["status"] == "PENDING"]
+
+    # 1.5 Idempotency: collapse in-batch copies, replay already-decided txns
+    first_by_key, duplicates = _collapse_duplicates(pending)
+    with timer.stage("idempotency"):
+        replay = core.lookup_final_decisions(list(first_by_key)) if first_by_key else {}
+    for key, recorded in replay.items():
+        first_by_key[key].update(
+            {
+                "status": "ALREADY_DECIDED",
+                "decision": recorded.get("decision"),
+                "source": recorded.get("source"),
+            }
+        )
+    pending = [e for e in pending if e["status"] == "PENDING"]
+
+    print(
+        f"[RISK_FC] Kafka batch: {len(envelope)} record(s), {len(pending)} txn(s) to decide "
+        f"({len(replay)} already decided, {len(duplicates)} duplicate(s) in batch)"
+    )
+    timer.note(
+        mode="kafka", records=len(envelope), txns=len(pending),
+        replayed=len(replay), duplicates=len(duplicates),
+    )
+
+    # 2. Fetch risk_features for the whole batch
+    keys     = [(e["user_code"], e["txn_id"]) for e in pending if e["txn_id"]]
+    with timer.stage("wait_features"):
+        features_by_key = core.wait_for_risk_features_bulk(
+            keys,
+            max_retries=cfg.FEATURE_WAIT_RETRIES,
+            delay=cfg.FEATURE_WAIT_DELAY_SECS,
+        )
+
+    # Fallback: latest txn for this user (once per user per batch)
+    latest_by_user = {}
+
+    with timer.stage("load_rules"):
+        rule_set = core.load_rule_snapshot() if pending else _NO_RULES
+    rules        = rule_set["rules"]
+    rule_version = rule_set["version"]
+    timer.note(rule_set_version=rule_version)
+
+    # 6. Rules for every txn first, so all HOLDs can share Gemini requests
+    for entry in pending:
+        user_code    = entry["user_code"]
+        txn_id_input = entry["txn_id"]
+
+        features = None
+        if txn_id_input:
+            features = features_by_key.get((str(user_code), str(txn_id_input)))
+        if not features:
+            if user_code not in latest_by_user:
+                with timer.stage("fetch_latest"):
+                    latest_by_user[user_code] = core.fetch_latest_risk_features(user_code)
+            latest   = latest_by_user[user_code]
+            features = latest.copy() if latest else None
+
+        entry["_features"]    = features
+        entry["_rule_result"] = None
+        if features:
+            try:
+                _stamp_features(user_code, txn_id_input, features)
+                with timer.stage("evaluate_rules"):
+                    entry["_rule_result"] = core.evaluate_fixed_rules(features, rules)
+            except Exception as exc:
+                print(f"[RISK_FC] Error evaluating rules for txn_id={txn_id_input}: {exc}")
+
+    # 6.2 Phase-2 AI: all rule-engine HOLDs in batched requests
+    holds = [
+        e for e in pending
+        if e["_rule_result"] and e["_rule_result"].get("triggered")
+        and e["_rule_result"].get("decision", "HOLD") == "HOLD"
+    ]
+    if holds:
+        with timer.stage("gemini"):
+            ai_verdicts = core.call_gemini_reasoning_batch(
+                [(e["_features"], e["_rule_result"]) for e in holds],
+                rule_set_version=rule_version,
+            )
+    else:
+        ai_verdicts = []
+    for entry, ai_raw in zip(holds, ai_verdicts):
+        entry["_ai_raw"] = ai_raw
+
+    decision_rows = []
+    to_notify     = []
+    for entry in pending:
+        user_code    = entry["user_code"]
+        txn_id_input = entry["txn_id"]
+        features     = entry.pop("_features")
+        rule_result  = entry.pop("_rule_result")
+        ai_raw       = entry.pop("_ai_raw", None)
+
+        try:
+            result_payload, rows = _decide(
+                user_code, txn_id_input, features, rules,
+                rule_result=rule_result, ai_raw=ai_raw, rule_version=rule_version,
+                rules_unavailable=rule_set.get("unavailable"),
+            )
+        except Exception as exc:
+            print(f"[RISK_FC] Error deciding user_code={user_code}, txn_id={txn_id_input}: {exc}")
+            entry["status"] = "ERROR"
+            continue
+
+        decision_rows.extend(rows)
+        to_notify.append(result_payload)
+        core.record_final_decision(user_code, txn_id_input, result_payload)
+        entry.update(
+            {
+                "status": "DECIDED",
+                "txn_id": result_payload.get("txn_id"),
+                "decision": result_payload.get("decision"),
+                "source": result_payload.get("source"),
+            }
+        )
+
+    for entry in duplicates:
+        first = entry.pop("_first")
+        entry.update(
+            {
+                "duplicate_of": first["record"],
+                "decision": first.get("decision"),
+                "source": first.get("source"),
+            }
+        )
+
+    timer.note(decided=len(to_notify))
+    # Rows carry the timings up to the decision; later stages are log-only
+    decision_rows = core.with_stage_timings(decision_rows, timer.as_dict())
+    with timer.stage("log_decision"):
+        core.log_decisions_bulk(decision_rows)
+    with timer.stage("notify"):
+        for result_payload in to_notify:
+            _notify(result_payload)
+
+    return json.dumps(entries, default=str)
+
+
+def initializer(context):
+    """
+    FC initializer hook (runs once per instance, before the first request):
+    pre-opens the DB pool, loads + compiles rules and warms the HTTP clients.
+    """
+    started = time.perf_counter()
+    steps   = core.warm_up()
+    total   = round((time.perf_counter() - started) * 1000.0, 3)
+    print(f"[RISK_FC] Initializer done in {total}ms: {json.dumps(steps)}")
+
+
+def handler(event, context):
+    global _COLD
+    print("[RISK_FC] Handler invoked")
+    timer = stage_timing.StageTimer()
+    if _COLD:
+        _COLD = False
+        # Module loaded -> this invocation: initializer + FC idle gap
+        timer.note(cold_start=True, since_load_ms=round((timer.started - _LOADED_AT) * 1000.0, 3))
+    try:
+        return _handle_event(event, timer)
+    finally:
+        # Buffered decision rows always go out before we return
+        with timer.stage("flush_decisions"):
+            core.flush_decision_log()
+        core.flush_rule_stats()
+        timer.emit()
+
+
+def _handle_event(event, timer):
+    payload      = {}
+    user_code    = None
+    txn_id_input = None
+    parse_started = time.perf_counter()
+
+    # ==========================
+    # 1. Parse event (Kafka / HTTP)
+    # ==========================
+    try:
+        if isinstance(event, (bytes, bytearray)):
+            event_str = event.decode("utf-8", errors="ignore")
+        else:
+            event_str = event if isinstance(event, str) else json.dumps(event)
+
+        print("[RISK_FC] Raw event snippet:", event_str[:500])
+
+        try:
+            envelope = json.loads(event_str)
+        except Exception as e:
+            print("[RISK_FC] JSON parse failed:", e)
+            envelope = None
+
+        # Kafka trigger (whole batch)
+        if (
+            isinstance(envelope, list)
+            and len(envelope) > 0
+            and isinstance(envelope[0], dict)
+            and "value" in envelope[0]
+        ):
+            print("[RISK_FC] Detected Kafka trigger event")
+            timer.add_since("parse", parse_started)
+            return _handle_kafka_batch(envelope, timer)
+
+        # HTTP / API style
+        print("[RISK_FC] Non-Kafka event, using HTTP-style parsing")
+        if isinstance(envelope, dict) and "body" in envelope:
+            body_str = envelope.get("body") or ""
+            if envelope.get("isBase64Encoded", False) and body_str:
+                body_str = base64.b64decode(body_str).decode(
+                    "utf-8", errors="ignore"
+                )
+            try:
+                payload = json.loads(body_str)
+            except Exception:
+                form_data = parse_qs(body_str)
+                for k, v in form_data.items():
+                    payload[k] = v[0]
+        elif isinstance(envelope, dict):
+            payload = envelope
+        else:
+            try:
+                payload = json.loads(event_str)
+            except Exception:
+                payload = {}
+
+        user_code    = payload.get("user_code")
+        txn_id_input = (
+            payload.get("txn_id")
+            or payload.get("txnId")
+            or payload.get("code")
+            or payload.get("id")
+        )
+
+        if not user_code:
+            return _make_response(400, {"error": "Missing user_code"})
+
+    except Exception as exc:
+        print("[RISK_FC] Request parsing failed:", exc)
+        return _make_response(
+            400, {"error": f"Request Parsing Failed: {str(exc)}"}
+        )
+    timer.add_since("parse", parse_started)
+    timer.note(mode="http", txns=1)
+
+    # ==========================
+    # 1.5 Already decided? (FC retry / duplicate call)
+    # ==========================
+    if txn_id_input:
+        with timer.stage("idempotency"):
+            replay = core.lookup_final_decisions([(user_code, txn_id_input)])
+        if replay:
+            result_payload = dict(next(iter(replay.values())), replayed=True)
+            print(
+                f"[RISK_FC] user_code={user_code}, txn_id={txn_id_input} already decided "
+                f"({result_payload.get('decision')}), replaying"
+            )
+            timer.note(decided=0, replayed=1, decision=result_payload.get("decision"))
+            return _make_response(200, result_payload)
+
+    # ==========================
+    # 2. Fetch risk_features
+    # ==========================
+    features = None
+    if txn_id_input:
+        with timer.stage("wait_features"):
+            features = core.wait_for_risk_features(
+                user_code,
+                txn_id_input,
+                max_retries=cfg.FEATURE_WAIT_RETRIES,
+                delay=cfg.FEATURE_WAIT_DELAY_SECS,
+            )
+
+    # Fallback: latest txn for this user
+    if not features:
+        with timer.stage("fetch_latest"):
+            features = core.fetch_latest_risk_features(user_code)
+
+    with timer.stage("load_rules"):
+        rule_set = core.load_rule_snapshot() if features else _NO_RULES
+    timer.note(rule_set_version=rule_set["version"])
+    result_payload, rows = _decide(
+        user_code, txn_id_input, features, rule_set["rules"],
+        timer=timer, rule_version=rule_set["version"],
+        rules_unavailable=rule_set.get("unavailable"),
+    )
+    timer.note(decided=1, decision=result_payload.get("decision"), source=result_payload.get("source"))
+
+    rows = core.with_stage_timings(rows, timer.as_dict())
+    with timer.stage("log_decision"):
+        core.log_decisions_bulk(rows)
+    core.record_final_decision(user_code, txn_id_input, result_payload)
+    with timer.stage("notify"):
+        _notify(result_payload)
     return _make_response(200, result_payload)
+
+
+def pre_freeze(context):
+    """
+    FC PreFreeze lifecycle hook: flush buffered decision rows and drain queued
+    Lark notifications (bounded by LARK_FLUSH_DEADLINE_SECS) before the
+    instance is frozen.
+    """
+    core.flush_decision_log()
+    core.flush_lark_notifications()
+    print(f"[RISK_FC] AI verdict cache stats: {json.dumps(core.ai_cache_stats())}")
+    print(f"[RISK_FC] Gemini breaker stats: {json.dumps(core.gemini_breaker_stats())}")
+    print(f"[RISK_FC] Gemini prompt stats: {json.dumps(core.ai_prompt_stats())}")
+    print(f"[RISK_FC] Gemini throughput: {json.dumps(core.ai_throughput_stats())}")
+    print(f"[RISK_FC] HTTP pools: {json.dumps(core.http_stats())}")
+    print(f"[RISK_FC] Rule cache: {json.dumps(core.rule_cache_stats())}")
+    print(f"[RISK_FC] Latest-features cache: {json.dumps(core.latest_features_stats())}")
+    print(f"[RISK_FC] Idempotency: {json.dumps(core.idempotency_stats())}")
+    core.flush_rule_stats(force=True)
+    print(f"[RISK_FC] Rule stats: {json.dumps(core.rule_stats_stats())}")
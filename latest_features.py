@@ -0,0 +1,88 @@
+# latest_features.py
+# In-process LRU of the newest rt.risk_features row per user, for the
+# "txn not in rt.risk_features yet -> use the user's latest features"
+# fallback. Fed by every row the handler reads (point / bulk lookups and
+# rt.risk_features_latest hits), so a hot user's fallback is a dict lookup.
+# Entries expire after ttl_secs: rows written for this user via another
+# instance become visible again within that bound.
+
+import threading
+import time
+from collections import OrderedDict
+
+print("[RISK_FC] Loading latest_features.py")
+
+
+def _is_newer(candidate, current):
+    """
+    update_time comparison; a missing or incomparable timestamp counts as newer.
+    """
+    if candidate is None or current is None:
+        return True
+    try:
+        return candidate >= current
+    except TypeError:
+        return str(candidate) >= str(current)
+
+
+class LatestFeaturesCache:
+    """
+    Thread-safe LRU {user_code: (expires_at, features)} with per-entry TTL.
+    max_entries=0 disables it (every get misses, offers are dropped).
+    """
+
+    def __init__(self, max_entries=5000, ttl_secs=60):
+        self._max_entries = max_entries
+        self._ttl_secs    = ttl_secs
+        self._entries     = OrderedDict()
+        self._lock        = threading.Lock()
+        self.stats        = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "updates": 0, "older_ignored": 0}
+
+    def get(self, user_code):
+        key = str(user_code)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1].copy()
+
+    def offer(self, features):
+        """
+        Remembers `features` as the user's latest row unless a newer one
+        (by update_time) is already cached.
+        """
+        if not features or not self._max_entries or features.get("user_code") is None:
+            return
+        key = str(features["user_code"])
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                if not _is_newer(features.get("update_time"), entry[1].get("update_time")):
+                    self.stats["older_ignored"] += 1
+                    return
+            self._entries[key] = (now + self._ttl_secs, features.copy())
+            self._entries.move_to_end(key)
+            self.stats["updates"] += 1
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
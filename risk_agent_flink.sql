@@ -381,10 +381,23 @@ CREATE TEMPORARY TABLE risk_sink (
     'sink.insert.flush-interval-ms' = '1000'
 );
 
+-- Latest row per user for the FC "txn not found yet" fallback: a point
+-- lookup on PK user_code instead of sorting the user's history.
+-- Hologres: rt.risk_features_latest = same columns as rt.risk_features,
+-- PRIMARY KEY (user_code). Last write wins (insertorupdate).
+-- Connection and sink options (credentials included) come from risk_sink;
+-- only the target table is overridden.
+CREATE TEMPORARY TABLE risk_latest_sink (
+    PRIMARY KEY (user_code) NOT ENFORCED
+) WITH (
+    'tablename' = 'rt.risk_features_latest'
+)
+LIKE risk_sink (EXCLUDING CONSTRAINTS OVERWRITING OPTIONS);
+
 -- =========================================
 -- 5. LOGIC: Join All 9 Lookups
 -- =========================================
-INSERT INTO risk_sink
+CREATE TEMPORARY VIEW risk_features_v AS
 SELECT
     -- 1. Keys
     CAST(w.user_code AS STRING) AS user_code,
@@ -649,3 +662,12 @@ LEFT JOIN dim_risk_greylist FOR SYSTEM_TIME AS OF w.proc_time AS ga
 LEFT JOIN dim_risk_greylist FOR SYSTEM_TIME AS OF w.proc_time AS gi
     ON gi.entity_type = 'IP_ADDRESS'
    AND gi.entity_value = d.last_ip;
+
+-- =========================================
+-- 6. WRITE: per-txn wide table + latest row per user
+-- =========================================
+EXECUTE STATEMENT SET
+BEGIN
+    INSERT INTO risk_sink        SELECT * FROM risk_features_v;
+    INSERT INTO risk_latest_sink SELECT * FROM risk_features_v;
+END;
@@ -0,0 +1,352 @@
+# rule_cache.py
+# Stale-while-revalidate cache of the compiled rt.risk_rules set.
+# Requests always get the current compiled set; once it is older than the
+# revalidate interval, ONE background thread probes a cheap version token
+# and only re-fetches + recompiles when the rules actually changed.
+#
+# Every DB-validated set is also persisted to a local snapshot file (rows +
+# marshalled code objects + version hash). A cold instance loads that file
+# first (no DB, no parsing) and revalidates against the DB in the
+# background; snapshots older than the staleness bound are ignored, and a
+# set loaded from the snapshot stops being served (StaleRuleSetError) once
+# it passes the bound without a successful revalidation.
+# The file is trusted like the code package: keep it on instance-local
+# storage or an operator-controlled mount.
+#
+# build_index (optional): rules -> evaluation index (see rule_index.py),
+# built next to every newly compiled set, off the request path.
+
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+
+import rule_engine
+
+print("[RISK_FC] Loading rule_cache.py")
+
+
+_SNAPSHOT_HEADER = b"RISK_RULES_SNAPSHOT_V1"
+_COMPILED_KEYS   = ("code", "referenced_features")
+
+
+class StaleRuleSetError(Exception):
+    """
+    The only set available came from the snapshot file and has not been
+    revalidated against the DB within the staleness bound.
+    """
+
+
+def _interpreter_tag():
+    # marshal output is only guaranteed readable by the same Python minor version
+    return f"{sys.implementation.name}-{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def write_rule_snapshot(path, snap):
+    """
+    Atomically writes a compiled rule set (as held by RuleCache) to `path`.
+    """
+    rules = []
+    for rule in snap["rules"]:
+        row = {k: v for k, v in rule.items() if k not in _COMPILED_KEYS}
+        rules.append(
+            {
+                "row": json.loads(json.dumps(row, default=str)),
+                "code": rule["code"],
+                "referenced_features": frozenset(rule.get("referenced_features") or ()),
+            }
+        )
+    payload = marshal.dumps(
+        {
+            "interpreter": _interpreter_tag(),
+            "version": snap["version"],
+            "hash": snap["hash"],
+            "probe_token": snap.get("probe_token"),
+            "n_rows": snap.get("n_rows", len(rules)),
+            "validated_at": snap["validated_at"],
+            "rules": rules,
+        }
+    )
+    digest = hashlib.sha256(payload).hexdigest().encode("ascii")
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as fh:
+        fh.write(_SNAPSHOT_HEADER + b"\n" + digest + b"\n" + payload)
+    os.replace(tmp_path, path)
+
+
+def read_rule_snapshot(path, max_age_secs, tag="RISK_FC"):
+    """
+    Snapshot dict (same shape RuleCache serves, source="snapshot"), or None
+    when the file is missing, corrupt or older than max_age_secs.
+    A snapshot from another Python version is recompiled from its rows.
+    """
+    try:
+        with open(path, "rb") as fh:
+            blob = fh.read()
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        print(f"[{tag}] Could not read rule snapshot {path}: {exc}")
+        return None
+
+    header, _, rest = blob.partition(b"\n")
+    digest, _, payload = rest.partition(b"\n")
+    if header != _SNAPSHOT_HEADER or hashlib.sha256(payload).hexdigest().encode("ascii") != digest:
+        print(f"[{tag}] Rule snapshot {path} is corrupt, ignoring it")
+        return None
+    try:
+        data = marshal.loads(payload)
+    except Exception as exc:
+        print(f"[{tag}] Rule snapshot {path} unreadable ({exc}), ignoring it")
+        return None
+
+    age = time.time() - data["validated_at"]
+    if age > max_age_secs:
+        print(
+            f"[{tag}] Rule snapshot {data['version']} is {age:.0f}s old "
+            f"(bound {max_age_secs:.0f}s), not using it"
+        )
+        return None
+
+    if data.get("interpreter") == _interpreter_tag():
+        rules = []
+        for item in data["rules"]:
+            rule = dict(item["row"])
+            rule["code"] = item["code"]
+            rule["referenced_features"] = item["referenced_features"]
+            rules.append(rule)
+    else:
+        rules = rule_engine.compile_rule_set([item["row"] for item in data["rules"]])
+
+    return {
+        "rules": rules,
+        "version": data["version"],
+        "hash": data["hash"],
+        "probe_token": data["probe_token"],
+        "n_rows": data["n_rows"],
+        "validated_at": data["validated_at"],
+        "source": "snapshot",
+    }
+
+
+class RuleCache:
+    """
+    fetch_rows()    -> list of rt.risk_rules row dicts (priority order)
+    fetch_version() -> cheap change token (e.g. count + hash of the rows);
+                       if it raises, the refresh falls back to a full fetch
+                       and compares row hashes instead.
+
+    snapshot() -> {"rules": [...compiled...], "version": "<12 hex>", ...}
+    The version is the rule_set_hash prefix of the rows it was compiled from,
+    so the same rule table always yields the same version on every instance.
+
+    snapshot_path: persist each DB-validated set there and, on a cold start,
+    serve it (if validated within snapshot_max_age_secs) while the DB is
+    revalidated in the background. If revalidation keeps failing, snapshot()
+    raises StaleRuleSetError once that set is older than the same bound.
+    """
+
+    def __init__(
+        self,
+        fetch_rows,
+        fetch_version=None,
+        revalidate_secs=300,
+        snapshot_path=None,
+        snapshot_max_age_secs=3600,
+        build_index=None,
+        tag="RISK_FC",
+    ):
+        self._fetch_rows      = fetch_rows
+        self._fetch_version   = fetch_version
+        self._revalidate_secs = revalidate_secs
+        self._snapshot_path   = snapshot_path
+        self._snapshot_max_age_secs = snapshot_max_age_secs
+        self._build_index     = build_index
+        self._tag             = tag
+        self._snapshot        = None
+        self._checked_at      = 0.0
+        self._refreshing      = False
+        self._lock            = threading.Lock()
+        self._load_lock       = threading.Lock()
+        self.stats            = {
+            "loads": 0,
+            "probes": 0,
+            "unchanged": 0,
+            "reloads": 0,
+            "probe_errors": 0,
+            "refresh_errors": 0,
+            "snapshot_loads": 0,
+            "stale_refusals": 0,
+            "snapshot_writes": 0,
+            "snapshot_write_errors": 0,
+        }
+
+    # --------------------------
+    # internals
+    # --------------------------
+    def _probe(self):
+        if self._fetch_version is None:
+            return None
+        try:
+            self.stats["probes"] += 1
+            return self._fetch_version()
+        except Exception as exc:
+            self.stats["probe_errors"] += 1
+            print(f"[{self._tag}] Rule version probe failed, falling back to full fetch: {exc}")
+            return None
+
+    def _load(self, probe_token):
+        rows    = self._fetch_rows()
+        digest  = rule_engine.rule_set_hash(rows)
+        current = self._snapshot
+        if current is not None and current["hash"] == digest:
+            # Probe said "changed" (or was unavailable) but the rows are identical
+            return dict(current, probe_token=probe_token)
+        rules = rule_engine.compile_rule_set(rows)
+        return {
+            "rules": rules,
+            "rule_index": self._index(rules),
+            "version": digest[:12],
+            "hash": digest,
+            "probe_token": probe_token,
+            "n_rows": len(rows),
+        }
+
+    def _index(self, rules):
+        if self._build_index is None or not rules:
+            return None
+        return self._build_index(rules)
+
+    def _persist(self, snap):
+        if not self._snapshot_path:
+            return
+        try:
+            write_rule_snapshot(self._snapshot_path, snap)
+            self.stats["snapshot_writes"] += 1
+        except Exception as exc:
+            self.stats["snapshot_write_errors"] += 1
+            print(f"[{self._tag}] Could not write rule snapshot {self._snapshot_path}: {exc}")
+
+    def _refresh(self):
+        """
+        Probe, then reload only on change. Returns True if the set was swapped.
+        Either way the served set is now DB-validated (and persisted).
+        """
+        current = self._snapshot
+        token   = self._probe()
+        if current is not None and token is not None and token == current["probe_token"]:
+            self.stats["unchanged"] += 1
+            snapshot = dict(current, validated_at=time.time(), source="db")
+            swapped  = False
+        else:
+            snapshot = dict(self._load(token), validated_at=time.time(), source="db")
+            swapped  = current is None or snapshot["hash"] != current["hash"]
+            if swapped:
+                self.stats["reloads"] += 1
+                print(
+                    f"[{self._tag}] Rule set {snapshot['version']} active "
+                    f"({len(snapshot['rules'])}/{snapshot['n_rows']} rules)"
+                )
+            else:
+                self.stats["unchanged"] += 1
+        self._snapshot = snapshot
+        self._persist(snapshot)
+        return swapped
+
+    def _cold_load(self):
+        """
+        First load in this instance: local snapshot if fresh enough (and
+        revalidate right away in the background), else the DB, blocking.
+        """
+        if self._snapshot_path:
+            snap = read_rule_snapshot(self._snapshot_path, self._snapshot_max_age_secs, self._tag)
+            if snap is not None:
+                snap["rule_index"] = self._index(snap["rules"])
+                self._snapshot   = snap
+                self._checked_at = time.monotonic() - self._revalidate_secs
+                self.stats["snapshot_loads"] += 1
+                print(
+                    f"[{self._tag}] Rule set {snap['version']} loaded from snapshot "
+                    f"({len(snap['rules'])} rules, validated {time.time() - snap['validated_at']:.0f}s ago)"
+                )
+                return
+        self._refresh()
+        self._checked_at = time.monotonic()
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        except Exception as exc:
+            self.stats["refresh_errors"] += 1
+            print(f"[{self._tag}] Background rule refresh failed, serving stale set: {exc}")
+        finally:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self._refreshing = False
+
+    # --------------------------
+    # public API
+    # --------------------------
+    def snapshot(self):
+        """
+        Current compiled set. Blocks only when nothing is loaded yet.
+        Raises StaleRuleSetError for a snapshot-loaded set past the bound.
+        """
+        snap = self._snapshot
+        if snap is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self.stats["loads"] += 1
+                    self._cold_load()
+            snap = self._snapshot
+
+        if time.monotonic() - self._checked_at >= self._revalidate_secs:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(
+                    target=self._background_refresh, name="rule-refresh", daemon=True
+                ).start()
+
+        if snap.get("source") == "snapshot":
+            age = time.time() - snap["validated_at"]
+            if age > self._snapshot_max_age_secs:
+                self.stats["stale_refusals"] += 1
+                raise StaleRuleSetError(
+                    f"rule set {snap['version']} from snapshot not revalidated for {age:.0f}s "
+                    f"(bound {self._snapshot_max_age_secs:.0f}s)"
+                )
+        return snap
+
+    def served(self, rules):
+        """
+        The current snapshot dict (version, rule_index, ...) if `rules` is
+        the set it serves, else None.
+        """
+        snap = self._snapshot
+        if snap is not None and snap["rules"] is rules:
+            return snap
+        return None
+
+    def invalidate(self):
+        """
+        Drops the in-memory set; the next snapshot() does a cold load again
+        (the snapshot file, if any, is kept).
+        """
+        with self._load_lock:
+            self._snapshot   = None
+            self._checked_at = 0.0
+
+    def snapshot_stats(self):
+        snap  = self._snapshot
+        stats = dict(self.stats)
+        stats["version"]  = snap["version"] if snap else None
+        stats["source"]   = snap.get("source") if snap else None
+        stats["n_rules"]  = len(snap["rules"]) if snap else 0
+        stats["rule_index"] = snap["rule_index"].stats if snap and snap.get("rule_index") else None
+        stats["validated_age_secs"] = round(time.time() - snap["validated_at"], 1) if snap else None
+        return stats
@@ -0,0 +1,150 @@
+# rule_engine.py
+# Compiles rt.risk_rules.logic_expression ONCE into sandboxed code objects.
+# IMPORTANT: No feature calculations here, only parsing/validating rule text.
+
+import ast
+import hashlib
+import json
+
+print("[RISK_FC] Loading rule_engine.py")
+
+
+class RuleValidationError(ValueError):
+    """logic_expression uses syntax outside the rule whitelist."""
+
+
+# Comparisons, boolean ops, arithmetic, constants and feature names only.
+# No calls, attributes, subscripts, lambdas, comprehensions or ** .
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.FloorDiv,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.IfExp,
+    ast.Tuple, ast.List,
+    ast.Name, ast.Load,
+    ast.Constant,
+)
+
+_ALLOWED_CONSTANT_TYPES = (bool, int, float, str, type(None))
+
+_SAFE_GLOBALS = {"__builtins__": {}}
+
+# {rule_set_hash: [compiled rule dicts]} – only the last few versions are kept
+_COMPILED_RULE_SETS = {}
+_MAX_CACHED_RULE_SETS = 4
+
+
+def parse_rule_expression(expression):
+    """
+    Parses + validates one logic_expression against the whitelist.
+    Returns (ast.Expression, frozenset of referenced feature names).
+    Raises RuleValidationError for anything malformed or not allowed.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise RuleValidationError("empty logic_expression")
+
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise RuleValidationError(f"syntax error: {exc.msg}") from None
+
+    names = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise RuleValidationError(f"disallowed syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, _ALLOWED_CONSTANT_TYPES):
+            raise RuleValidationError(f"disallowed constant: {node.value!r}")
+        if isinstance(node, ast.Name):
+            if node.id.startswith("_"):
+                raise RuleValidationError(f"disallowed name: {node.id}")
+            names.add(node.id)
+    return tree, frozenset(names)
+
+
+def compile_rule(rule):
+    """
+    rt.risk_rules row -> copy of the row with:
+      - "code":                 compiled code object for the expression
+      - "referenced_features":  frozenset of feature names the rule reads
+    """
+    tree, names = parse_rule_expression(rule.get("logic_expression"))
+    compiled = dict(rule)
+    compiled["code"] = compile(tree, f"<rule {rule.get('rule_id')}>", "eval")
+    compiled["referenced_features"] = names
+    return compiled
+
+
+def eval_compiled_rule(compiled_rule, safe_locals):
+    """
+    One rule evaluation = one eval of a pre-built code object (no parsing).
+    """
+    return eval(compiled_rule["code"], _SAFE_GLOBALS, safe_locals)
+
+
+def rule_hit_result(rule):
+    """
+    Decision dict for a matching rule (same shape evaluate_fixed_rules returns).
+    """
+    return {
+        "triggered": True,
+        "decision": rule["action"],  # PASS / HOLD / REJECT
+        "primary_threat": "RULE_HIT",
+        "risk_score": 100,
+        "narrative": f"[Rule #{rule.get('rule_id')}] {rule.get('narrative')}",
+        # NEW: pass rule metadata to AI
+        "rule_id": rule.get("rule_id"),
+        "rule_name": rule.get("rule_name"),
+    }
+
+
+def rule_set_hash(rule_rows):
+    """
+    Stable hash of the raw rt.risk_rules rows (order matters: priority).
+    """
+    blob = json.dumps(rule_rows, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def compile_rule_set(rule_rows):
+    """
+    Compiles all rows once; cached by rule_set_hash so an unchanged table
+    is never re-parsed. Malformed rules are rejected (and reported) here,
+    at load time, not on every request.
+    """
+    key    = rule_set_hash(rule_rows)
+    cached = _COMPILED_RULE_SETS.get(key)
+    if cached is not None:
+        return cached
+
+    compiled_rules = []
+    for row in rule_rows:
+        try:
+            compiled_rules.append(compile_rule(row))
+        except RuleValidationError as exc:
+            print(
+                f"[RISK_FC] Rule #{row.get('rule_id')} ({row.get('rule_name')}) "
+                f"rejected at load: {exc}"
+            )
+
+    if len(_COMPILED_RULE_SETS) >= _MAX_CACHED_RULE_SETS:
+        _COMPILED_RULE_SETS.pop(next(iter(_COMPILED_RULE_SETS)))
+    _COMPILED_RULE_SETS[key] = compiled_rules
+
+    print(
+        f"[RISK_FC] Compiled {len(compiled_rules)}/{len(rule_rows)} rules "
+        f"(rule set {key[:12]})"
+    )
+    return compiled_rules
+
+
+def referenced_features(compiled_rules):
+    """
+    Union of feature names read by the given compiled rules.
+    """
+    names = set()
+    for rule in compiled_rules:
+        names.update(rule.get("referenced_features") or ())
+    return names
@@ -0,0 +1,335 @@
+# rule_replay.py
+# Offline backtest / replay of a CANDIDATE rt.risk_rules set over history.
+#
+# Input (local export, streamed – never fully loaded into memory):
+#   - rt.risk_withdraw_decision export: rows with features_snapshot + decision
+#       \copy (SELECT * FROM rt.risk_withdraw_decision WHERE ...) TO 'decisions.csv' CSV HEADER
+#   - or a plain rt.risk_features dump (no "actual" decision to diff against)
+#       \copy (SELECT * FROM rt.risk_features WHERE ...) TO 'features.csv' CSV HEADER
+#   .jsonl / .csv, optionally .gz
+#   Snapshots logged with FEATURE_FETCH_MODE=projected only hold the columns
+#   the rules of the day read; names a candidate rule reads that are absent
+#   from a snapshot evaluate as null and are listed under missing_features.
+#
+# Candidate rules: JSON list of rt.risk_rules rows
+#   (rule_id, rule_name, logic_expression, action, priority, status, narrative)
+#
+# Usage:
+#   python rule_replay.py --rules candidate_rules.json decisions.jsonl.gz [more files...]
+#       [--workers 4] [--chunk-size 5000] [--json-report report.json]
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import rule_engine
+import rule_vectorized
+
+# Only Phase-1 rows carry the rule engine's own decision; AI / NO_DATA rows
+# repeat the same snapshot and would double count.
+RULE_ENGINE_SOURCES = ("RULE_ENGINE_RULES", "RULE_ENGINE_DEFAULT_PASS")
+
+DEFAULT_DECISION = "PASS"  # same as index.handler's default PASS
+
+
+# ==========================
+# INPUT STREAMING
+# ==========================
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _coerce_csv_value(raw):
+    """
+    CSV cells are text; restore numbers / booleans / null like the DB row had.
+    """
+    if raw is None or raw == "":
+        return None
+    low = raw.lower()
+    if low in ("t", "true"):
+        return True
+    if low in ("f", "false"):
+        return False
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+def iter_export_rows(path):
+    """
+    Yields one dict per exported row (JSONL or CSV, optionally gzipped).
+    """
+    with _open_text(path) as fh:
+        if ".csv" in path:
+            for row in csv.DictReader(fh):
+                yield {
+                    k: (v if k == "features_snapshot" else _coerce_csv_value(v))
+                    for k, v in row.items()
+                }
+        else:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def iter_cases(paths, sources=RULE_ENGINE_SOURCES):
+    """
+    Export rows -> (features, actual_decision or None).
+    Decision rows contribute their features_snapshot; feature dumps are used as-is.
+    """
+    for path in paths:
+        for row in iter_export_rows(path):
+            if "features_snapshot" in row:
+                if sources and row.get("decision_source") not in sources:
+                    continue
+                snapshot = row.get("features_snapshot")
+                if isinstance(snapshot, str):
+                    snapshot = json.loads(snapshot) if snapshot else {}
+                if not snapshot:
+                    continue
+                yield snapshot, row.get("decision")
+            else:
+                yield row, None
+
+
+def iter_chunks(cases, chunk_size):
+    chunk = []
+    for case in cases:
+        chunk.append(case)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ==========================
+# WORKER
+# ==========================
+_WORKER_RULES = None
+_WORKER_NAMES = ()
+
+
+def _init_worker(rule_rows):
+    global _WORKER_RULES, _WORKER_NAMES
+    _WORKER_RULES = rule_engine.compile_rule_set(rule_rows)
+    _WORKER_NAMES = tuple(sorted(rule_engine.referenced_features(_WORKER_RULES)))
+
+
+def _replay_chunk(chunk):
+    """
+    Evaluates one chunk in a worker process; returns mergeable counters.
+    """
+    rules        = _WORKER_RULES
+    features     = [c[0] for c in chunk]
+    rule_seconds = [0.0] * len(rules)
+
+    started = time.perf_counter()
+    indices = rule_vectorized.first_match_indices(features, rules, rule_seconds=rule_seconds)
+    elapsed = time.perf_counter() - started
+
+    # Names the rules read that are not keys of the row (null values count as present)
+    missing = Counter()
+    for row in features:
+        for name in _WORKER_NAMES:
+            if name not in row:
+                missing[name] += 1
+
+    hits       = Counter()
+    rule_diffs = Counter()
+    matrix     = Counter()
+    for (_, actual), idx in zip(chunk, indices):
+        idx       = int(idx)
+        candidate = rules[idx]["action"] if idx != rule_vectorized.NO_MATCH else DEFAULT_DECISION
+        hits[idx] += 1
+        if actual is not None:
+            matrix[(actual, candidate)] += 1
+            if actual != candidate:
+                rule_diffs[idx] += 1
+    return {
+        "rows": len(chunk),
+        "eval_seconds": elapsed,
+        "rule_seconds": rule_seconds,
+        "hits": hits,
+        "rule_diffs": rule_diffs,
+        "matrix": matrix,
+        "missing": missing,
+    }
+
+
+# ==========================
+# DRIVER
+# ==========================
+def load_candidate_rules(path):
+    with open(path, "r", encoding="utf-8") as fh:
+        rows = json.load(fh)
+    rows = [r for r in rows if (r.get("status") or "ACTIVE") == "ACTIVE"]
+    rows.sort(key=lambda r: (r.get("priority") is None, r.get("priority") or 0))
+    return rows
+
+
+def replay(paths, rule_rows, workers=None, chunk_size=5000, sources=RULE_ENGINE_SOURCES):
+    """
+    Streams cases through the candidate rules across a process pool.
+    At most 2 chunks per worker are in flight, so memory stays bounded
+    no matter how many months of history are replayed.
+    """
+    workers  = workers or os.cpu_count() or 1
+    compiled = rule_engine.compile_rule_set(rule_rows)
+    totals   = {
+        "rows": 0,
+        "eval_seconds": 0.0,
+        "rule_seconds": [0.0] * len(compiled),
+        "hits": Counter(),
+        "rule_diffs": Counter(),
+        "matrix": Counter(),
+        "missing": Counter(),
+    }
+
+    def _merge(part):
+        totals["rows"]         += part["rows"]
+        totals["eval_seconds"] += part["eval_seconds"]
+        for i, secs in enumerate(part["rule_seconds"]):
+            totals["rule_seconds"][i] += secs
+        totals["hits"].update(part["hits"])
+        totals["rule_diffs"].update(part["rule_diffs"])
+        totals["matrix"].update(part["matrix"])
+        totals["missing"].update(part["missing"])
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(rule_rows,)
+    ) as pool:
+        in_flight = set()
+        for chunk in iter_chunks(iter_cases(paths, sources), chunk_size):
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    _merge(fut.result())
+            in_flight.add(pool.submit(_replay_chunk, chunk))
+        for fut in in_flight:
+            _merge(fut.result())
+    totals["wall_seconds"] = time.perf_counter() - started
+    return totals
+
+
+def build_report(totals, rule_rows):
+    """
+    Per-rule hits / diffs / throughput + overall decision diff matrix.
+    Rule indices refer to the COMPILED rule set (rejected rules are dropped).
+    """
+    compiled = rule_engine.compile_rule_set(rule_rows)
+    rows     = totals["rows"] or 1
+    per_rule = []
+    for idx, rule in enumerate(compiled):
+        secs = totals["rule_seconds"][idx]
+        per_rule.append(
+            {
+                "rule_id": rule.get("rule_id"),
+                "rule_name": rule.get("rule_name"),
+                "action": rule.get("action"),
+                "hits": totals["hits"].get(idx, 0),
+                "hit_rate": totals["hits"].get(idx, 0) / rows,
+                "diffs_vs_actual": totals["rule_diffs"].get(idx, 0),
+                "eval_seconds": round(secs, 6),
+                "rows_per_sec": round(totals["rows"] / secs, 1) if secs > 0 else None,
+            }
+        )
+    missing = [
+        {
+            "name": name,
+            "rows": n,
+            "rule_ids": [r.get("rule_id") for r in compiled if name in (r.get("referenced_features") or ())],
+        }
+        for name, n in sorted(totals["missing"].items())
+    ]
+    return {
+        "rows": totals["rows"],
+        "wall_seconds": round(totals["wall_seconds"], 3),
+        "rows_per_sec": round(totals["rows"] / totals["wall_seconds"], 1)
+        if totals["wall_seconds"] > 0 else None,
+        "eval_rows_per_sec": round(totals["rows"] / totals["eval_seconds"], 1)
+        if totals["eval_seconds"] > 0 else None,
+        "default_pass": totals["hits"].get(rule_vectorized.NO_MATCH, 0),
+        "default_pass_diffs_vs_actual": totals["rule_diffs"].get(rule_vectorized.NO_MATCH, 0),
+        "decision_matrix": [
+            {"actual": a, "candidate": c, "count": n}
+            for (a, c), n in sorted(totals["matrix"].items())
+        ],
+        "rules": per_rule,
+        "missing_features": missing,
+    }
+
+
+def print_report(report):
+    print(
+        f"[REPLAY] {report['rows']} rows in {report['wall_seconds']}s "
+        f"({report['rows_per_sec']} rows/s wall, {report['eval_rows_per_sec']} rows/s eval)"
+    )
+    print(f"{'rule_id':>8} {'action':<7} {'hits':>10} {'hit%':>7} {'diffs':>9} {'rows/s':>12}  rule_name")
+    for r in report["rules"]:
+        print(
+            f"{str(r['rule_id']):>8} {str(r['action']):<7} {r['hits']:>10} "
+            f"{100 * r['hit_rate']:>6.2f}% {r['diffs_vs_actual']:>9} "
+            f"{str(r['rows_per_sec']):>12}  {r['rule_name']}"
+        )
+    print(
+        f"{'default':>8} {'PASS':<7} {report['default_pass']:>10} "
+        f"{'':>7} {report['default_pass_diffs_vs_actual']:>9}"
+    )
+    for m in report["missing_features"]:
+        print(
+            f"[REPLAY] WARNING: {m['name']} missing from {m['rows']} row(s) "
+            f"(read by rule(s) {m['rule_ids']}); evaluated as null"
+        )
+    if report["decision_matrix"]:
+        print("[REPLAY] actual -> candidate")
+        for m in report["decision_matrix"]:
+            print(f"  {m['actual']:>7} -> {m['candidate']:<7} {m['count']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a candidate rule set over exported history.")
+    parser.add_argument("inputs", nargs="+", help="decision or feature exports (.jsonl/.csv[.gz])")
+    parser.add_argument("--rules", required=True, help="candidate rt.risk_rules rows (JSON list)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument(
+        "--all-sources", action="store_true",
+        help="replay every decision row, not only rule-engine (Phase-1) rows",
+    )
+    parser.add_argument("--json-report", help="also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    rule_rows = load_candidate_rules(args.rules)
+    totals    = replay(
+        args.inputs,
+        rule_rows,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        sources=None if args.all_sources else RULE_ENGINE_SOURCES,
+    )
+    report = build_report(totals, rule_rows)
+    print_report(report)
+    if args.json_report:
+        with open(args.json_report, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
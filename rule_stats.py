@@ -0,0 +1,311 @@
+# rule_stats.py
+# Per-rule runtime counters for rt.risk_rules:
+#   - evaluations (txns that reached the rule), hits and exceptions, for
+#     every txn
+#   - evaluation time, on every sample_every-th txn, which is evaluated rule
+#     by rule with a timer around each rule
+# Counters are kept per compiled rule list and flushed as aggregated deltas:
+# ONE structured RULE_STATS JSON log line per rule set and flush window, and
+# optionally rows in a stats table (STATS_COLUMNS, written by core).
+#
+# Rank rules by cost / hit rate from FC logs (prune dead rules, reorder
+# expensive ones):
+#   python rule_stats.py fc-logs/*.log
+#   python rule_stats.py --sort hit_rate --top 50 fc.log
+#   cat fc.log | python rule_stats.py --json
+
+import json
+import sys
+import threading
+import time
+
+print("[RISK_FC] Loading rule_stats.py")
+
+LOG_MARKER = "RULE_STATS"
+
+# Log line "rules" entries and stats table rows (after the window / version)
+RULE_COLUMNS  = ("rule_id", "rule_name", "position", "evaluations", "hits", "errors", "sampled_evals", "sampled_us")
+STATS_COLUMNS = ("window_start", "window_end", "rule_set_version") + RULE_COLUMNS
+
+
+class RuleSetCounters:
+    """
+    Counters for one compiled rule list. The hot path takes no lock: a
+    concurrent increment may be lost, a flush never sees a torn row.
+    """
+
+    __slots__ = ("rules", "version", "stops", "errors", "sampled_evals", "sampled_ns", "txns", "sampled_txns")
+
+    def __init__(self, rules, version=None):
+        n = len(rules)
+        self.rules         = rules
+        self.version       = version
+        self.stops         = [0] * (n + 1)   # txns decided at rule i; [n] = no rule hit
+        self.errors        = [0] * n
+        self.sampled_evals = [0] * n
+        self.sampled_ns    = [0] * n
+        self.txns          = 0
+        self.sampled_txns  = 0
+
+    def record_stop(self, position, sampled=False):
+        """
+        position = index of the winning rule, or len(rules) for no hit.
+        Rules before it were all evaluated (that is what priority order means).
+        """
+        self.stops[position] += 1
+        self.txns += 1
+        if sampled:
+            self.sampled_txns += 1
+
+    def record_error(self, position):
+        self.errors[position] += 1
+
+    def record_sample(self, position, elapsed_ns):
+        self.sampled_evals[position] += 1
+        self.sampled_ns[position]    += elapsed_ns
+
+    def rule_rows(self):
+        """
+        One list per rule, in RULE_COLUMNS order.
+        """
+        rows    = []
+        reached = self.txns
+        for position, rule in enumerate(self.rules):
+            rows.append(
+                [
+                    rule.get("rule_id"),
+                    rule.get("rule_name"),
+                    position,
+                    reached,
+                    self.stops[position],
+                    self.errors[position],
+                    self.sampled_evals[position],
+                    round(self.sampled_ns[position] / 1000.0, 3),
+                ]
+            )
+            reached -= self.stops[position]
+        return rows
+
+
+class RuleStats:
+    """
+    Registry of RuleSetCounters keyed by rule list identity.
+    sink(rows) (optional) receives STATS_COLUMNS tuples on every flush,
+    e.g. a queued DB insert; it should not block.
+    sample_every=0 turns the timed rule-by-rule samples off.
+    """
+
+    def __init__(self, sample_every=100, flush_secs=60.0, sink=None, tag="RISK_FC"):
+        self._sample_every = sample_every
+        self._flush_secs   = flush_secs
+        self._sink         = sink
+        self._tag          = tag
+        self._sets         = {}   # id(rules) -> RuleSetCounters (keeps the list alive)
+        self._seq          = 0
+        self._lock         = threading.Lock()
+        self._window_start = time.time()
+        self._flushed_at   = time.monotonic()
+        self.stats         = {"flushes": 0, "rule_rows": 0, "sink_errors": 0}
+
+    def counters(self, rules, version=None):
+        counters = self._sets.get(id(rules))
+        if counters is None or counters.rules is not rules:
+            with self._lock:
+                counters = self._sets.get(id(rules))
+                if counters is None or counters.rules is not rules:
+                    counters = self._sets[id(rules)] = RuleSetCounters(rules, version)
+        return counters
+
+    def sample_due(self):
+        """
+        True on every sample_every-th txn: evaluate rule by rule, timed.
+        """
+        if self._sample_every <= 0:
+            return False
+        self._seq += 1
+        return self._seq % self._sample_every == 0
+
+    def flush(self, force=False):
+        """
+        Emits and resets the counters once flush_secs have passed (or now,
+        with force). Returns the number of rule rows emitted.
+        """
+        if not force and time.monotonic() - self._flushed_at < self._flush_secs:
+            return 0
+        with self._lock:
+            sets, self._sets = self._sets, {}
+            window_start, window_end = self._window_start, time.time()
+            self._window_start = window_end
+            self._flushed_at   = time.monotonic()
+
+        table_rows = []
+        for counters in sets.values():
+            if not counters.txns:
+                continue
+            rule_rows = counters.rule_rows()
+            record = {
+                "rule_set_version": counters.version,
+                "window_start": round(window_start, 3),
+                "window_end": round(window_end, 3),
+                "txns": counters.txns,
+                "sampled_txns": counters.sampled_txns,
+                "columns": RULE_COLUMNS,
+                "rules": rule_rows,
+            }
+            print(f"[{self._tag}] {LOG_MARKER} {json.dumps(record, separators=(',', ':'), default=str)}")
+            table_rows += [(window_start, window_end, counters.version) + tuple(r) for r in rule_rows]
+
+        self.stats["flushes"]   += 1
+        self.stats["rule_rows"] += len(table_rows)
+        if table_rows and self._sink is not None:
+            try:
+                self._sink(table_rows)
+            except Exception as exc:
+                self.stats["sink_errors"] += 1
+                print(f"[{self._tag}] Rule stats sink failed: {exc}")
+        return len(table_rows)
+
+    def snapshot_stats(self):
+        stats = dict(self.stats)
+        stats["rule_sets"] = len(self._sets)
+        stats["txns"]      = sum(c.txns for c in list(self._sets.values()))
+        return stats
+
+
+# ==========================
+# REPORT
+# ==========================
+def parse_log_line(line):
+    """
+    Log line -> RULE_STATS record dict, or None.
+    """
+    pos = line.find(LOG_MARKER)
+    if pos < 0:
+        return None
+    try:
+        record = json.loads(line[pos + len(LOG_MARKER):].strip())
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or not isinstance(record.get("rules"), list):
+        return None
+    return record
+
+
+def aggregate(lines, dead_min_evals=1000):
+    """
+    Iterable of log lines -> list of per-rule dicts (summed over windows,
+    instances and rule set versions), with derived rates, mean / estimated
+    total cost and flags (DEAD, UNREACHED, ERRORS).
+    """
+    rules = {}
+    for line in lines:
+        record = parse_log_line(line)
+        if record is None:
+            continue
+        columns = record.get("columns") or RULE_COLUMNS
+        for values in record["rules"]:
+            row = dict(zip(columns, values))
+            key = row.get("rule_id")
+            acc = rules.get(key)
+            if acc is None:
+                acc = rules[key] = {
+                    "rule_id": key, "rule_name": None, "position": None, "versions": set(),
+                    "evaluations": 0, "hits": 0, "errors": 0, "sampled_evals": 0, "sampled_us": 0.0,
+                }
+            acc["rule_name"] = row.get("rule_name")
+            acc["position"]  = row.get("position")
+            acc["versions"].add(record.get("rule_set_version"))
+            for name in ("evaluations", "hits", "errors", "sampled_evals", "sampled_us"):
+                acc[name] += row.get(name) or 0
+
+    report = []
+    for acc in rules.values():
+        evals   = acc["evaluations"]
+        sampled = acc["sampled_evals"]
+        mean_us = acc["sampled_us"] / sampled if sampled else None
+        flags   = []
+        if not evals:
+            flags.append("UNREACHED")
+        elif not acc["hits"] and evals >= dead_min_evals:
+            flags.append("DEAD")
+        if acc["errors"]:
+            flags.append("ERRORS")
+        report.append(
+            dict(
+                acc,
+                versions=sorted(str(v) for v in acc["versions"]),
+                hit_rate=round(acc["hits"] / evals, 6) if evals else 0.0,
+                error_rate=round(acc["errors"] / evals, 6) if evals else 0.0,
+                mean_us=round(mean_us, 3) if mean_us is not None else None,
+                est_cost_ms=round(evals * mean_us / 1000.0, 3) if mean_us is not None else 0.0,
+                flags=flags,
+            )
+        )
+    total_cost = sum(r["est_cost_ms"] for r in report) or 1.0
+    for r in report:
+        r["cost_share"] = round(r["est_cost_ms"] / total_cost, 4)
+    return report
+
+
+_SORT_KEYS = {
+    "cost": lambda r: -r["est_cost_ms"],
+    "mean": lambda r: -(r["mean_us"] or 0.0),
+    "hit_rate": lambda r: (r["hit_rate"], -r["evaluations"]),
+    "hits": lambda r: -r["hits"],
+    "errors": lambda r: (-r["error_rate"], -r["errors"]),
+    "position": lambda r: (r["position"] is None, r["position"]),
+}
+
+
+def _print_report(report):
+    header = (
+        f"{'rule_id':>8} {'pos':>5} {'evals':>10} {'hits':>8} {'hit%':>8} {'err%':>7} "
+        f"{'mean us':>8} {'cost ms':>10} {'share':>6}  {'flags':<16} rule_name"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in report:
+        mean = f"{r['mean_us']:.2f}" if r["mean_us"] is not None else "-"
+        print(
+            f"{str(r['rule_id']):>8} {str(r['position']):>5} {r['evaluations']:>10} {r['hits']:>8} "
+            f"{r['hit_rate'] * 100:>7.3f}% {r['error_rate'] * 100:>6.2f}% {mean:>8} "
+            f"{r['est_cost_ms']:>10.1f} {r['cost_share'] * 100:>5.1f}%  {','.join(r['flags']):<16} {r['rule_name']}"
+        )
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank rt.risk_rules by cost / hit rate from RULE_STATS log lines")
+    parser.add_argument("logs", nargs="*", help="log files (default: stdin)")
+    parser.add_argument("--sort", choices=sorted(_SORT_KEYS), default="cost")
+    parser.add_argument("--top", type=int, default=0, help="only the first N rules (0 = all)")
+    parser.add_argument("--dead-min-evals", type=int, default=1000, help="evaluations before 0 hits counts as DEAD")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    def _lines():
+        if not args.logs:
+            yield from sys.stdin
+            return
+        for path in args.logs:
+            with open(path, "r", encoding="utf-8", errors="replace") as fh:
+                yield from fh
+
+    report = sorted(aggregate(_lines(), args.dead_min_evals), key=_SORT_KEYS[args.sort])
+    if args.top:
+        report = report[:args.top]
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        _print_report(report)
+        dead = [r for r in report if "DEAD" in r["flags"] or "UNREACHED" in r["flags"]]
+        if dead:
+            print()
+            print(f"{len(dead)} rule(s) never hit: " + ", ".join(str(r["rule_id"]) for r in dead[:50]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
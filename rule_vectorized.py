@@ -0,0 +1,523 @@
+# rule_vectorized.py
+# Vectorized (NumPy) evaluation of compiled rt.risk_rules over MANY feature rows.
+# Same semantics as core.evaluate_fixed_rules:
+#   - None -> 0 defaulting of every feature
+#   - first matching rule in priority order wins
+#   - a rule that raises for a row (missing feature, x / 0, ...) does not match that row
+# Used for batch decisioning / re-scoring; the per-request path stays scalar.
+
+import ast
+import numbers
+import random
+import sys
+import time
+
+import numpy as np
+
+import rule_engine
+
+print("[RISK_FC] Loading rule_vectorized.py")
+
+NO_MATCH = -1
+
+_MAX_EXACT_FLOAT_INT = 2 ** 53
+
+_ERR = object()  # per-element exception marker inside object arrays
+
+
+class _Unsupported(Exception):
+    """Expression shape has no vectorized translation -> scalar per row."""
+
+
+class _Fallback(Exception):
+    """Column types in THIS batch need Python semantics -> scalar per row."""
+
+
+# ==========================
+# COLUMNS
+# ==========================
+def _is_plain_number(v):
+    if isinstance(v, bool):
+        return True
+    if isinstance(v, int):
+        return -_MAX_EXACT_FLOAT_INT <= v <= _MAX_EXACT_FLOAT_INT
+    return isinstance(v, float)
+
+
+def build_columns(feature_rows, names):
+    """
+    List of feature dicts -> {name: (kind, array, missing_mask)}.
+    kind "num": float64 column (bool/int/float only); kind "obj": object column.
+    None is defaulted to 0 exactly like evaluate_fixed_rules' safe_locals.
+    """
+    n    = len(feature_rows)
+    cols = {}
+    for name in names:
+        values  = [0] * n
+        missing = np.zeros(n, dtype=bool)
+        for i, row in enumerate(feature_rows):
+            if name in row:
+                v = row[name]
+                values[i] = 0 if v is None else v
+            else:
+                missing[i] = True
+
+        if all(_is_plain_number(v) for v in values):
+            arr = np.asarray(values, dtype=np.float64)
+            kind = "num"
+        else:
+            arr = np.empty(n, dtype=object)
+            arr[:] = values
+            kind = "obj"
+        cols[name] = (kind, arr, missing)
+    return cols
+
+
+def scalar_only_rows(feature_rows, names):
+    """
+    Bool mask of rows holding a number other than bool / int / float (e.g. a
+    Decimal from a NUMERIC column) under one of `names`. Python compares those
+    exactly (Decimal("0.1") != 0.1), which neither a float64 column nor an
+    object column mixed with NumPy scalars reproduces, so such rows are
+    evaluated rule by rule.
+    """
+    mask = np.zeros(len(feature_rows), dtype=bool)
+    for i, row in enumerate(feature_rows):
+        for name in names:
+            v = row.get(name)
+            if isinstance(v, numbers.Number) and type(v) not in (bool, int, float):
+                mask[i] = True
+                break
+    return mask
+
+
+# ==========================
+# VALUE HELPERS
+# ==========================
+# A value is (kind, data, err): data is an array or a Python scalar,
+# err is a bool array (or False) marking rows where Python would raise.
+def _kind_of_scalar(v):
+    return "num" if _is_plain_number(v) else "obj"
+
+
+def _or(a, b):
+    return np.logical_or(a, b)
+
+
+def _as_object(data, n):
+    if isinstance(data, np.ndarray):
+        return data.astype(object)
+    arr = np.empty(n, dtype=object)
+    arr[:] = [data] * n
+    return arr
+
+
+def _obj_truthy(data):
+    return np.frompyfunc(bool, 1, 1)(data).astype(bool)
+
+
+def _truthy(value):
+    kind, data, _ = value
+    if kind == "num":
+        return np.not_equal(data, 0)
+    if isinstance(data, np.ndarray):
+        return _obj_truthy(data)
+    return np.bool_(bool(data))
+
+
+def _where(cond, a, b, n):
+    (ka, da, ea), (kb, db, eb) = a, b
+    if ka == "num" and kb == "num":
+        data = np.where(cond, da, db).astype(np.float64)
+        kind = "num"
+    else:
+        data = np.where(cond, _as_object(da, n), _as_object(db, n))
+        kind = "obj"
+    return kind, data, np.where(cond, ea, eb)
+
+
+_NUM_BINOPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.remainder,
+}
+_ZERO_DIV_OPS = (ast.Div, ast.FloorDiv, ast.Mod)
+
+_NUM_CMPOPS = {
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+}
+
+
+def _obj_eq(a, b):
+    try:
+        return bool(a == b)
+    except Exception:
+        return _ERR
+
+
+def _obj_in(a, container):
+    try:
+        return a in container
+    except Exception:
+        return _ERR
+
+
+# ==========================
+# AST -> VECTOR FUNCTION
+# ==========================
+def _build(node):
+    if isinstance(node, ast.Expression):
+        return _build(node.body)
+
+    if isinstance(node, ast.Constant):
+        v = node.value
+        k = _kind_of_scalar(v)
+        return lambda ctx: (k, v, False)
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda ctx: ctx.column(name)
+
+    if isinstance(node, ast.BoolOp):
+        parts  = [_build(v) for v in node.values]
+        is_and = isinstance(node.op, ast.And)
+
+        def _boolop(ctx):
+            acc = parts[0](ctx)
+            for part in parts[1:]:
+                t   = _truthy(acc)
+                nxt = part(ctx)
+                # Python only evaluates the next operand where the previous
+                # one did not short-circuit; errors only count there.
+                take_next = t if is_and else ~t
+                kind, data, _ = _where(take_next, nxt, acc, ctx.n)
+                err = _or(acc[2], np.logical_and(take_next, nxt[2]))
+                acc = (kind, data, err)
+            return acc
+        return _boolop
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _build(node.operand)
+        op      = type(node.op)
+
+        def _unary(ctx):
+            kind, data, err = operand(ctx)
+            if op is ast.Not:
+                return "num", np.where(_truthy((kind, data, err)), 0.0, 1.0), err
+            if kind != "num":
+                raise _Fallback()
+            if op is ast.USub:
+                return "num", np.negative(data), err
+            return "num", data, err
+        return _unary
+
+    if isinstance(node, ast.BinOp):
+        op = type(node.op)
+        if op not in _NUM_BINOPS:
+            raise _Unsupported(op.__name__)
+        left, right = _build(node.left), _build(node.right)
+        ufunc       = _NUM_BINOPS[op]
+
+        def _binop(ctx):
+            kl, dl, el = left(ctx)
+            kr, dr, er = right(ctx)
+            if kl != "num" or kr != "num":
+                raise _Fallback()
+            err = _or(el, er)
+            if op in _ZERO_DIV_OPS:
+                err = _or(err, np.equal(dr, 0))
+            with np.errstate(all="ignore"):
+                data = ufunc(dl, dr)
+            return "num", data, err
+        return _binop
+
+    if isinstance(node, ast.Compare):
+        left  = _build(node.left)
+        ops   = [type(o) for o in node.ops]
+        comps = []
+        for o, comp in zip(ops, node.comparators):
+            if o in (ast.In, ast.NotIn):
+                comps.append(_build_container(comp))
+            elif o in _NUM_CMPOPS:
+                comps.append(_build(comp))
+            else:
+                raise _Unsupported(o.__name__)  # is / is not
+
+        def _compare(ctx):
+            lhs    = left(ctx)
+            result = None
+            err    = lhs[2]
+            for o, comp in zip(ops, comps):
+                rhs = comp(ctx)
+                if o in (ast.In, ast.NotIn):
+                    res, e = _cmp_in(lhs, rhs, ctx.n)
+                    if o is ast.NotIn:
+                        res = ~res
+                else:
+                    res, e = _cmp(o, lhs, rhs, ctx.n)
+                    e = _or(e, rhs[2])
+                if result is None:
+                    result, err = res, _or(err, e)
+                else:
+                    # chained a < b < c: later links only run where earlier held
+                    err    = _or(err, np.logical_and(result, e))
+                    result = np.logical_and(result, res)
+                lhs = rhs
+            return "num", np.asarray(result, dtype=np.float64), err
+        return _compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _build(node.test), _build(node.body), _build(node.orelse)
+
+        def _ifexp(ctx):
+            tv = test(ctx)
+            t  = _truthy(tv)
+            kind, data, err = _where(t, body(ctx), orelse(ctx), ctx.n)
+            return kind, data, _or(tv[2], err)
+        return _ifexp
+
+    raise _Unsupported(type(node).__name__)
+
+
+def _build_container(node):
+    """
+    Right-hand side of `in`: only literal tuples/lists of constants vectorize.
+    """
+    if isinstance(node, (ast.Tuple, ast.List)) and all(
+        isinstance(e, ast.Constant) for e in node.elts
+    ):
+        items = tuple(e.value for e in node.elts)
+        return lambda ctx: ("container", items, False)
+    raise _Unsupported("non-literal container")
+
+
+def _cmp(op, lhs, rhs, n):
+    kl, dl, el = lhs
+    kr, dr, _  = rhs
+    if kl == "container" or kr == "container":
+        raise _Fallback()
+    if kl == "num" and kr == "num":
+        return _NUM_CMPOPS[op](dl, dr), el
+    if op in (ast.Eq, ast.NotEq):
+        eq  = np.frompyfunc(_obj_eq, 2, 1)(_as_object(dl, n), _as_object(dr, n))
+        bad = np.frompyfunc(lambda x: x is _ERR, 1, 1)(eq).astype(bool)
+        res = np.where(bad, False, eq).astype(bool)
+        return (res if op is ast.Eq else ~res), _or(el, bad)
+    # ordering across non-numeric values needs Python's TypeError rules
+    raise _Fallback()
+
+
+def _cmp_in(lhs, rhs, n):
+    kl, dl, el = lhs
+    _, items, _ = rhs
+    if kl == "num" and all(_is_plain_number(i) for i in items):
+        return np.isin(np.broadcast_to(dl, (n,)), np.asarray(items, dtype=np.float64)), el
+    hit = np.frompyfunc(lambda a: _obj_in(a, items), 1, 1)(_as_object(dl, n))
+    bad = np.frompyfunc(lambda x: x is _ERR, 1, 1)(hit).astype(bool)
+    return np.where(bad, False, hit).astype(bool), _or(el, bad)
+
+
+class _BatchContext:
+    def __init__(self, feature_rows, cols, scalar_rows=None):
+        self.n            = len(feature_rows)
+        self.feature_rows = feature_rows
+        self.cols         = cols
+        self.scalar_rows  = scalar_rows if scalar_rows is not None and scalar_rows.any() else None
+        self._safe_locals = None
+
+    def column(self, name):
+        kind, arr, missing = self.cols[name]
+        return kind, arr, missing  # missing feature == NameError in eval
+
+    def safe_locals(self, i):
+        if self._safe_locals is None:
+            self._safe_locals = [None] * self.n
+        loc = self._safe_locals[i]
+        if loc is None:
+            loc = {k: (0 if v is None else v) for k, v in self.feature_rows[i].items()}
+            self._safe_locals[i] = loc
+        return loc
+
+
+# {code object: vector fn or None (unsupported)}
+_VECTOR_FNS = {}
+
+
+def _vector_fn(rule):
+    code = rule["code"]
+    if code not in _VECTOR_FNS:
+        tree, _ = rule_engine.parse_rule_expression(rule["logic_expression"])
+        try:
+            _VECTOR_FNS[code] = _build(tree)
+        except _Unsupported as exc:
+            print(f"[RISK_FC] Rule #{rule.get('rule_id')} not vectorizable ({exc}), scalar fallback")
+            _VECTOR_FNS[code] = None
+    return _VECTOR_FNS[code]
+
+
+def _scalar_mask(rule, ctx, rows_idx):
+    mask = np.zeros(ctx.n, dtype=bool)
+    for i in rows_idx:
+        try:
+            mask[i] = bool(rule_engine.eval_compiled_rule(rule, ctx.safe_locals(i)))
+        except Exception:
+            mask[i] = False
+    return mask
+
+
+def rule_mask(rule, ctx, open_rows):
+    """
+    Boolean mask of rows (among open_rows) where this compiled rule matches.
+    """
+    fn = _vector_fn(rule)
+    if fn is not None:
+        try:
+            value = fn(ctx)
+            mask  = np.logical_and(_truthy(value), np.logical_not(value[2]))
+            mask  = np.broadcast_to(mask, (ctx.n,)) & open_rows
+        except _Fallback:
+            mask = None
+        if mask is not None:
+            if ctx.scalar_rows is not None:
+                rows_idx = np.flatnonzero(open_rows & ctx.scalar_rows)
+                mask[rows_idx] = _scalar_mask(rule, ctx, rows_idx)[rows_idx]
+            return mask
+    return _scalar_mask(rule, ctx, np.flatnonzero(open_rows))
+
+
+# ==========================
+# PUBLIC API
+# ==========================
+def first_match_indices(feature_rows, rules, rule_seconds=None):
+    """
+    For each feature row -> index (into `rules`) of the first matching rule
+    in priority order, or NO_MATCH (-1). `rules` are compiled rule dicts
+    (rule_engine.compile_rule_set / core.load_dynamic_rules).
+    If `rule_seconds` (list, len(rules)) is given, per-rule eval time is added to it.
+    """
+    rules = [r if "code" in r else rule_engine.compile_rule(r) for r in rules]
+    n     = len(feature_rows)
+    out   = np.full(n, NO_MATCH, dtype=np.int64)
+    if n == 0 or not rules:
+        return out
+
+    names = set()
+    for row in feature_rows:
+        names.update(row.keys())
+    referenced = rule_engine.referenced_features(rules)
+    names |= referenced
+
+    ctx = _BatchContext(
+        feature_rows,
+        build_columns(feature_rows, names),
+        scalar_only_rows(feature_rows, referenced),
+    )
+    for idx, rule in enumerate(rules):
+        open_rows = out == NO_MATCH
+        if not open_rows.any():
+            break
+        started = time.perf_counter()
+        out[rule_mask(rule, ctx, open_rows)] = idx
+        if rule_seconds is not None:
+            rule_seconds[idx] += time.perf_counter() - started
+    return out
+
+
+def evaluate_rules_batch(feature_rows, rules):
+    """
+    Batch twin of core.evaluate_fixed_rules: one result dict per row.
+    """
+    indices = first_match_indices(feature_rows, rules)
+    return [
+        rule_engine.rule_hit_result(rules[i]) if i != NO_MATCH else {"triggered": False}
+        for i in indices
+    ]
+
+
+# ==========================
+# EQUIVALENCE CHECK
+# ==========================
+def verify_against_scalar(feature_rows, rules):
+    """
+    Runs core.evaluate_fixed_rules row by row and the vectorized evaluator
+    over the whole batch; returns the list of row indices that disagree.
+    """
+    import contextlib
+    import io
+
+    import core
+
+    vector = evaluate_rules_batch(feature_rows, rules)
+    with contextlib.redirect_stdout(io.StringIO()):
+        scalar = [core.evaluate_fixed_rules(row, rules) for row in feature_rows]
+    return [i for i, (v, s) in enumerate(zip(vector, scalar)) if v != s]
+
+
+_SAMPLE_RULES = [
+    "user_blacklisted or address_blacklisted",
+    "is_sanctioned == True",
+    "destination_age_hours < 24 and withdrawal_ratio > 0.8",
+    "withdrawal_amount / withdrawal_fan_in > 1000",
+    "not user_whitelisted and withdrawal_deviation > 3",
+    "withdraw_currency in ('BTC', 'ETH') and passthrough_turnover < 0.1",
+    "sanctions_status != 'CHECKED' and withdrawal_amount > 5000",
+    "0 < time_since_user_login <= 5 if is_new_device else structuring_velocity >= 3",
+    "(is_new_ip + is_new_device + rapid_cycling) >= 2",
+    "withdrawal_amount % 100 == 0 and account_maturity < 7",
+    "kyc_limit_utilization > 0.9",
+    "chain < 'M'",
+]
+
+
+def _random_row(rng):
+    def maybe(v):
+        return None if rng.random() < 0.15 else v
+    return {
+        "user_code": str(rng.randint(1, 500)),
+        "txn_id": str(rng.randint(1, 10 ** 9)),
+        "user_blacklisted": maybe(rng.random() < 0.05),
+        "address_blacklisted": maybe(rng.random() < 0.05),
+        "user_whitelisted": maybe(rng.random() < 0.2),
+        "is_sanctioned": maybe(rng.random() < 0.05),
+        "is_new_ip": maybe(rng.random() < 0.3),
+        "is_new_device": maybe(rng.random() < 0.3),
+        "rapid_cycling": maybe(rng.random() < 0.2),
+        "destination_age_hours": maybe(rng.randint(0, 5000)),
+        "withdrawal_ratio": maybe(rng.random()),
+        "withdrawal_amount": maybe(rng.choice([0, 100, 250.5, 1000, 9000, 20000])),
+        "withdrawal_fan_in": maybe(rng.randint(0, 5)),
+        "withdrawal_deviation": maybe(rng.uniform(-2, 6)),
+        "withdraw_currency": maybe(rng.choice(["BTC", "ETH", "USDT", "TRX"])),
+        "passthrough_turnover": maybe(rng.random()),
+        "sanctions_status": maybe(rng.choice(["CHECKED", "PENDING", "ERROR"])),
+        "time_since_user_login": maybe(rng.randint(0, 100)),
+        "structuring_velocity": maybe(rng.randint(0, 6)),
+        "account_maturity": maybe(rng.randint(0, 400)),
+        "kyc_limit_utilization": None,
+        "chain": maybe(rng.choice(["BTC", "ETH", "TRX"])),
+    }
+
+
+if __name__ == "__main__":
+    # python rule_vectorized.py [rows] – randomized scalar-vs-vector equivalence check
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng    = random.Random(42)
+    rows   = [_random_row(rng) for _ in range(n_rows)]
+    rules  = rule_engine.compile_rule_set(
+        [
+            {"rule_id": i + 1, "rule_name": f"sample_{i + 1}", "logic_expression": expr,
+             "action": rng.choice(["PASS", "HOLD", "REJECT"]), "narrative": expr}
+            for i, expr in enumerate(_SAMPLE_RULES)
+        ]
+    )
+    mismatches = verify_against_scalar(rows, rules)
+    print(f"[RISK_FC] Equivalence check: {n_rows} rows, {len(rules)} rules, {len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
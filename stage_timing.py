@@ -0,0 +1,171 @@
+# stage_timing.py
+# Per-invocation stage timer: monotonic durations per pipeline stage, emitted
+# as ONE structured JSON log line per invocation and persisted with each
+# decision row (rt.risk_withdraw_decision.stage_timings).
+#
+# Aggregate p50/p95/p99 per stage from FC logs:
+#   python stage_timing.py fc-logs/*.log
+#   cat fc.log | python stage_timing.py --json
+
+import json
+import sys
+import time
+
+print("[RISK_FC] Loading stage_timing.py")
+
+LOG_MARKER = "STAGE_TIMINGS"
+
+
+class _Stage:
+    __slots__ = ("_timer", "_name", "_t0")
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name  = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timer.add(self._name, time.perf_counter() - self._t0)
+        return False
+
+
+class StageTimer:
+    """
+    with timer.stage("load_rules"): ...
+    A stage entered several times (e.g. per txn) accumulates; `counts` says
+    how often. Cost is two perf_counter() calls + a dict update per stage.
+    """
+
+    __slots__ = ("started", "stages", "counts", "fields")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages  = {}   # name -> seconds
+        self.counts  = {}   # name -> times entered
+        self.fields  = {}   # extra context for the log line
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_since(self, name, started):
+        """
+        Records perf_counter() - started under `name` (for code that cannot
+        sit inside a with-block, e.g. early returns).
+        """
+        self.add(name, time.perf_counter() - started)
+
+    def note(self, **fields):
+        self.fields.update(fields)
+
+    def as_dict(self):
+        """
+        {stage: ms, ..., "total": ms since the timer started}, 3 decimals.
+        """
+        out = {name: round(secs * 1000.0, 3) for name, secs in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        return out
+
+    def emit(self, tag="RISK_FC"):
+        record = dict(self.fields)
+        record["stages_ms"] = self.as_dict()
+        repeated = {k: v for k, v in self.counts.items() if v > 1}
+        if repeated:
+            record["stage_counts"] = repeated
+        print(f"[{tag}] {LOG_MARKER} {json.dumps(record, separators=(',', ':'), default=str)}")
+
+
+# ==========================
+# AGGREGATION
+# ==========================
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def parse_log_line(line):
+    """
+    Log line -> stages_ms dict, or None if the line is not a timing record.
+    """
+    pos = line.find(LOG_MARKER)
+    if pos < 0:
+        return None
+    try:
+        record = json.loads(line[pos + len(LOG_MARKER):].strip())
+    except ValueError:
+        return None
+    stages = record.get("stages_ms") if isinstance(record, dict) else None
+    return stages if isinstance(stages, dict) else None
+
+
+def aggregate(lines):
+    """
+    Iterable of log lines -> {stage: {count, mean, p50, p95, p99, max}} in ms.
+    """
+    samples = {}
+    for line in lines:
+        stages = parse_log_line(line)
+        if not stages:
+            continue
+        for name, ms in stages.items():
+            if isinstance(ms, (int, float)):
+                samples.setdefault(name, []).append(float(ms))
+
+    report = {}
+    for name, values in samples.items():
+        values.sort()
+        report[name] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "max": values[-1],
+        }
+    return report
+
+
+def _print_report(report):
+    header = f"{'stage':<22} {'count':>7} {'mean':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}"
+    print(header)
+    print("-" * len(header))
+    ordered = sorted(report.items(), key=lambda kv: (kv[0] == "total", -kv[1]["p95"]))
+    for name, s in ordered:
+        print(
+            f"{name:<22} {s['count']:>7} {s['mean']:>10.3f} {s['p50']:>10.3f} "
+            f"{s['p95']:>10.3f} {s['p99']:>10.3f} {s['max']:>10.3f}"
+        )
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="p50/p95/p99 per stage from STAGE_TIMINGS log lines (ms)")
+    parser.add_argument("logs", nargs="*", help="log files (default: stdin)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    def _lines():
+        if not args.logs:
+            yield from sys.stdin
+            return
+        for path in args.logs:
+            with open(path, "r", encoding="utf-8", errors="replace") as fh:
+                yield from fh
+
+    report = aggregate(_lines())
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# Random rule expressions and feature values for the rule-evaluator
+# equivalence tests: mixed types, NULLs (None -> 0), Decimal, NaN.
+
+import math
+from decimal import Decimal
+
+FEATURES = ("a", "b", "c")
+VALUES = (
+    -1, 0, 1, 2, 3, 10**20, -2.5, 0.0, 1.0, 2.5, math.nan, math.inf,
+    True, False, "", "A", "PENDING", "CHECKED", "10",
+    Decimal("0"), Decimal("2"), Decimal("2.5"), Decimal("-1"),
+)
+CONSTANTS = ("0", "1", "-1", "2.5", "1.0", "-3.5", "''", "'PENDING'", "'A'", "True", "None")
+OPS = ("<", "<=", ">", ">=", "==", "!=")
+
+
+def random_predicate(rng):
+    kind = rng.random()
+    f = rng.choice(FEATURES)
+    if kind < 0.55:
+        return f"{f} {rng.choice(OPS)} {rng.choice(CONSTANTS)}"
+    if kind < 0.65:
+        return f"{rng.choice(CONSTANTS)} {rng.choice(OPS)} {f}"
+    if kind < 0.75:
+        return f"{rng.choice(('-1', '0', '1.5'))} < {f} <= {rng.choice(('2', '2.5', '10'))}"
+    if kind < 0.85:
+        return f
+    return f"({f} + {rng.choice(FEATURES)}) > {rng.choice(('0', '1', '2.5'))}"
+
+
+def random_expression(rng):
+    parts = [random_predicate(rng) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.2:
+        parts[0] = f"not {parts[0]}"
+    return "(" + rng.choice((" and ", " or ")).join(parts) + ")"
+
+
+def random_rows(rng, n, extra_values=()):
+    values = VALUES + (None,) + tuple(extra_values)
+    return [{f: rng.choice(values) for f in FEATURES if rng.random() < 0.95} for _ in range(n)]
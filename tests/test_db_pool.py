@@ -0,0 +1,84 @@
+# ConnectionPool.execute_prepared: a prepared statement whose result columns
+# changed (ALTER TABLE behind SELECT *) is PREPAREd again and re-run once.
+
+import pytest
+
+import db_pool
+
+
+class StalePlanError(Exception):
+    pgcode = "0A000"
+
+    def __init__(self):
+        super().__init__("cached plan must not change result type")
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=None):
+        self._conn.log.append(sql)
+        if sql.startswith("EXECUTE") and self._conn.stale:
+            raise StalePlanError()
+        if sql.startswith("PREPARE"):
+            self._conn.stale = False
+
+
+class FakeConn:
+    closed = 0
+
+    def __init__(self, stale=False):
+        self.stale = stale
+        self.log   = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+def _pool():
+    return db_pool.ConnectionPool(FakeConn, prepared={"lookup": "SELECT * FROM t WHERE id = $1"})
+
+
+def test_execute_prepared_runs_the_statement():
+    pool = _pool()
+    conn = FakeConn()
+    pool.execute_prepared(conn, "lookup", (1,))
+    assert conn.log == ["EXECUTE lookup (%s)"]
+    assert pool.stats["reprepared"] == 0
+
+
+def test_execute_prepared_prepares_again_after_result_type_change():
+    pool = _pool()
+    conn = FakeConn(stale=True)
+    pool.execute_prepared(conn, "lookup", (1,))
+    assert conn.log == [
+        "EXECUTE lookup (%s)",
+        "ROLLBACK",
+        "DEALLOCATE lookup",
+        "PREPARE lookup AS SELECT * FROM t WHERE id = $1",
+        "EXECUTE lookup (%s)",
+    ]
+    assert pool.stats["reprepared"] == 1
+
+
+def test_other_errors_are_raised():
+    class Boom(Exception):
+        pass
+
+    class BadConn(FakeConn):
+        def cursor(self):
+            cur = FakeCursor(self)
+            cur.execute = lambda sql, params=None: (_ for _ in ()).throw(Boom())
+            return cur
+
+    pool = _pool()
+    with pytest.raises(Boom):
+        pool.execute_prepared(BadConn(), "lookup", (1,))
+    assert pool.stats["reprepared"] == 0
@@ -0,0 +1,108 @@
+# BufferedDecisionWriter spill handling: a row that keeps failing must not
+# block later flushes, and the spill file stays bounded.
+
+import json
+import os
+import time
+
+import decision_log
+
+
+class FakeTable:
+    """
+    write_fn that rejects any batch holding a row listed in `poison`, and
+    every batch while `down` is set.
+    """
+
+    def __init__(self, poison=()):
+        self.poison = set(poison)
+        self.down   = False
+        self.rows   = []
+        self.calls  = 0
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("db down")
+        if any(row[0] in self.poison for row in rows):
+            raise ValueError("bad row")
+        self.rows += rows
+
+
+def _writer(tmp_path, table, **kwargs):
+    return decision_log.BufferedDecisionWriter(
+        table, max_rows=1000, max_age_secs=3600, spill_path=str(tmp_path / "spill.jsonl"), **kwargs
+    )
+
+
+def _lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def test_poison_row_is_isolated_and_dead_lettered(tmp_path):
+    table  = FakeTable(poison={"bad"})
+    writer = _writer(tmp_path, table, max_attempts=2)
+
+    writer.append([("a",), ("bad",), ("b",)])
+    assert writer.flush() is False
+    assert len(_lines(tmp_path / "spill.jsonl")) == 3
+
+    # Fresh rows go through on their own; the spill is bisected
+    writer.append([("c",)])
+    assert writer.flush() is True
+    assert sorted(r[0] for r in table.rows) == ["a", "b", "c"]
+    assert [e["row"] for e in _lines(tmp_path / "spill.jsonl")] == [["bad"]]
+
+    writer.append([("d",)])
+    assert writer.flush() is True
+    assert not os.path.exists(tmp_path / "spill.jsonl")
+    assert [e["row"] for e in _lines(str(tmp_path / "spill.jsonl") + ".dead")] == [["bad"]]
+    assert writer.stats["dead_lettered"] == 1
+
+
+def test_db_outage_keeps_spill_without_charging_attempts(tmp_path):
+    table  = FakeTable()
+    writer = _writer(tmp_path, table, max_attempts=1)
+    table.down = True
+    for row in ("a", "b", "c"):
+        writer.append([(row,)])
+        writer.flush()
+    spill = _lines(tmp_path / "spill.jsonl")
+    assert [e["row"] for e in spill] == [["a"], ["b"], ["c"]]
+    assert all(e["attempts"] == 0 for e in spill)
+
+    table.down = False
+    assert writer.flush() is True
+    assert [r[0] for r in table.rows] == ["a", "b", "c"]
+    assert not os.path.exists(tmp_path / "spill.jsonl")
+
+
+def test_spill_is_capped_by_size_and_age(tmp_path):
+    table  = FakeTable()
+    writer = _writer(tmp_path, table, max_spill_rows=2, max_spill_age_secs=60)
+    table.down = True
+    writer.append([("a",), ("b",), ("c",)])
+    writer.flush()
+    assert [e["row"] for e in _lines(tmp_path / "spill.jsonl")] == [["b"], ["c"]]
+    assert [e["row"] for e in _lines(str(tmp_path / "spill.jsonl") + ".dead")] == [["a"]]
+
+    spill = _lines(tmp_path / "spill.jsonl")
+    spill[0]["spilled_at"] = time.time() - 120
+    with open(tmp_path / "spill.jsonl", "w", encoding="utf-8") as fh:
+        fh.write("\n".join(json.dumps(e) for e in spill) + "\n")
+    table.down = False
+    assert writer.flush() is True
+    assert [r[0] for r in table.rows] == ["c"]
+    assert writer.stats["dead_lettered"] == 2
+
+
+def test_legacy_spill_lines_are_read(tmp_path):
+    with open(tmp_path / "spill.jsonl", "w", encoding="utf-8") as fh:
+        fh.write(json.dumps(["old", 1]) + "\n")
+    table  = FakeTable()
+    writer = _writer(tmp_path, table)
+    assert writer.flush() is True
+    assert table.rows == [("old", 1)]
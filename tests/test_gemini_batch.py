@@ -0,0 +1,76 @@
+# call_gemini_reasoning_batch failure handling: a failed batch request HOLDs
+# its whole chunk, only cases missing from a valid answer go one by one, and
+# everything shares one deadline.
+
+import time
+
+import pytest
+
+import circuit_breaker
+import core
+
+
+def _verdict(decision="PASS"):
+    return {
+        "final_decision": decision,
+        "primary_threat": "NONE",
+        "risk_score": 10,
+        "confidence": 0.9,
+        "narrative": "ok",
+        "rule_alignment": "OVERRIDES_TO_PASS",
+    }
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """
+    Replaces the Gemini round trip; `gemini.answers` is consumed per call
+    (None = transport failure, list = batch items, dict = single verdict).
+    """
+    class Fake:
+        answers = []
+        calls   = []
+
+        def generate(self, prompt_text, started, parse=None, deadline=None):
+            self.calls.append(("batch" if "Cases JSON" in prompt_text else "single", deadline))
+            return self.answers.pop(0) if self.answers else None
+
+    fake = Fake()
+    monkeypatch.setattr(core.cfg, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(core.cfg, "GEMINI_BATCH_SIZE", 8)
+    monkeypatch.setattr(core.cfg, "AI_CACHE_ENABLED", False)
+    monkeypatch.setattr(core, "_GEMINI_BREAKER", circuit_breaker.CircuitBreaker("TEST", failure_threshold=1000))
+    monkeypatch.setattr(core, "_gemini_generate_with_budget", fake.generate)
+    return fake
+
+
+CASES = [({"withdrawal_amount": 100 * n}, {"rule_id": n, "decision": "HOLD"}) for n in range(4)]
+
+
+def test_failed_batch_holds_the_chunk_without_single_calls(gemini):
+    verdicts = core.call_gemini_reasoning_batch(CASES)
+    assert [kind for kind, _ in gemini.calls] == ["batch"]
+    assert [v["primary_threat"] for v in verdicts] == ["AI_NET_ERR"] * 4
+
+
+def test_only_cases_missing_from_a_valid_answer_go_one_by_one(gemini):
+    answered = {f"c{n}": _verdict() for n in (1, 2, 4)}
+    gemini.answers = [answered, _verdict("REJECT")]
+    verdicts = core.call_gemini_reasoning_batch(CASES)
+    assert [kind for kind, _ in gemini.calls] == ["batch", "single"]
+    assert [v["final_decision"] for v in verdicts] == ["PASS", "PASS", "REJECT", "PASS"]
+
+
+def test_batch_and_fallbacks_share_one_deadline(gemini):
+    gemini.answers = [{}, _verdict(), _verdict(), _verdict(), _verdict()]
+    before = time.monotonic()
+    core.call_gemini_reasoning_batch(CASES)
+    deadlines = {deadline for _, deadline in gemini.calls}
+    assert len(gemini.calls) == 5 and len(deadlines) == 1
+    assert deadlines.pop() <= before + core.cfg.GEMINI_DEADLINE_SECS + 1
+
+
+def test_spent_deadline_holds_without_calling(gemini):
+    verdict = core.call_gemini_reasoning_rest(*CASES[0], deadline=time.monotonic() - 1)
+    assert verdict["primary_threat"] == "AI_NET_ERR"
+    assert gemini.calls == []
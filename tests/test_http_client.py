@@ -0,0 +1,61 @@
+# HttpClient stale keep-alive handling: a failure on a reused socket is
+# resent once for idempotent requests only, never for a plain POST.
+
+import socket
+
+import pytest
+
+import http_client
+
+
+class _Resp:
+    status     = 200
+    will_close = False
+    body       = b"{}"
+
+    def getheaders(self):
+        return []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Client with one idle (reused) connection to a local listener and a
+    _send that fails the first time with a server-closed-socket error.
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(4)
+    url = f"http://127.0.0.1:{listener.getsockname()[1]}/hook"
+
+    sent = []
+
+    def send(conn, method, path, body, headers):
+        sent.append(method)
+        if len(sent) == 1:
+            raise ConnectionResetError("server closed the idle socket")
+        return _Resp()
+
+    monkeypatch.setattr(http_client.HttpClient, "_send", staticmethod(send))
+    c = http_client.HttpClient(timeout=2.0)
+    c.warm(url)
+    c.url, c.sent = url, sent
+    yield c
+    c.close_all()
+    listener.close()
+
+
+def test_get_is_resent_on_a_stale_socket(client):
+    assert client.get(client.url).status == 200
+    assert client.sent == ["GET", "GET"]
+
+
+def test_post_is_not_resent_by_default(client):
+    with pytest.raises(ConnectionResetError):
+        client.post_json(client.url, {"card": 1})
+    assert client.sent == ["POST"]
+
+
+def test_post_is_resent_when_the_caller_opts_in(client):
+    assert client.post_json(client.url, {"q": 1}, resend_stale=True).status == 200
+    assert client.sent == ["POST", "POST"]
@@ -0,0 +1,22 @@
+# is_final: only verdicts a retry could not improve on are replayed.
+
+import idempotency
+
+
+def _payload(**kwargs):
+    payload = {"txn_id": "t1", "decision": "HOLD", "source": "AI_AGENT_REVIEW", "primary_threat": "AML"}
+    payload.update(kwargs)
+    return payload
+
+
+def test_real_verdict_is_final():
+    assert idempotency.is_final(_payload(), "t1")
+
+
+def test_ai_failure_and_missing_config_holds_are_not_final():
+    for threat in ("AI_NET_ERR", "AI_ERR", "AI_CONFIG"):
+        assert not idempotency.is_final(_payload(primary_threat=threat), "t1")
+
+
+def test_latest_row_fallback_is_not_final():
+    assert not idempotency.is_final(_payload(txn_id="t0"), "t1")
@@ -0,0 +1,87 @@
+# RuleCache staleness bound: a set loaded from the snapshot file is served
+# while it is younger than snapshot_max_age_secs, and refused after that
+# unless a DB revalidation succeeded in the meantime.
+
+import time
+
+import pytest
+
+import rule_cache
+
+ROWS = [{"rule_id": 1, "rule_name": "big", "logic_expression": "withdrawal_amount > 10", "action": "HOLD"}]
+
+
+class FlakyDB:
+    def __init__(self):
+        self.up = True
+
+    def rows(self):
+        if not self.up:
+            raise ConnectionError("db down")
+        return [dict(r) for r in ROWS]
+
+
+def _cache(db, path, **kwargs):
+    return rule_cache.RuleCache(
+        fetch_rows=db.rows, revalidate_secs=0, snapshot_path=str(path), snapshot_max_age_secs=60, **kwargs
+    )
+
+
+def _wait_refreshed(cache):
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _seed_snapshot(path, age_secs):
+    _cache(FlakyDB(), path).snapshot()   # DB load -> snapshot file written
+    snap = rule_cache.read_rule_snapshot(str(path), 3600)
+    snap["validated_at"] = time.time() - age_secs
+    rule_cache.write_rule_snapshot(str(path), snap)
+
+
+def test_snapshot_set_is_refused_past_the_bound_while_db_is_down(tmp_path):
+    path  = tmp_path / "rules.bin"
+    db    = FlakyDB()
+    _seed_snapshot(path, age_secs=30)
+    db.up = False
+    cache = _cache(db, path)
+
+    snap = cache.snapshot()
+    assert snap["source"] == "snapshot" and len(snap["rules"]) == 1
+    _wait_refreshed(cache)
+
+    cache._snapshot["validated_at"] -= 60   # time passes, revalidation keeps failing
+    with pytest.raises(rule_cache.StaleRuleSetError):
+        cache.snapshot()
+    _wait_refreshed(cache)
+    assert cache.stats["stale_refusals"] == 1
+
+    db.up = True
+    with pytest.raises(rule_cache.StaleRuleSetError):
+        cache.snapshot()   # kicks the refresh that now succeeds
+    _wait_refreshed(cache)
+    snap = cache.snapshot()
+    assert snap["source"] == "db"
+
+
+def test_db_validated_set_is_not_bounded(tmp_path):
+    db    = FlakyDB()
+    cache = _cache(db, tmp_path / "rules.bin")
+    cache.snapshot()
+    db.up = False
+    cache._snapshot["validated_at"] -= 3600
+    assert cache.snapshot()["source"] == "db"
+    _wait_refreshed(cache)
+
+
+def test_no_snapshot_and_db_error_holds_decisions(tmp_path, monkeypatch):
+    import core
+
+    db    = FlakyDB()
+    db.up = False
+    monkeypatch.setattr(core, "_RULE_CACHE", _cache(db, tmp_path / "missing.bin"))
+
+    rule_set = core.load_rule_snapshot()
+    assert rule_set["rules"] == [] and rule_set["version"] is None
+    assert "db down" in rule_set["unavailable"]
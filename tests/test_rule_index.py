@@ -0,0 +1,86 @@
+# RuleIndex must pick the same first matching rule as the rule-by-rule loop
+# (rule_index._loop_first_match, the reference) for any feature values,
+# including types that do not match a table's domain.
+
+import math
+import random
+from decimal import Decimal
+
+import pytest
+
+import rule_engine
+import rule_index
+
+from rule_fuzz import random_expression, random_rows
+
+def _compile(expressions):
+    return [
+        rule_engine.compile_rule(
+            {"rule_id": i, "rule_name": f"r{i}", "logic_expression": text, "action": "HOLD", "priority": i}
+        )
+        for i, text in enumerate(expressions)
+    ]
+
+
+def _safe_locals(features):
+    return {k: (0 if v is None else v) for k, v in features.items()}
+
+
+def _assert_same(rules, rows):
+    index = rule_index.RuleIndex(rules)
+    for row in rows:
+        safe_locals = _safe_locals(row)
+        expected = rule_index._loop_first_match(rules, safe_locals)
+        assert index.first_match(safe_locals) is expected, (row, expected and expected["logic_expression"])
+
+
+def test_mixed_type_thresholds_compare_against_the_constants():
+    rules = _compile(["sanctions_status >= 'PENDING'", "withdrawal_amount <= 2.5"])
+    index = rule_index.RuleIndex(rules)
+    assert index.first_match({"sanctions_status": 0, "withdrawal_amount": 9}) is None
+    assert index.first_match({"sanctions_status": "A", "withdrawal_amount": Decimal("2")}) is rules[1]
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        {"a": None, "b": None, "c": None},
+        {"a": Decimal("2"), "b": Decimal("-1"), "c": Decimal("2.5")},
+        {"a": "PENDING", "b": -1, "c": 2.5},
+        {"a": math.nan, "b": True, "c": ""},
+        {"a": 1},
+    ],
+)
+def test_null_decimal_and_missing_inputs(row):
+    rules = _compile(
+        [
+            "a >= 'PENDING'",
+            "b != -1",
+            "(b >= 1.0) or (b < '')",
+            "a == 2 and c <= 2.5",
+            "0 < a <= 2",
+            "not c",
+            "a + b > 1",
+        ]
+    )
+    _assert_same(rules, [row])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_rule_sets_match_the_loop(seed):
+    rng   = random.Random(seed)
+    rules = _compile([random_expression(rng) for _ in range(40)])
+    _assert_same(rules, random_rows(rng, 300))
+
+
+def test_on_error_reports_rules_that_raised_ahead_of_the_result():
+    rules = _compile(["a > 1", "b > 5", "a < 'x'", "b > 1"])
+    index = rule_index.RuleIndex(rules)
+    raised = []
+    # a is a number: "a < 'x'" raises; rule 3 wins, so rules 0-2 were reached
+    assert index.first_index({"a": 0, "b": 2}, on_error=raised.append) == 3
+    assert raised == [2]
+
+    raised = []
+    assert index.first_index({"a": 5, "b": 2}, on_error=raised.append) == 0
+    assert raised == []
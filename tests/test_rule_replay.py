@@ -0,0 +1,22 @@
+# rule_replay: names a candidate rule reads that are absent from the logged
+# snapshots (projected fetches) are reported, not silently treated as null.
+
+import rule_replay
+
+RULES = [
+    {"rule_id": 1, "rule_name": "fresh", "logic_expression": "withdrawal_amount > 1000 and destination_age_hours < 24", "action": "HOLD"},
+    {"rule_id": 2, "rule_name": "big", "logic_expression": "withdrawal_amount > 100000", "action": "REJECT"},
+]
+
+
+def test_missing_snapshot_names_are_reported():
+    rule_replay._init_worker(RULES)
+    chunk = [
+        ({"withdrawal_amount": 5000}, "HOLD"),
+        ({"withdrawal_amount": 5000, "destination_age_hours": None}, "HOLD"),
+    ]
+    part = rule_replay._replay_chunk(chunk)
+    part["wall_seconds"] = part["eval_seconds"]
+
+    report = rule_replay.build_report(part, RULES)
+    assert report["missing_features"] == [{"name": "destination_age_hours", "rows": 1, "rule_ids": [1]}]
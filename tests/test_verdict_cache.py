@@ -0,0 +1,32 @@
+# case_fingerprint: only the AI features sent to the model count, and the
+# rule set version / prompt key keep verdicts from leaking across changes.
+
+from decimal import Decimal
+
+import verdict_cache
+
+AI_FEATURES = ("withdrawal_amount", "withdrawal_ratio", "is_sanctioned")
+RULE        = {"rule_id": 7, "decision": "HOLD"}
+
+
+def _fp(features, **kwargs):
+    kwargs.setdefault("rule_set_version", "v1")
+    kwargs.setdefault("prompt_key", "p1")
+    return verdict_cache.case_fingerprint(features, RULE, AI_FEATURES, **kwargs)
+
+
+def test_features_not_sent_to_the_model_are_ignored():
+    base = {"withdrawal_amount": 1200.0, "withdrawal_ratio": 0.91, "is_sanctioned": False}
+    assert _fp(base) == _fp(dict(base, txn_id="t2", some_other_feature=42))
+
+
+def test_bucketing_treats_decimal_like_float():
+    assert _fp({"withdrawal_amount": Decimal("1201.5")}) == _fp({"withdrawal_amount": 1201.5})
+    assert _fp({"withdrawal_amount": 1201.5}) == _fp({"withdrawal_amount": 1249.0})
+    assert _fp({"withdrawal_amount": 1201.5}) != _fp({"withdrawal_amount": 1300.0})
+
+
+def test_rule_set_version_and_prompt_key_are_part_of_the_key():
+    features = {"withdrawal_amount": 1200.0}
+    assert _fp(features) != _fp(features, rule_set_version="v2")
+    assert _fp(features) != _fp(features, prompt_key=verdict_cache.prompt_hash("other-model"))
@@ -0,0 +1,117 @@
+# verdict_cache.py
+# LRU + TTL cache of Phase-2 AI verdicts, keyed on a canonical case fingerprint.
+# Near-identical HOLD cases (same rule and rule set version, same prompt and
+# model, same bucketed AI features) reuse the verdict instead of paying
+# another Gemini round trip.
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+print("[RISK_FC] Loading verdict_cache.py")
+
+# Identifiers / timestamps: never part of the fingerprint
+VOLATILE_FEATURES = frozenset({"txn_id", "user_code", "update_time"})
+
+
+def _bucket(value, sig_digits):
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    try:
+        return float(f"{float(value):.{sig_digits}g}")   # int / float / Decimal
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def prompt_hash(*parts):
+    """
+    Short sha256 over whatever shapes the model's answer (model name, prompt
+    text, encoding settings); part of every fingerprint.
+    """
+    blob = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def case_fingerprint(features, rule_context, ai_features, sig_digits=2, rule_set_version=None, prompt_key=None):
+    """
+    sha256 over rule_id + rule set version + prompt_key + the `ai_features`
+    actually sent to the model, with continuous values rounded to
+    `sig_digits` significant digits. Nulls and volatile fields are dropped.
+    """
+    features = features or {}
+    canon = {
+        k: _bucket(features[k], sig_digits)
+        for k in ai_features
+        if k not in VOLATILE_FEATURES and features.get(k) is not None
+    }
+    blob = json.dumps(
+        {
+            "rule_id": (rule_context or {}).get("rule_id"),
+            "rule_set_version": rule_set_version,
+            "prompt": prompt_key,
+            "features": canon,
+        },
+        sort_keys=True,
+        default=str,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Thread-safe LRU with per-entry TTL, bounded by entry count AND bytes.
+    """
+
+    def __init__(self, max_entries=2000, max_bytes=2 * 1024 * 1024, ttl_secs=600):
+        self._max_entries = max_entries
+        self._max_bytes   = max_bytes
+        self._ttl_secs    = ttl_secs
+        self._entries     = OrderedDict()  # key -> (expires_at, size, verdict)
+        self._bytes       = 0
+        self._lock        = threading.Lock()
+        self.stats        = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] <= now:
+                self._drop(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(entry[2])
+
+    def put(self, key, verdict):
+        size = len(key) + len(json.dumps(verdict, default=str))
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self._ttl_secs, size, dict(verdict))
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evicted"] += 1
+
+    def snapshot_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"]   = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats